@@ -0,0 +1,68 @@
+"""
+Dependencias de FastAPI que entregan las instancias compartidas creadas en el lifespan 
+de la aplicacion (ver api/main.py).
+"""
+from fastapi import Request
+from services.llm_service import LLMService
+from services.result_parser import ResultParser
+from services.result_store import ResultStore
+from services.session_history import SessionHistoryCache
+from services.schema_catalog import SchemaCatalog
+from services.sql_connector import ConsultadorSQL
+from services.sql_guard import SQLGuard
+
+
+def get_llm_service(request: Request) -> LLMService: 
+    """
+    Devuelve el LLMService compartido (un solo cliente AsyncAzureOpenAI por proceso).
+    """
+    return request.app.state.llm
+
+
+def get_consultador(request: Request) -> ConsultadorSQL: 
+    """
+    Devuelve el ConsultadorSQL compartido, respaldado por el pool de conexiones.
+    """
+    return request.app.state.consultador
+
+
+def get_result_store(request: Request) -> ResultStore: 
+    """
+    Devuelve el almacen de resultados del lado del servidor.
+    """
+    return request.app.state.result_store
+
+
+def get_session_history(request: Request) -> SessionHistoryCache: 
+    """
+    Devuelve el cache del historial por sesion (memoria del chat).
+    """
+    return request.app.state.session_history
+
+
+def get_session_id(request: Request) -> str: 
+    """
+    Devuelve el id de sesion del cliente resuelto por el middleware `sesion_cliente` (cookie o header X-Session-ID).
+    """
+    return request.state.session_id
+
+
+def get_schema_catalog(request: Request) -> SchemaCatalog | None: 
+    """
+    Devuelve el catalogo de esquema, o None si esta deshabilitado.
+    """
+    return request.app.state.schema_catalog
+
+
+def get_sql_guard(request: Request) -> SQLGuard: 
+    """
+    Devuelve la guardia que revisa las sentencias del LLM antes de ejecutarlas.
+    """
+    return request.app.state.sql_guard
+
+
+def get_result_parser(request: Request) -> ResultParser: 
+    """
+    Devuelve el ResultParser compartido.
+    """
+    return request.app.state.result_parser
@@ -1,22 +1,246 @@
 import os 
 import sys
+import asyncio
+import re
+import time
+import uuid
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # subir un nivel mas para leer todos los modulos
+from contextlib import asynccontextmanager
+import anyio
 from fastapi import FastAPI, Request 
 from fastapi.middleware.cors import CORSMiddleware 
 from fastapi.responses import HTMLResponse, FileResponse 
 from fastapi.staticfiles import StaticFiles 
 from fastapi.templating import Jinja2Templates 
 from api.routes.chat import router as chat_router 
+from api.routes.results import router as results_router 
+from api.routes.metrics import router as metrics_router 
 from utils.print_colors import Ppp
+from core.config import (
+    HISTORIAL_TABLE, 
+    RESULT_CACHE_ENABLED, 
+    RESULT_CACHE_TTL, 
+    RESULT_CACHE_MAX_MB, 
+    RESULT_CACHE_TTL_TABLAS, 
+    RESULT_STORE_MAX_ENTRIES, 
+    RESULT_STORE_TTL, 
+    HISTORY_WRITER_ENABLED, 
+    HISTORY_BATCH_SIZE, 
+    HISTORY_FLUSH_INTERVAL, 
+    HISTORY_QUEUE_MAX, 
+    HISTORY_QUEUE_POLICY, 
+    SESSION_CACHE_MAX_SESSIONS, 
+    SESSION_CACHE_MAX_TURNS, 
+    MEMORY_MAX_TOKENS, 
+    MEMORY_STRATEGY, 
+    SESSION_STORE, 
+    SESSION_STORE_PATH, 
+    SESSION_COOKIE_NAME, 
+    SESSION_COOKIE_MAX_AGE, 
+    SESSION_COOKIE_SECURE, 
+    SCHEMA_CATALOG_ENABLED, 
+    SCHEMA_TABLES, 
+    SCHEMA_REFRESH_INTERVAL, 
+    SCHEMA_MAX_AGE, 
+    SCHEMA_SAMPLE_VALUES, 
+    SCHEMA_CONTEXT_MAX_TABLES, 
+    SCHEMA_CONTEXT_MAX_COLUMNS, 
+    MIRROR_ENABLED, 
+    MIRROR_TABLES, 
+    MIRROR_PATH, 
+    MIRROR_SYNC_INTERVAL, 
+    MIRROR_MAX_LAG, 
+    MIRROR_FULL_RESYNC, 
+    MIRROR_BATCH_SIZE, 
+    WARMUP_ENABLED, 
+    WARMUP_TIMEOUT
+)
+from services.llm_service import LLMService
+from services.result_parser import ResultParser
+from services.result_cache import ResultCache
+from services.result_store import ResultStore
+from services.sql_connector import ConsultadorSQL
+from services.history_writer import HistoryWriter
+from services.session_history import SessionHistoryCache, count_tokens
+from services.session_store import create_session_store
+from services.schema_catalog import SchemaCatalog
+from services.sql_guard import SQLGuard
+from services.analytic_mirror import AnalyticMirror
+from services.connection_pool import close_pools, pools_metrics
+from services.metrics import HTTP_SECONDS, REGISTRY, begin_request
+from services.logger import Logger
+from services.sql_executor import shutdown_executor
 
 
 Ppp.p(f"Servicio Inicializado", color="Yellow")
 
+
+def _registrar_metricas(app: FastAPI) -> None: 
+    """
+    Expone en /metrics el stats() de los componentes compartidos (se leen al pedir las metricas).
+    """
+    componentes = {
+        "result_cache": app.state.result_cache, 
+        "semantic_cache": app.state.llm.semantic_cache, 
+        "llm_scheduler": app.state.llm.scheduler, 
+        "history_writer": app.state.consultador.history_writer, 
+        "session_history": app.state.session_history, 
+        "schema_catalog": app.state.schema_catalog, 
+        "mirror": app.state.mirror, 
+    }
+    for nombre, componente in componentes.items(): 
+        if componente is not None: 
+            REGISTRY.add_collector(nombre, componente.stats)
+    REGISTRY.add_collector("db_pool", pools_metrics, label="pool")
+    REGISTRY.add_collector("warmup_seconds", lambda: dict(app.state.warmup))
+
+
+async def _calentar(app: FastAPI) -> None: 
+    """
+    Deja listo el worker antes de aceptar peticiones: abre las conexiones minimas del pool, 
+    tokeniza el system prompt (carga el tokenizador), calcula su huella y carga el backend 
+    asyncio de anyio (los middlewares de Starlette lo importan en la primera peticion). 
+    Los pasos corren en paralelo y con tope de `WARMUP_TIMEOUT` segundos; si alguno falla 
+    (p.ej. la base no responde) se registra y el arranque sigue, la primera peticion pagara ese costo.
+    """
+    llm = app.state.llm
+
+    async def asgi() -> None: 
+        anyio.Event()
+
+    pasos = {
+        "db_pool": lambda: asyncio.to_thread(app.state.consultador.pool.fill), 
+        "prompt": lambda: asyncio.to_thread(lambda: (count_tokens(llm.system_prompt or ""), llm.prompt_fingerprint)), 
+        "asgi": asgi, 
+    }
+
+    async def medir(nombre: str, paso) -> None: 
+        inicio = time.perf_counter()
+        try: 
+            await paso()
+            app.state.warmup[nombre] = time.perf_counter() - inicio
+        except Exception as e: 
+            Logger.warning("[warmup] Fallo el paso %s: %s", nombre, e)
+
+    try: 
+        await asyncio.wait_for(asyncio.gather(*(medir(n, paso) for n, paso in pasos.items())), WARMUP_TIMEOUT)
+    except asyncio.TimeoutError: 
+        Logger.warning("[warmup] Calentamiento incompleto tras %ss", WARMUP_TIMEOUT)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Crea las instancias compartidas por todas las peticiones y las libera al apagar.
+    """
+    inicio = time.perf_counter()
+    app.state.llm = LLMService()
+    app.state.result_cache = ResultCache(
+        max_bytes=int(RESULT_CACHE_MAX_MB * 1024 * 1024), 
+        default_ttl=RESULT_CACHE_TTL, 
+        table_ttls=RESULT_CACHE_TTL_TABLAS
+    ) if RESULT_CACHE_ENABLED else None
+    app.state.consultador = ConsultadorSQL(
+        auth="local", 
+        tabla_historial=HISTORIAL_TABLE, 
+        result_cache=app.state.result_cache
+    )
+    if HISTORY_WRITER_ENABLED: 
+        # El historial se persiste por lotes en segundo plano, fuera de la latencia del chat
+        app.state.consultador.history_writer = HistoryWriter(
+            sink=app.state.consultador.insert_rows_historial, 
+            batch_size=HISTORY_BATCH_SIZE, 
+            flush_interval=HISTORY_FLUSH_INTERVAL, 
+            max_queue=HISTORY_QUEUE_MAX, 
+            policy=HISTORY_QUEUE_POLICY
+        ).start()
+    consultador = app.state.consultador
+
+    async def cargar_historial(session_id: str): 
+        # En frio solo se leen los turnos mas recientes que puede guardar el cache
+        return await consultador.aget_historial_by_session_id(session_id, limit=SESSION_CACHE_MAX_TURNS)
+
+    # Turnos y resultados de las sesiones: en memoria con un worker, en SQLite compartido con varios
+    app.state.session_store = create_session_store(
+        SESSION_STORE, 
+        path=SESSION_STORE_PATH, 
+        max_sessions=SESSION_CACHE_MAX_SESSIONS, 
+        max_results=RESULT_STORE_MAX_ENTRIES
+    )
+    app.state.session_history = SessionHistoryCache(
+        loader=cargar_historial, 
+        max_turns=SESSION_CACHE_MAX_TURNS, 
+        max_tokens=MEMORY_MAX_TOKENS, 
+        strategy=MEMORY_STRATEGY, 
+        store=app.state.session_store
+    )
+    app.state.schema_catalog = None
+    tarea_catalogo = None
+    if SCHEMA_CATALOG_ENABLED: 
+        app.state.schema_catalog = SchemaCatalog(
+            consultador, 
+            SCHEMA_TABLES, 
+            sample_values=SCHEMA_SAMPLE_VALUES, 
+            max_tables=SCHEMA_CONTEXT_MAX_TABLES, 
+            max_columns=SCHEMA_CONTEXT_MAX_COLUMNS, 
+            max_age=SCHEMA_MAX_AGE
+        )
+        if app.state.llm.semantic_cache is not None: 
+            # Las respuestas cacheadas se generaron con el esquema anterior (arefresh llama al 
+            # listener en el event loop, no en el hilo del ejecutor, asi no compite con lookup)
+            app.state.schema_catalog.on_change(lambda version: app.state.llm.semantic_cache.invalidate())
+        # La primera carga corre en segundo plano para no retrasar el arranque
+        tarea_catalogo = asyncio.create_task(app.state.schema_catalog.run_auto_refresh(SCHEMA_REFRESH_INTERVAL))
+    app.state.mirror = None
+    tarea_espejo = None
+    if MIRROR_ENABLED and MIRROR_TABLES: 
+        app.state.mirror = AnalyticMirror(
+            consultador, 
+            MIRROR_TABLES, 
+            path=MIRROR_PATH, 
+            max_lag=MIRROR_MAX_LAG, 
+            full_resync=MIRROR_FULL_RESYNC, 
+            batch_size=MIRROR_BATCH_SIZE
+        )
+        consultador.mirror = app.state.mirror
+        # Hasta la primera carga todas las consultas van a SQL Server
+        tarea_espejo = asyncio.create_task(app.state.mirror.run_auto_refresh(MIRROR_SYNC_INTERVAL))
+    app.state.sql_guard = SQLGuard()
+    app.state.result_parser = ResultParser()
+    app.state.result_store = ResultStore(ttl=RESULT_STORE_TTL, store=app.state.session_store)
+    # Segundos por paso del calentamiento y del arranque completo (se exportan en /metrics)
+    app.state.warmup = {}
+    if WARMUP_ENABLED: 
+        await _calentar(app)
+    app.state.warmup["startup"] = time.perf_counter() - inicio
+    Logger.info("[lifespan] Worker listo en %.3fs: %s", app.state.warmup["startup"], app.state.warmup)
+    _registrar_metricas(app)
+    try:
+        yield
+    finally:
+        if tarea_catalogo is not None: 
+            tarea_catalogo.cancel()
+        if tarea_espejo is not None: 
+            tarea_espejo.cancel()
+            app.state.mirror.close()
+        await app.state.llm.aclose()
+        if app.state.consultador.history_writer is not None: 
+            # Drenar lo pendiente antes de cerrar el pool de conexiones
+            app.state.consultador.history_writer.close()
+        shutdown_executor()
+        close_pools()
+        app.state.session_store.close()
+        # Al final, para que se escriban los logs de los cierres anteriores
+        Logger.shutdown()
+
+
 # Instanciar la app 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # agregar los routers 
 app.include_router(router=chat_router)
+app.include_router(router=results_router)
+app.include_router(router=metrics_router)
 
 
 # Midddleware
@@ -26,8 +250,61 @@ app.add_middleware(
     allow_credentials=True, 
     allow_methods=["*"], 
     allow_headers=["*"], 
+    expose_headers=["X-Request-ID", "Server-Timing", "X-Session-ID"], 
 )
 
+
+@app.middleware("http")
+async def medir_peticion(request: Request, call_next): 
+    """
+    Asigna un X-Request-ID (o respeta el del cliente) que tambien llevan los logs de la peticion, 
+    mide la duracion por ruta y agrega el header Server-Timing con las etapas medidas. 
+    En respuestas en streaming el header solo trae lo medido antes del primer byte.
+    """
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    timings = begin_request(request_id)
+    status = 500
+    try: 
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        response.headers["Server-Timing"] = timings.server_timing()
+        return response
+    finally: 
+        # La plantilla de la ruta (no la URL) para no crear una serie por cada id
+        ruta = getattr(request.scope.get("route"), "path", "otra")
+        HTTP_SECONDS.observe(time.perf_counter() - timings.started, method=request.method, route=ruta, status=status)
+
+
+# Ids de sesion que se aceptan del cliente (uuid4 hex o similares); cualquier otro se reemplaza
+_SESSION_ID_VALIDO = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+@app.middleware("http")
+async def sesion_cliente(request: Request, call_next): 
+    """
+    Resuelve la sesion del cliente: header X-Session-ID (clientes de la API) o la cookie de 
+    sesion (navegador); si no trae una valida se crea y se entrega en la cookie. 
+    Las rutas la leen con la dependencia `get_session_id`.
+    """
+    session_id = request.headers.get("x-session-id") or request.cookies.get(SESSION_COOKIE_NAME)
+    nueva = not (session_id and _SESSION_ID_VALIDO.match(session_id))
+    if nueva: 
+        session_id = uuid.uuid4().hex
+    request.state.session_id = session_id
+    response = await call_next(request)
+    response.headers["X-Session-ID"] = session_id
+    if request.cookies.get(SESSION_COOKIE_NAME) != session_id: 
+        response.set_cookie(
+            SESSION_COOKIE_NAME, 
+            session_id, 
+            max_age=SESSION_COOKIE_MAX_AGE, 
+            httponly=True, 
+            samesite="lax", 
+            secure=SESSION_COOKIE_SECURE
+        )
+    return response
+
 # Montar la carpeta de static 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="views")
@@ -36,7 +313,7 @@ templates = Jinja2Templates(directory="views")
 # Endpoints base 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
-    print("Request for index page received")
+    Logger.debug("Request for index page received")
     return templates.TemplateResponse('chat.html', {"request": request})
 
 
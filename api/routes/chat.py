@@ -1,136 +1,550 @@
-from fastapi import APIRouter, Form
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Depends, Form
+from fastapi.responses import HTMLResponse, StreamingResponse
 from utils.print_colors import Ppp
+from services.logger import Logger
+from api.dependencies import (
+    get_consultador, 
+    get_llm_service, 
+    get_result_store, 
+    get_schema_catalog, 
+    get_session_history, 
+    get_session_id, 
+    get_sql_guard
+)
 from services.sql_connector import ConsultadorSQL
-from services.result_parser import ResultParser
 from services.formatter import format_result
 from services.llm_service import LLMService
-from colorama import Fore as fre 
+from services.result_store import ResultStore
+from services.history_writer import summarize_result
+from services.session_history import SessionHistoryCache
+from services.schema_catalog import SchemaCatalog
+from services.sql_guard import GuardDecision, SQLGuard
+from services.metrics import RESULT_ROWS, STAGE_SECONDS, stage
+from api.routes.results import render_page
+from core.config import DASHBOARD_CONCURRENCY, RESULTS_PAGE_SIZE
+from utils.sql_text import first_statement, is_select, normalize_sql
 
+import asyncio
 import html 
+import json 
 import time 
-import uuid
 
 router = APIRouter()
 
+# Lo que se guarda en el historial cuando la respuesta no se ejecuta
+_RESUMEN_GUARDIA = {"text": "Texto", "rejected": "Bloqueada"}
+
+
+async def _cargar_memoria(session_history: SessionHistoryCache, session_id: str, message: str) -> list | None: 
+    """
+    Devuelve la ventana de memoria (mensajes user/assistant) de la sesion para el LLM, 
+    acotada por el presupuesto de tokens. La base solo se consulta si la sesion no esta en cache.
+    """
+    all_mensajes = await session_history.memory(session_id, question=message)
+    if all_mensajes: 
+        Ppp.p(f"[chat_agente] Mensajes anteriores en memoria: {len(all_mensajes)}", color="Yellow")
+    return all_mensajes
+
+def _contexto(schema_catalog: SchemaCatalog | None, message: str) -> str | None: 
+    """
+    Esquema relevante para la pregunta (solo las tablas/columnas que coinciden), o None.
+    """
+    return schema_catalog.context_for(message) if schema_catalog is not None else None
 
-HISTORIAL_TABLE = "[Agente].[dbo].[Historial_Chat]"
-session_id = str(uuid.uuid4())
 
 @router.post("/chat", response_class=HTMLResponse)
-async def chat_agente(message: str = Form(...)):
+async def chat_agente(
+    message: str = Form(...), 
+    llm: LLMService = Depends(get_llm_service), 
+    consultador: ConsultadorSQL = Depends(get_consultador), 
+    result_store: ResultStore = Depends(get_result_store), 
+    session_history: SessionHistoryCache = Depends(get_session_history), 
+    schema_catalog: SchemaCatalog | None = Depends(get_schema_catalog), 
+    sql_guard: SQLGuard = Depends(get_sql_guard), 
+    session_id: str = Depends(get_session_id), 
+    modo: str = Form("simple"), 
+):
     """
     Endpoint principal del chat.
     - Recibe un mensaje del usuario.
     - Llama al LLM para generar SQL.
+    - Revisa el SQL con la guardia (solo un SELECT, tope de filas y timeout).
     - Ejecuta el SQL en la base de datos.
     - Devuelve un bloque HTML para insertar en el chat-log.
+
+    Con `modo=tablero` el LLM puede responder una pregunta compuesta con varias consultas 
+    independientes; se ejecutan en paralelo y sus resultados van juntos en un bloque del panel.
     """
 
+    sql_query = None
     try:   
-        # 0. Generar un id unico para la sesion de mensajes 
+        # 0. La sesion del cliente llega en la cookie (o el header X-Session-ID)
         Ppp.p(f"[chat_agente] Session ID: {session_id}", color="Yellow")
-        # 0.1 Recuperar mensajes anteriores dado el id 
-        consultador_historial = ConsultadorSQL(auth="local", tabla_historial=HISTORIAL_TABLE)
-        mensajes_anteriores = consultador_historial.get_historial_by_session_id(session_id)
-
-        if mensajes_anteriores: 
-            all_mensajes = []
-            print("mensajes anteriores encontrados: ")
-            print(mensajes_anteriores)
-
-            for mensaje in mensajes_anteriores: 
-                all_mensajes.append(
-                    {"role": "user", "content": mensaje["user_message"]}
-                )
-                all_mensajes.append(
-                    {"role": "assistant", "content": mensaje["sql_query"]}
-                )
-        
-            Ppp.p(f"[chat_agente] Mensajes anteriores: {all_mensajes}", color="Yellow")
+        # 0.1 Recuperar mensajes anteriores dado el id (las conexiones salen del pool compartido)
+        with stage("history"): 
+            chat_memory = await _cargar_memoria(session_history, session_id, message)
 
         # 1. Mostrar mensaje del usuario
-        user_html = f'<div class="msg user">{message}</div>'
+        user_html = f'<div class="msg user">{html.escape(message)}</div>'
 
         # 2. Nuestro LLM debe traducir el mensaje a SQL 
-        llm = LLMService()
-        sql_query = await llm.ask_llm(message, chat_memory=all_mensajes if mensajes_anteriores else None)
-        print(fre.YELLOW + f"[LLM] SQL Query: {sql_query}" + fre.RESET) # debug 
+        with stage("schema"): 
+            contexto = _contexto(schema_catalog, message)
+        with stage("llm"): 
+            if modo == "tablero": 
+                sql_query = await llm.ask_dashboard(message, chat_memory=chat_memory, contexto=contexto)
+            else: 
+                sql_query = await llm.ask_llm(message, chat_memory=chat_memory, contexto=contexto)
+        Logger.debug("[LLM] SQL Query: %s", sql_query, event="llm.sql")
 
-        # 3. Ejecutar el SQL
-        consultador = ConsultadorSQL(auth="local", tabla_historial=HISTORIAL_TABLE)
-        result = consultador.execute_sql(sql_query)
-        print(fre.YELLOW + f"[SQL] Result: {result}" + fre.RESET) # debug 
+        # 3. Ejecutar el SQL, solo si la guardia lo permite y con su tope de filas y timeout
+        if modo == "tablero": 
+            partes = sql_guard.check_many(sql_query)
+            if len(partes) > 1: 
+                return await _tablero(consultador, session_history, result_store, sql_guard, session_id, message, sql_query, partes)
+            decision = partes[0][1]
+        else: 
+            decision = sql_guard.check(sql_query)
+        result, truncated = sql_query, False
+        if decision.executable: 
+            with stage("sql"): 
+                result = await consultador.aexecute_sql(decision.sql, timeout=decision.timeout, max_rows=decision.fetch_rows)
+            result, truncated = sql_guard.truncate(result, decision)
+        if decision.action == "rejected" or (decision.executable and isinstance(result, str)): 
+            # Bloqueada o fallida: que la proxima vez la pregunta vuelva a pasar por el modelo
+            llm.discard_answer(sql_query)
+        if isinstance(result, dict): 
+            RESULT_ROWS.observe(len(result.get("rows") or []), endpoint="/chat")
+        # Solo un resumen: el resultado completo puede tener miles de filas
+        Logger.debug("[SQL] Result: %s", result, event="sql.result")
 
         # 3.1 Guardar la consulta en el historial 
         data_historial = {
             "session_id": session_id,
             "user_message": message,
             "sql_query": sql_query,
-            "result": str(result)[:33]
+            "result": summarize_result(result, 33) if decision.executable else _RESUMEN_GUARDIA[decision.action]
         }
 
         # Inssertar en la tabla de historial de chat 
-        consultador.insert_row_historial(data=data_historial)
+        with stage("history_insert"): 
+            await consultador.ainsert_row_historial(data=data_historial)
+            await session_history.append(session_id, message, sql_query)
         # Segun el tipo devuelto, ejucatmos una accion. 
-        print(fre.YELLOW + f"[SQL] Result: {type(result)}" + fre.RESET) # debug
+        if decision.action == "rejected": 
+            return user_html + (
+                f'<div class="msg bot" style="color:#b36b00;">{html.escape(decision.notice())}'
+                f'<pre>{html.escape(sql_query)}</pre></div>'
+            )
         # Respuesta sin formato, es solo texto
         if isinstance(result, str): 
            tipo_respuesta,  agent_html = "texto", f'<div class="msg bot">{html.escape(sql_query)}</div>'
            return user_html + agent_html
         
         # La respuesta es un diccionario, lo que implica que debe pintarse en pantalla como una tabla
-        elif isinstance(result, dict): 
-            tipo_respuesta, agent_html = format_result(result, formato="html")
-
-        user_div = f"<div class='msg user'>{html.escape(message)}</div>"
-        payload = html.escape(agent_html).replace("</", "<\\/")
-        fid = f"form-panel-{int(time.time()*1000)}"
+        # El resultado se queda en el servidor; el navegador solo recibe su ID y htmx 
+        # pide el bloque del panel al cargarse este div
+        result_id = result_store.new_id()
+        entry = {"message": message, "sql": sql_query}
+        with stage("format"): 
+            if isinstance(result, dict) and len(result.get("rows") or []) > RESULTS_PAGE_SIZE: 
+                # Resultados grandes: solo se renderiza la primera pagina, el resto se pide a /results/{id}/page
+                entry["result"] = result
+                agent_html = render_page(result_id, result)
+            elif isinstance(result, dict): 
+                tipo_respuesta, agent_html = format_result(result, formato="html")
+        aviso = decision.notice(truncated)
+        if aviso: 
+            agent_html = f'<p class="aviso">{html.escape(aviso)}</p>' + agent_html
+        entry["html"] = agent_html
+        await result_store.put(entry, result_id=result_id)
+        return _respuesta_panel(message, result_id, aviso)
 
+    except TimeoutError as e: 
+        Ppp.p(f"[Error.chat_agente] {e}", color="Green")
+        llm.discard_answer(sql_query)
         return (
-            user_div +
-            "<div class='msg bot'>Resultado agregado al panel derecho. ➡️</div>"
-            f"""
-            <form id="{fid}" style="display:none">
-            <input type="hidden" name="message" value="{html.escape(message)}">
-            <input type="hidden" name="formatted_response" value="{payload}">
-            </form>
-            <script>
-            const f = document.getElementById("{fid}");
-            document.body.appendChild(f);
-            fetch('/panel', {{
-                method: 'POST',
-                headers: {{ 'Content-Type': 'application/x-www-form-urlencoded' }},
-                body: new URLSearchParams(new FormData(f))
-            }})
-            .then(r => r.text())
-            .then(html => {{
-                document.getElementById('report-content')
-                        .insertAdjacentHTML('beforeend', html);
-                f.remove();
-            }});
-            </script>
-            """
+            '<div class="msg bot" style="color:red;">La consulta excedio el tiempo limite y se cancelo en el servidor. '
+            'Intenta acotarla con filtros o un TOP.</div>'
         )
-
     except Exception as e:
         Ppp.p(f"[Error.chat_agente] {e}", color="Green")
         return f'<div class="msg bot" style="color:red;">Error: {str(e)}</div>'
 
 
+def _respuesta_panel(message: str, result_id: str, aviso: str | None = None) -> str: 
+    """
+    Respuesta del chat cuando el resultado va al panel: el navegador solo recibe el ID 
+    y htmx pide el bloque del panel al cargarse el div oculto.
+    """
+    user_div = f"<div class='msg user'>{html.escape(message)}</div>"
+    return (
+        user_div +
+        "<div class='msg bot'>Resultado agregado al panel derecho. ➡️"
+        + (f"<br><small>{html.escape(aviso)}</small>" if aviso else "") + "</div>"
+        f"""
+        <div style="display:none" hx-post="/panel" hx-trigger="load" 
+             hx-vals='{{"result_id": "{result_id}"}}' 
+             hx-target="#report-content" hx-swap="beforeend"></div>
+        """
+    )
+
+
+async def _tablero(
+    consultador: ConsultadorSQL, 
+    session_history: SessionHistoryCache, 
+    result_store: ResultStore, 
+    sql_guard: SQLGuard, 
+    session_id: str, 
+    message: str, 
+    sql_query: str, 
+    partes: list[tuple[str | None, GuardDecision]]
+) -> str: 
+    """
+    Modo tablero: ejecuta en paralelo las consultas que aprobo la guardia (a lo mas 
+    DASHBOARD_CONCURRENCY a la vez por peticion) y junta los resultados en un solo bloque 
+    del panel, una tarjeta por consulta. Una consulta que falla o se bloquea solo afecta 
+    a su tarjeta.
+    """
+    ejecutables = [decision for _, decision in partes if decision.executable]
+    with stage("sql"): 
+        resultados = await consultador.aexecute_many(
+            [(d.sql, d.timeout, d.fetch_rows) for d in ejecutables], 
+            concurrency=DASHBOARD_CONCURRENCY
+        )
+    pendientes = iter(resultados)
+
+    tarjetas = []
+    with stage("format"): 
+        for i, (titulo, decision) in enumerate(partes, start=1): 
+            contenido = ""
+            if decision.action == "rejected": 
+                contenido = f'<p class="aviso">{html.escape(decision.notice())}</p><pre>{html.escape(decision.sql)}</pre>'
+            elif decision.action == "text": 
+                contenido = f"<p>{html.escape(decision.sql)}</p>"
+            else: 
+                result = next(pendientes)
+                if isinstance(result, TimeoutError): 
+                    contenido = f'<p style="color:red;">{_MENSAJE_TIMEOUT}</p>'
+                elif isinstance(result, Exception): 
+                    Ppp.p(f"[Error.chat_agente.tablero] {result}", color="Green")
+                    contenido = f'<p style="color:red;">Error: {html.escape(str(result))}</p>'
+                elif isinstance(result, dict): 
+                    result, truncated = sql_guard.truncate(result, decision)
+                    RESULT_ROWS.observe(len(result.get("rows") or []), endpoint="/chat")
+                    aviso = decision.notice(truncated)
+                    _, contenido = format_result(result, formato="html", max_rows=RESULTS_PAGE_SIZE)
+                    if aviso: 
+                        contenido = f'<p class="aviso">{html.escape(aviso)}</p>' + contenido
+                else: 
+                    contenido = f"<p>{html.escape(str(result))}</p>"
+            tarjetas.append(
+                f'<section class="tablero-item"><h5>{html.escape(titulo or f"Consulta {i}")}</h5>{contenido}</section>'
+            )
+
+    result_id = await result_store.put({
+        "message": message, 
+        "sql": sql_query, 
+        "html": '<div class="tablero">' + "".join(tarjetas) + "</div>"
+    })
+    with stage("history_insert"): 
+        await _registrar(consultador, session_history, session_id, message, sql_query, f"Tablero: {len(partes)} consultas")
+    return _respuesta_panel(message, result_id)
+
+
 # Panel de graficos 
 @router.post("/panel", response_class=HTMLResponse)
-async def panel(message: str = Form(...), formatted_response: str = Form(...)):
+async def panel(
+    result_id: str = Form(...), 
+    result_store: ResultStore = Depends(get_result_store), 
+):
     """
     Endpoint para agregar resultados al panel derecho. 
 
-    - Recibe un mensaje del usuario y una respuesta formateada.
+    - Recibe el ID de un resultado guardado por /chat.
     - Devuelve un bloque HTML para insertar en el panel derecho.
 
     """
     try: 
-        content = html.unescape(formatted_response)
-        return f"<div><h4>{html.escape(message)}</h4>{content}<hr></div>"
+        entry = await result_store.get(result_id)
+        if entry is None: 
+            return '<div class="msg bot" style="color:red;">El resultado ya no esta disponible, vuelve a hacer la consulta.</div>'
+        return f"<div><h4>{html.escape(entry['message'])}</h4>{entry['html']}<hr></div>"
     except Exception as e:
         Ppp.p(f"[Error.panel] {e}", color="Green")
         return f'<div class="msg bot" style="color:red;">Error: {str(e)}</div>'
+
+
+async def _registrar(
+    consultador: ConsultadorSQL, 
+    session_history: SessionHistoryCache, 
+    session_id: str, 
+    message: str, 
+    sql_query: str, 
+    resumen: str
+) -> None: 
+    """
+    Guarda el turno en el historial (tabla y cache de la sesion).
+    """
+    await consultador.ainsert_row_historial(data={
+        "session_id": session_id, 
+        "user_message": message, 
+        "sql_query": sql_query, 
+        "result": resumen[:33]
+    })
+    await session_history.append(session_id, message, sql_query)
+
+
+def _recortar(decision: GuardDecision, total: int, rows: list) -> tuple[list, bool]: 
+    """
+    Aplica el tope de filas de la guardia a un lote que llega despues de `total` filas. 
+    Devuelve (filas, recortado).
+    """
+    if decision.action != "limited" or total + len(rows) <= decision.max_rows: 
+        return rows, False
+    return rows[:max(decision.max_rows - total, 0)], True
+
+
+_MENSAJE_TIMEOUT = "La consulta excedio el tiempo limite y se cancelo en el servidor. Intenta acotarla con filtros o un TOP."
+
+
+# Resultados en streaming 
+@router.post("/chat/rows")
+async def chat_rows(
+    message: str = Form(...), 
+    llm: LLMService = Depends(get_llm_service), 
+    consultador: ConsultadorSQL = Depends(get_consultador), 
+    session_history: SessionHistoryCache = Depends(get_session_history), 
+    schema_catalog: SchemaCatalog | None = Depends(get_schema_catalog), 
+    sql_guard: SQLGuard = Depends(get_sql_guard), 
+    session_id: str = Depends(get_session_id), 
+):
+    """
+    Variante de /chat que envia el resultado por lotes en NDJSON (un objeto JSON por linea), 
+    para que el navegador pinte las primeras filas antes de que termine la consulta y la 
+    memoria del servidor quede acotada al tamaño de un lote.
+
+    Eventos: 
+    - {"type": "sql", "sql": ...}
+    - {"type": "guard", "action": ..., "reason": ..., "sql": ..., "notice": ...}
+          si la guardia bloqueo la sentencia o le puso tope de filas
+    - {"type": "columns", "columns": [...]}
+    - {"type": "rows", "rows": [[...], ...]}   (uno por lote)
+    - {"type": "end", "rows_count": N, "elapsed_ms": ..., "truncated": bool, "notice": ...}
+    - {"type": "text", "text": ...}   si la respuesta del LLM no es una consulta ejecutable
+    - {"type": "error", "message": ...}
+    """
+
+    def linea(evento: dict) -> bytes: 
+        return (json.dumps(evento, default=str, ensure_ascii=False) + "\n").encode("utf-8")
+
+    async def eventos(): 
+        inicio = time.perf_counter()
+        try: 
+            with stage("history"): 
+                chat_memory = await _cargar_memoria(session_history, session_id, message)
+            with stage("llm"): 
+                sql_query = await llm.ask_llm(message, chat_memory=chat_memory, contexto=_contexto(schema_catalog, message))
+            yield linea({"type": "sql", "sql": sql_query})
+
+            decision = sql_guard.check(sql_query)
+            if decision.action == "text": 
+                yield linea({"type": "text", "text": sql_query})
+                await _registrar(consultador, session_history, session_id, message, sql_query, _RESUMEN_GUARDIA["text"])
+                return
+            if decision.action != "allow": 
+                yield linea({"type": "guard", **decision.to_dict()})
+            if decision.action == "rejected": 
+                llm.discard_answer(sql_query)
+                await _registrar(consultador, session_history, session_id, message, sql_query, _RESUMEN_GUARDIA["rejected"])
+                return
+
+            total = 0
+            truncado = False
+            columnas_enviadas = False
+            try: 
+                async for columns, rows in consultador.aiter_batches(decision.sql, max_rows=decision.fetch_rows, timeout=decision.timeout): 
+                    if not columnas_enviadas: 
+                        yield linea({"type": "columns", "columns": columns})
+                        columnas_enviadas = True
+                    rows, recortado = _recortar(decision, total, rows)
+                    truncado |= recortado
+                    total += len(rows)
+                    if rows: 
+                        yield linea({"type": "rows", "rows": rows})
+            except TimeoutError as e: 
+                Ppp.p(f"[chat_rows] {e}", color="Yellow")
+                llm.discard_answer(sql_query)
+                yield linea({"type": "error", "message": _MENSAJE_TIMEOUT})
+                await _registrar(consultador, session_history, session_id, message, sql_query, "Timeout")
+                return
+            except Exception as e: 
+                # Igual que en /chat: si no se pudo ejecutar, la respuesta del LLM se muestra como texto
+                Ppp.p(f"[chat_rows] No se ejecuto la respuesta como SQL: {e}", color="Yellow")
+                llm.discard_answer(sql_query)
+                yield linea({"type": "text", "text": sql_query})
+                await _registrar(consultador, session_history, session_id, message, sql_query, "Error")
+                return
+
+            RESULT_ROWS.observe(total, endpoint="/chat/rows")
+            with stage("history_insert"): 
+                await _registrar(consultador, session_history, session_id, message, sql_query, f"{total} filas")
+            yield linea({
+                "type": "end", 
+                "rows_count": total, 
+                "elapsed_ms": round((time.perf_counter() - inicio) * 1000, 1), 
+                "truncated": truncado, 
+                "notice": decision.notice(truncado), 
+            })
+
+        except Exception as e: 
+            Ppp.p(f"[Error.chat_rows] {e}", color="Green")
+            yield linea({"type": "error", "message": str(e)})
+
+    return StreamingResponse(eventos(), media_type="application/x-ndjson")
+
+
+async def _prefetch(consultador: ConsultadorSQL, decision: GuardDecision, cola: asyncio.Queue) -> None: 
+    """
+    Ejecuta la sentencia aprobada por la guardia y deja los lotes en `cola` como 
+    ("batch", columnas, filas), terminando con ("end", None, None) o ("error", excepcion, None).
+    La cola es acotada: si el cliente va lento, la lectura se detiene.
+    """
+    try: 
+        with stage("sql"): 
+            async for columns, rows in consultador.aiter_batches(decision.sql, max_rows=decision.fetch_rows, timeout=decision.timeout): 
+                await cola.put(("batch", columns, rows))
+        await cola.put(("end", None, None))
+    except Exception as e: 
+        await cola.put(("error", e, None))
+
+
+# Respuesta del LLM en streaming (Server-Sent Events)
+@router.post("/chat/stream")
+async def chat_stream(
+    message: str = Form(...), 
+    llm: LLMService = Depends(get_llm_service), 
+    consultador: ConsultadorSQL = Depends(get_consultador), 
+    session_history: SessionHistoryCache = Depends(get_session_history), 
+    schema_catalog: SchemaCatalog | None = Depends(get_schema_catalog), 
+    sql_guard: SQLGuard = Depends(get_sql_guard), 
+    session_id: str = Depends(get_session_id), 
+):
+    """
+    Variante de /chat/rows que envia tambien la respuesta del LLM token por token, como 
+    Server-Sent Events. En cuanto el modelo termina la primera sentencia SELECT (primer ';') 
+    y la guardia la aprueba, se empieza a ejecutar mientras el modelo sigue generando; si la 
+    respuesta final resulta distinta, se descarta esa ejecucion y se ejecuta la respuesta completa.
+
+    Eventos (`event:` / `data:` JSON): 
+    - delta   {"text": ...}                       fragmento de la respuesta del LLM
+    - sql     {"sql": ..., "ttft_ms": ...}        respuesta completa y latencia del primer token
+    - guard   {"action": ..., "reason": ..., "sql": ..., "notice": ...}
+                                                  si la guardia bloqueo la sentencia o le puso tope
+    - columns {"columns": [...]}
+    - rows    {"rows": [[...], ...]}              uno por lote
+    - end     {"rows_count": N, "elapsed_ms": ..., "truncated": bool, "notice": ...}
+    - text    {"text": ...}                       si la respuesta no es una consulta ejecutable
+    - error   {"message": ...}
+    """
+
+    def sse(evento: str, datos: dict) -> bytes: 
+        return f"event: {evento}\ndata: {json.dumps(datos, default=str, ensure_ascii=False)}\n\n".encode("utf-8")
+
+    async def eventos(): 
+        inicio = time.perf_counter()
+        tarea = None
+        try: 
+            with stage("history"): 
+                chat_memory = await _cargar_memoria(session_history, session_id, message)
+            partes = []
+            ttft = None
+            anticipada = None
+            cola: asyncio.Queue = asyncio.Queue(maxsize=4)
+
+            inicio_llm = time.perf_counter()
+            async for delta in llm.astream_llm(message, chat_memory=chat_memory, contexto=_contexto(schema_catalog, message)): 
+                if ttft is None: 
+                    ttft = round((time.perf_counter() - inicio) * 1000, 1)
+                    STAGE_SECONDS.observe(time.perf_counter() - inicio_llm, stage="llm_ttft")
+                partes.append(delta)
+                yield sse("delta", {"text": delta})
+                if tarea is None and anticipada is None: 
+                    sentencia = first_statement("".join(partes))
+                    if sentencia and is_select(sentencia): 
+                        anticipada = sql_guard.check(sentencia)
+                        if anticipada.executable: 
+                            tarea = asyncio.create_task(_prefetch(consultador, anticipada, cola))
+
+            sql_query = "".join(partes)
+            yield sse("sql", {"sql": sql_query, "ttft_ms": ttft})
+
+            decision = sql_guard.check(sql_query)
+            if tarea is not None and (not decision.executable or normalize_sql(decision.sql) != normalize_sql(anticipada.sql)): 
+                # El modelo siguio despues del ';' (otra sentencia o texto): no sirve lo anticipado
+                tarea.cancel()
+                tarea = None
+                cola = asyncio.Queue(maxsize=4)
+            if decision.action == "text": 
+                yield sse("text", {"text": sql_query})
+                await _registrar(consultador, session_history, session_id, message, sql_query, _RESUMEN_GUARDIA["text"])
+                return
+            if decision.action != "allow": 
+                yield sse("guard", decision.to_dict())
+            if decision.action == "rejected": 
+                llm.discard_answer(sql_query)
+                await _registrar(consultador, session_history, session_id, message, sql_query, _RESUMEN_GUARDIA["rejected"])
+                return
+            if tarea is None: 
+                tarea = asyncio.create_task(_prefetch(consultador, decision, cola))
+
+            total = 0
+            truncado = False
+            columnas_enviadas = False
+            while True: 
+                tipo, valor, rows = await cola.get()
+                if tipo == "error" and isinstance(valor, TimeoutError): 
+                    Ppp.p(f"[chat_stream] {valor}", color="Yellow")
+                    llm.discard_answer(sql_query)
+                    yield sse("error", {"message": _MENSAJE_TIMEOUT})
+                    await _registrar(consultador, session_history, session_id, message, sql_query, "Timeout")
+                    return
+                if tipo == "error": 
+                    Ppp.p(f"[chat_stream] No se ejecuto la respuesta como SQL: {valor}", color="Yellow")
+                    llm.discard_answer(sql_query)
+                    yield sse("text", {"text": sql_query})
+                    await _registrar(consultador, session_history, session_id, message, sql_query, "Error")
+                    return
+                if tipo == "end": 
+                    break
+                if not columnas_enviadas: 
+                    columnas_enviadas = True
+                    yield sse("columns", {"columns": valor})
+                rows, recortado = _recortar(decision, total, rows)
+                truncado |= recortado
+                total += len(rows)
+                if rows: 
+                    yield sse("rows", {"rows": rows})
+
+            RESULT_ROWS.observe(total, endpoint="/chat/stream")
+            with stage("history_insert"): 
+                await _registrar(consultador, session_history, session_id, message, sql_query, f"{total} filas")
+            yield sse("end", {
+                "rows_count": total, 
+                "elapsed_ms": round((time.perf_counter() - inicio) * 1000, 1), 
+                "truncated": truncado, 
+                "notice": decision.notice(truncado), 
+            })
+
+        except Exception as e: 
+            Ppp.p(f"[Error.chat_stream] {e}", color="Green")
+            yield sse("error", {"message": str(e)})
+        finally: 
+            if tarea is not None and not tarea.done(): 
+                tarea.cancel()
+
+    return StreamingResponse(
+        eventos(), 
+        media_type="text/event-stream", 
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
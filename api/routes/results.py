@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import HTMLResponse
+from utils.print_colors import Ppp
+from api.dependencies import get_result_store
+from core.config import RESULTS_PAGE_SIZE, RESULTS_MAX_PAGE_SIZE
+from services.formatter import format_page
+from services.result_store import ResultStore
+
+router = APIRouter()
+
+
+def render_page(result_id: str, result: dict, page: int = 1, page_size: int = RESULTS_PAGE_SIZE) -> str: 
+    """
+    Renderiza una pagina del resultado con sus controles de navegacion (htmx). 
+    El bloque completo se reemplaza al cambiar de pagina.
+    """
+    _, tabla, info = format_page(result, page=page, page_size=page_size)
+
+    def boton(texto: str, destino: int, activo: bool) -> str: 
+        if not activo: 
+            return f'<button type="button" disabled>{texto}</button>'
+        return (
+            f'<button type="button" hx-get="/results/{result_id}/page?page={destino}&size={page_size}" '
+            f'hx-target="#res-{result_id}" hx-swap="outerHTML">{texto}</button>'
+        )
+
+    nav = (
+        '<div class="paginacion">'
+        + boton("⏮️", 1, info["page"] > 1)
+        + boton("◀️", info["page"] - 1, info["page"] > 1)
+        + boton("▶️", info["page"] + 1, info["page"] < info["pages"])
+        + boton("⏭️", info["pages"], info["page"] < info["pages"])
+        + "</div>"
+    )
+    return f'<div id="res-{result_id}">{tabla}{nav}</div>'
+
+
+@router.get("/results/{result_id}/page", response_class=HTMLResponse)
+async def result_page(
+    result_id: str, 
+    page: int = 1, 
+    size: int = RESULTS_PAGE_SIZE, 
+    result_store: ResultStore = Depends(get_result_store), 
+):
+    """
+    Devuelve una pagina de un resultado guardado en el servidor. 
+    Las filas se sirven del almacen de resultados, sin volver a consultar la base de datos.
+    """
+    try: 
+        entry = await result_store.get(result_id)
+        if entry is None or "result" not in entry: 
+            return '<div class="msg bot" style="color:red;">El resultado ya no esta disponible, vuelve a hacer la consulta.</div>'
+        size = min(max(1, size), RESULTS_MAX_PAGE_SIZE)
+        return render_page(result_id, entry["result"], page=page, page_size=size)
+    except Exception as e: 
+        Ppp.p(f"[Error.result_page] {e}", color="Green")
+        return f'<div class="msg bot" style="color:red;">Error: {str(e)}</div>'
@@ -0,0 +1,205 @@
+"""
+Benchmark del arranque de un worker: cada corrida es un interprete nuevo (como un reinicio o
+un worker recien escalado) que mide
+
+- import_ms:         `import api.main` (los modulos pesados que se importan al cargar la app).
+- startup_ms:        el lifespan hasta aceptar peticiones (instancias compartidas y calentamiento).
+- first_request_ms:  el primer POST /chat (lo que el calentamiento no dejo listo).
+- second_request_ms: un segundo POST /chat con otra pregunta, como referencia en caliente.
+- process_ms:        el proceso completo visto desde fuera (incluye levantar el interprete).
+
+Como bench_e2e.py, usa FakeLLM y una base SQLite sembrada en lugar de Azure y SQL Server
+(ver benchmarks/standins.py), guarda el JSON en benchmarks/results/ y con `--compare` sale
+con codigo 1 si alguna mediana empeora mas que `--threshold`.
+
+Uso:
+    python benchmarks/bench_boot.py --runs 10
+    python benchmarks/bench_boot.py --runs 10 --no-warmup
+    python benchmarks/bench_boot.py --runs 10 --compare benchmarks/results/boot-abc1234-20250101-120000.json
+"""
+import sys
+import os
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(RAIZ)
+import argparse
+import asyncio
+import contextlib
+import datetime as dt
+import json
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from benchmarks.bench_e2e import _commit, preparar_entorno, resumen
+
+
+# Metricas que se comparan entre corridas (mediana, mayor es peor)
+_COMPARABLES = ["import_ms", "startup_ms", "first_request_ms", "process_ms"]
+# Modulos que no deberian cargarse al arrancar (solo en las rutas que los usan)
+_PESADOS = ["pandas", "sqlalchemy", "pyodbc"]
+
+
+async def _hijo(args) -> dict:
+    """
+    Una corrida: importa la app, la arranca y hace dos peticiones. Corre en su propio interprete.
+    """
+    os.chdir(RAIZ)  # la app monta static/ y views/ con rutas relativas
+    inicio = time.perf_counter()
+    from api.main import app
+    importado = time.perf_counter()
+
+    import httpx
+    from benchmarks.standins import FakeLLM, PREGUNTAS, sqlite_factory
+    from services.connection_pool import get_pool
+    get_pool("sql:local", sqlite_factory(args.db), max_size=args.pool_size)
+    preguntas = list(PREGUNTAS)
+
+    datos = {"import_ms": (importado - inicio) * 1000}
+    arranque = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        datos["startup_ms"] = (time.perf_counter() - arranque) * 1000
+        app.state.llm = FakeLLM(latency=0, token_delay=0)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as cliente:
+            for clave, pregunta in (("first_request_ms", preguntas[0]), ("second_request_ms", preguntas[1])):
+                t = time.perf_counter()
+                r = await cliente.post("/chat", data={"message": pregunta})
+                datos[clave] = (time.perf_counter() - t) * 1000
+                if r.status_code >= 400 or "color:red" in r.text:
+                    datos["errors"] = datos.get("errors", 0) + 1
+        datos["warmup_ms"] = {paso: s * 1000 for paso, s in app.state.warmup.items()}
+    datos["heavy_modules"] = [m for m in _PESADOS if m in sys.modules]
+    datos["modules"] = len(sys.modules)
+    return datos
+
+
+def correr(args) -> dict:
+    ruta = args.db or os.path.join(tempfile.mkdtemp(prefix="bench_boot_"), "bench.db")
+    if args.db is None or not os.path.exists(ruta):
+        from benchmarks.standins import sembrar
+        sembrar(ruta, filas=args.rows, turnos=args.history, seed=args.seed)
+
+    comando = [sys.executable, os.path.abspath(__file__), "--child", "--db", ruta, "--pool-size", str(args.pool_size), "--log-level", args.log_level]
+    if args.no_warmup:
+        comando.append("--no-warmup")
+
+    medidas: Dict[str, List[float]] = defaultdict(list)
+    pasos: Dict[str, List[float]] = defaultdict(list)
+    pesados, modulos, errores = set(), [], 0
+    for i in range(args.runs):
+        inicio = time.perf_counter()
+        salida = subprocess.run(comando, cwd=RAIZ, capture_output=True, text=True, timeout=args.timeout * 4)
+        total = (time.perf_counter() - inicio) * 1000
+        if salida.returncode != 0:
+            print(salida.stderr[-2000:], file=sys.stderr)
+            raise SystemExit(f"[Error.bench_boot] La corrida {i + 1} termino con codigo {salida.returncode}")
+        datos = json.loads(salida.stdout.strip().splitlines()[-1])
+        medidas["process_ms"].append(total)
+        for clave in ("import_ms", "startup_ms", "first_request_ms", "second_request_ms"):
+            medidas[clave].append(datos[clave])
+        for paso, ms in datos["warmup_ms"].items():
+            pasos[paso].append(ms)
+        pesados.update(datos["heavy_modules"])
+        modulos.append(datos["modules"])
+        errores += datos.get("errors", 0)
+
+    return {
+        "meta": {
+            **_commit(),
+            "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "args": {k: v for k, v in vars(args).items() if k not in ("compare", "out", "child", "db")},
+        },
+        "boot_ms": {nombre: resumen(valores) for nombre, valores in medidas.items()},
+        "warmup_ms": {paso: resumen(valores) for paso, valores in pasos.items()},
+        "heavy_modules": sorted(pesados),
+        "modules": max(modulos),
+        "errors": errores,
+    }
+
+
+def imprimir(resultado: dict) -> None:
+    print(f"\nModulos cargados: {resultado['modules']}  | pesados al arrancar: {resultado['heavy_modules'] or 'ninguno'}"
+          f"  | errores: {resultado['errors']}")
+    print(f"\n{'arranque (ms)':<18} | {'n':>4} | {'media':>9} | {'p50':>9} | {'p95':>9} | {'max':>9}")
+    print("-" * 70)
+    for seccion in ("boot_ms", "warmup_ms"):
+        for nombre, datos in resultado[seccion].items():
+            etiqueta = nombre if seccion == "boot_ms" else f"warmup {nombre}"
+            print(f"{etiqueta:<18} | {datos['count']:>4} | {datos['mean']:>9} | {datos['p50']:>9} | {datos['p95']:>9} | {datos['max']:>9}")
+
+
+def comparar(actual: dict, base: dict, umbral: float) -> bool:
+    """
+    Imprime la diferencia de medianas contra una corrida anterior. Devuelve True si hay
+    regresiones mayores a `umbral` (fraccion, p.ej. 0.1 = 10%).
+    """
+    print(f"\nComparacion contra {base['meta'].get('commit')} ({base['meta'].get('timestamp')}):")
+    regresion = False
+    for nombre in _COMPARABLES:
+        antes = base["boot_ms"].get(nombre, {}).get("p50")
+        ahora = actual["boot_ms"].get(nombre, {}).get("p50")
+        if not antes or ahora is None:
+            continue
+        cambio = (ahora - antes) / antes
+        marca = "  <-- regresion" if cambio > umbral else ""
+        regresion |= cambio > umbral
+        print(f"  {nombre:<18} {antes:>10} -> {ahora:>10}  ({cambio:+.1%}){marca}")
+    nuevos = sorted(set(actual["heavy_modules"]) - set(base.get("heavy_modules", [])))
+    if nuevos:
+        print(f"  modulos pesados nuevos al arrancar: {nuevos}  <-- regresion")
+        regresion = True
+    return regresion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="arranques a medir (un interprete nuevo cada uno)")
+    parser.add_argument("--rows", type=int, default=10_000, help="filas sinteticas de Efectividad_Andromeda")
+    parser.add_argument("--history", type=int, default=100, help="turnos sinteticos en Historial_Chat")
+    parser.add_argument("--db", default=None, help="base SQLite a reutilizar (se siembra si no existe)")
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--no-warmup", action="store_true", help="arranca sin el calentamiento del lifespan")
+    parser.add_argument("--out", default=None, help="JSON de salida; por defecto benchmarks/results/boot-<commit>-<fecha>.json")
+    parser.add_argument("--compare", default=None, help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regresion tolerada al comparar (0.10 = 10%%)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.mirror = False
+        if args.no_warmup:
+            os.environ["WARMUP_ENABLED"] = "false"
+        preparar_entorno(args)
+        # Los print de la app ensucian la salida; el JSON va en la ultima linea
+        with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+            datos = asyncio.run(_hijo(args))
+        print(json.dumps(datos))
+        return
+
+    resultado = correr(args)
+    imprimir(resultado)
+
+    salida = args.out or os.path.join(
+        RAIZ, "benchmarks", "results",
+        f"boot-{resultado['meta']['commit'] or 'local'}-{dt.datetime.now():%Y%m%d-%H%M%S}.json",
+    )
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\nResultado guardado en {salida}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = json.load(f)
+        if comparar(resultado, base, args.threshold):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Benchmark de punta a punta de la app (POST /chat + POST /panel) sin Azure ni SQL Server:
+el LLM se sustituye por FakeLLM (latencia configurable) y SQL Server por una base SQLite
+sembrada con Efectividad_Andromeda e Historial_Chat sinteticas (ver benchmarks/standins.py).
+
+La carga es de lazo abierto: llegan `--rate` turnos por segundo durante `--duration` segundos
+(con a lo mas `--concurrency` en vuelo); cada turno es un /chat y, si devolvio tabla, su /panel.
+La latencia del turno se mide desde su llegada programada, asi la espera en cola tambien cuenta.
+
+Reporta p50/p95/p99 por endpoint, throughput, memoria (RSS) y el desglose por etapa del header
+Server-Timing, y guarda el resultado en JSON para comparar entre commits.
+
+Uso:
+    python benchmarks/bench_e2e.py --rate 20 --duration 30 --llm-latency 0.3
+    python benchmarks/bench_e2e.py --rate 20 --duration 30 --compare benchmarks/results/e2e-abc1234.json
+"""
+import sys
+import os
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(RAIZ)
+import argparse
+import asyncio
+import contextlib
+import datetime as dt
+import json
+import random
+import re
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+try:
+    import resource  # no existe en Windows
+except ImportError:
+    resource = None
+
+
+_RESULT_ID = re.compile(r'"result_id":\s*"([0-9a-f]+)"')
+# Metricas que se comparan entre corridas (mayor es peor salvo throughput)
+_COMPARABLES = [("turn", "p50"), ("turn", "p95"), ("turn", "p99"), ("/chat", "p95"), ("/panel", "p95")]
+
+
+def percentil(valores: List[float], p: float) -> Optional[float]:
+    """
+    Percentil `p` (0-100) con interpolacion lineal; None si no hay valores.
+    """
+    if not valores:
+        return None
+    orden = sorted(valores)
+    k = (len(orden) - 1) * p / 100
+    i = int(k)
+    j = min(i + 1, len(orden) - 1)
+    return orden[i] + (orden[j] - orden[i]) * (k - i)
+
+
+def resumen(valores_ms: List[float]) -> Dict[str, Optional[float]]:
+    def r(v):
+        return round(v, 2) if v is not None else None
+    return {
+        "count": len(valores_ms),
+        "mean": r(sum(valores_ms) / len(valores_ms)) if valores_ms else None,
+        "p50": r(percentil(valores_ms, 50)),
+        "p95": r(percentil(valores_ms, 95)),
+        "p99": r(percentil(valores_ms, 99)),
+        "max": r(max(valores_ms)) if valores_ms else None,
+    }
+
+
+def _rss_mb() -> Optional[float]:
+    """
+    RSS actual en MB (Linux) o None.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _rss_pico_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss viene en KB en Linux y en bytes en macOS
+    return round(pico / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def _commit() -> Dict[str, Optional[str]]:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, timeout=10).stdout.strip()
+        sucio = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=RAIZ, capture_output=True, text=True, timeout=10).stdout.strip()
+        return {"commit": sha or None, "dirty": bool(sucio)}
+    except (OSError, subprocess.SubprocessError):
+        return {"commit": None, "dirty": None}
+
+
+def _etapas(header: Optional[str]) -> Dict[str, float]:
+    """
+    Parsea `Server-Timing: llm;dur=812.4, sql;dur=3.1, total;dur=900.0`.
+    """
+    etapas = {}
+    for parte in (header or "").split(","):
+        nombre, _, resto = parte.strip().partition(";dur=")
+        if nombre and resto:
+            try:
+                etapas[nombre] = float(resto)
+            except ValueError:
+                pass
+    return etapas
+
+
+def preparar_entorno(args) -> None:
+    """
+    Variables de entorno de la app para la corrida; se fijan antes de importar api.main
+    porque core.config las lee al importarse. Las que ya existan en el entorno se respetan.
+    """
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:9")
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "bench")
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-02-01")
+    os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT_NAME", "bench")
+    os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false")
+    # El catalogo introspecta sys.objects, que no existe en SQLite
+    os.environ.setdefault("SCHEMA_CATALOG_ENABLED", "false")
+    os.environ.setdefault("LOG_LEVEL", args.log_level)
+    os.environ.setdefault("LOG_FILE", "")
+    os.environ.setdefault("SQL_POOL_MAX_SIZE", str(args.pool_size))
+    if args.mirror: 
+        from benchmarks.standins import TABLA
+        os.environ.setdefault("MIRROR_ENABLED", "true")
+        os.environ.setdefault("MIRROR_TABLES", f"{TABLA}=Fecha:Id")
+        os.environ.setdefault("MIRROR_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_mirror_"), "mirror.db"))
+
+
+async def correr(args) -> dict:
+    import httpx
+    from benchmarks.standins import FakeLLM, PREGUNTAS, TABLERO, sembrar, sqlite_factory
+    from services.connection_pool import get_pool
+    os.chdir(RAIZ)  # la app monta static/ y views/ con rutas relativas
+    from api.main import app
+
+    ruta = args.db or os.path.join(tempfile.mkdtemp(prefix="bench_e2e_"), "bench.db")
+    if args.db is None or not os.path.exists(ruta):
+        inicio = time.perf_counter()
+        sembrar(ruta, filas=args.rows, turnos=args.history, seed=args.seed)
+        print(f"Base sembrada en {ruta} ({args.rows} filas) en {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+    # El ConsultadorSQL del lifespan toma el pool registrado con esta clave
+    get_pool("sql:local", sqlite_factory(ruta), max_size=args.pool_size)
+
+    preguntas = list(TABLERO if args.dashboard else PREGUNTAS)
+    modo = "tablero" if args.dashboard else "simple"
+    rnd = random.Random(args.seed)
+    latencias: Dict[str, List[float]] = defaultdict(list)
+    etapas: Dict[str, List[float]] = defaultdict(list)
+    errores: Dict[str, int] = defaultdict(int)
+    limite = asyncio.Semaphore(args.concurrency)
+
+    async with app.router.lifespan_context(app):
+        llm = FakeLLM(latency=args.llm_latency, jitter=args.llm_jitter)
+        app.state.llm = llm
+        if app.state.mirror is not None: 
+            # La carga medida empieza con el espejo ya copiado
+            await app.state.mirror.arefresh()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as cliente:
+
+            async def post(ruta: str, datos: dict, medir: bool) -> Optional[httpx.Response]:
+                inicio = time.perf_counter()
+                try:
+                    r = await cliente.post(ruta, data=datos)
+                except Exception:
+                    errores[ruta] += 1
+                    return None
+                if medir:
+                    latencias[ruta].append((time.perf_counter() - inicio) * 1000)
+                if r.status_code >= 400 or "color:red" in r.text:
+                    errores[ruta] += 1
+                return r
+
+            async def turno(pregunta: str, llegada: float, medir: bool) -> None:
+                async with limite:
+                    r = await post("/chat", {"message": pregunta, "modo": modo}, medir)
+                    if r is None:
+                        return
+                    if medir:
+                        for nombre, ms in _etapas(r.headers.get("server-timing")).items():
+                            etapas[nombre].append(ms)
+                    match = _RESULT_ID.search(r.text)
+                    if match:
+                        await post("/panel", {"result_id": match.group(1)}, medir)
+                if medir:
+                    latencias["turn"].append((time.perf_counter() - llegada) * 1000)
+
+            # Calentamiento: llena el pool y los caches sin contar en el resultado
+            await asyncio.gather(*(turno(p, time.perf_counter(), False) for p in preguntas))
+
+            rss_inicio = _rss_mb()
+            total = int(args.rate * args.duration)
+            intervalo = 1 / args.rate
+            inicio = time.perf_counter()
+            tareas = []
+            for i in range(total):
+                llegada = inicio + i * intervalo
+                espera = llegada - time.perf_counter()
+                if espera > 0:
+                    await asyncio.sleep(espera)
+                tareas.append(asyncio.create_task(turno(rnd.choice(preguntas), llegada, True)))
+            await asyncio.gather(*tareas)
+            transcurrido = time.perf_counter() - inicio
+
+    return {
+        "meta": {
+            **_commit(),
+            "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "args": {k: v for k, v in vars(args).items() if k not in ("compare", "out")},
+        },
+        "throughput_rps": round(len(latencias["turn"]) / transcurrido, 2),
+        "elapsed_s": round(transcurrido, 2),
+        "latency_ms": {nombre: resumen(valores) for nombre, valores in latencias.items()},
+        "errors": dict(errores),
+        "stages_ms": {nombre: resumen(valores) for nombre, valores in etapas.items()},
+        "memory_mb": {"rss_start": rss_inicio, "rss_end": _rss_mb(), "rss_peak": _rss_pico_mb()},
+        "llm_calls": llm.calls,
+    }
+
+
+def imprimir(resultado: dict) -> None:
+    print(f"\nThroughput: {resultado['throughput_rps']} turnos/s en {resultado['elapsed_s']}s  "
+          f"| errores: {resultado['errors'] or 0}  | memoria (MB): {resultado['memory_mb']}")
+    print(f"\n{'latencia (ms)':<16} | {'n':>6} | {'p50':>9} | {'p95':>9} | {'p99':>9} | {'max':>9}")
+    print("-" * 72)
+    for nombre, datos in resultado["latency_ms"].items():
+        print(f"{nombre:<16} | {datos['count']:>6} | {datos['p50']:>9} | {datos['p95']:>9} | {datos['p99']:>9} | {datos['max']:>9}")
+    print(f"\n{'etapa /chat (ms)':<16} | {'n':>6} | {'media':>9} | {'p50':>9} | {'p95':>9} | {'p99':>9}")
+    print("-" * 72)
+    for nombre, datos in resultado["stages_ms"].items():
+        print(f"{nombre:<16} | {datos['count']:>6} | {datos['mean']:>9} | {datos['p50']:>9} | {datos['p95']:>9} | {datos['p99']:>9}")
+
+
+def comparar(actual: dict, base: dict, umbral: float) -> bool:
+    """
+    Imprime la diferencia contra una corrida anterior. Devuelve True si hay regresiones
+    mayores a `umbral` (fraccion, p.ej. 0.1 = 10%).
+    """
+    print(f"\nComparacion contra {base['meta'].get('commit')} ({base['meta'].get('timestamp')}):")
+    filas = [(f"{nombre} {p}", base["latency_ms"].get(nombre, {}).get(p), actual["latency_ms"].get(nombre, {}).get(p), False)
+             for nombre, p in _COMPARABLES]
+    filas.append(("throughput", base.get("throughput_rps"), actual.get("throughput_rps"), True))
+    regresion = False
+    for nombre, antes, ahora, mayor_es_mejor in filas:
+        if not antes or ahora is None:
+            continue
+        cambio = (ahora - antes) / antes
+        peor = -cambio if mayor_es_mejor else cambio
+        marca = "  <-- regresion" if peor > umbral else ""
+        regresion |= peor > umbral
+        print(f"  {nombre:<14} {antes:>10} -> {ahora:>10}  ({cambio:+.1%}){marca}")
+    return regresion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=10.0, help="turnos por segundo")
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos de carga")
+    parser.add_argument("--concurrency", type=int, default=64, help="turnos en vuelo como maximo")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--rows", type=int, default=100_000, help="filas sinteticas de Efectividad_Andromeda")
+    parser.add_argument("--history", type=int, default=1_000, help="turnos sinteticos en Historial_Chat")
+    parser.add_argument("--db", default=None, help="base SQLite a reutilizar (se siembra si no existe)")
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--mirror", action="store_true", help="resuelve las lecturas en el espejo SQLite local")
+    parser.add_argument("--dashboard", action="store_true", help="preguntas compuestas en modo tablero (varias consultas en paralelo)")
+    parser.add_argument("--verbose", action="store_true", help="muestra los print de la app")
+    parser.add_argument("--out", default=None, help="JSON de salida; por defecto benchmarks/results/e2e-<commit>-<fecha>.json")
+    parser.add_argument("--compare", default=None, help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regresion tolerada al comparar (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    preparar_entorno(args)
+    if args.verbose:
+        resultado = asyncio.run(correr(args))
+    else:
+        # Los print de depuracion de la app ensucian el reporte
+        with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+            resultado = asyncio.run(correr(args))
+    imprimir(resultado)
+
+    salida = args.out or os.path.join(
+        RAIZ, "benchmarks", "results",
+        f"e2e-{resultado['meta']['commit'] or 'local'}-{dt.datetime.now():%Y%m%d-%H%M%S}.json",
+    )
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\nResultado guardado en {salida}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = json.load(f)
+        if comparar(resultado, base, args.threshold):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
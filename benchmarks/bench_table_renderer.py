@@ -0,0 +1,80 @@
+"""
+Micro-benchmark: tabla HTML con pandas (DataFrame + to_html) contra services.table_renderer.
+
+Uso:
+    python benchmarks/bench_table_renderer.py
+    python benchmarks/bench_table_renderer.py --rows 10 1000 100000 --repeat 5
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import argparse
+import datetime as dt
+import random
+import time
+from decimal import Decimal
+import pandas as pd
+from services.table_renderer import render_html_table
+
+
+COLUMNS = ["Id", "Estatus", "Efectividad", "Monto", "Fecha"]
+
+
+def generar_filas(n: int, seed: int = 7) -> list:
+    """
+    Filas sinteticas con los tipos que devuelve pyodbc en Efectividad_Andromeda.
+    """
+    rnd = random.Random(seed)
+    base = dt.datetime(2024, 1, 1)
+    return [
+        [
+            i,
+            rnd.choice(["Activa", "Inactiva", "Pendiente", None]),
+            rnd.random() * 100,
+            Decimal(rnd.randint(0, 10**6)) / 100,
+            base + dt.timedelta(minutes=rnd.randint(0, 10**6)),
+        ]
+        for i in range(n)
+    ]
+
+
+def con_pandas(rows: list) -> str:
+    return pd.DataFrame(rows, columns=COLUMNS).to_html(index=False, classes="dataframe", border=0)
+
+
+def con_renderer(rows: list) -> str:
+    return render_html_table(COLUMNS, rows, classes="dataframe")
+
+
+def medir(fn, rows: list, repeat: int) -> float:
+    """
+    Devuelve el mejor tiempo (segundos) de `repeat` ejecuciones.
+    """
+    mejor = float("inf")
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        fn(rows)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 1_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'filas':>8} | {'pandas (ms)':>12} | {'renderer (ms)':>13} | {'speedup':>7}")
+    print("-" * 50)
+    for n in args.rows:
+        rows = generar_filas(n)
+        if con_pandas(rows) != con_renderer(rows):
+            raise SystemExit(f"[Error] La salida del renderer difiere de pandas con {n} filas")
+        repeat = max(1, args.repeat if n < 100_000 else args.repeat // 2)
+        t_pd = medir(con_pandas, rows, repeat)
+        t_rd = medir(con_renderer, rows, repeat)
+        print(f"{n:>8} | {t_pd * 1000:>12.2f} | {t_rd * 1000:>13.2f} | {t_pd / t_rd:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
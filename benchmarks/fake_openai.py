@@ -0,0 +1,153 @@
+"""
+Servidor local compatible con la API de Azure OpenAI (chat completions y embeddings) para
+probar el LLMService y su planificador sin llamar a Azure: latencia configurable, errores
+429/500 con Retry-After y respuestas en streaming.
+
+Uso:
+    python benchmarks/fake_openai.py --port 8001 --latency 0.3 --error-rate 0.2
+    # en el .env de la app:
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8001
+
+    # Cambiar el comportamiento en caliente (p.ej. simular una caida):
+    curl -X POST http://127.0.0.1:8001/_fake/config -H "Content-Type: application/json" \\
+         -d '{"error_rate": 1.0, "error_status": 503}'
+    curl http://127.0.0.1:8001/_fake/stats
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+config = {
+    "latency": 0.2,           # segundos hasta la respuesta (o el primer token)
+    "token_delay": 0.02,      # segundos entre tokens en streaming
+    "error_rate": 0.0,        # probabilidad de responder con error
+    "error_status": 429,      # codigo del error simulado
+    "retry_after": 1,         # valor de Retry-After en los errores (None para omitirlo)
+    "answer": "SELECT TOP 5 * FROM [RPA].[dbo].[Efectividad_Andromeda];",
+    "answers": {},            # pregunta -> respuesta, tiene prioridad sobre `answer`
+}
+stats = {"chat": 0, "embeddings": 0, "errors": 0, "concurrent": 0, "max_concurrent": 0}
+
+app = FastAPI()
+
+
+def _respuesta(messages: list) -> str:
+    pregunta = messages[-1]["content"] if messages else ""
+    return config["answers"].get(pregunta, config["answer"])
+
+
+def _error():
+    stats["errors"] += 1
+    headers = {}
+    if config["retry_after"] is not None:
+        headers["retry-after"] = str(config["retry_after"])
+    return JSONResponse(
+        status_code=config["error_status"],
+        content={"error": {"code": str(config["error_status"]), "message": "Error simulado por fake_openai"}},
+        headers=headers,
+    )
+
+
+def _usage(messages: list, answer: str) -> dict:
+    prompt = sum(len(m.get("content") or "") for m in messages) // 4
+    completion = len(answer) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request, deployment: str = "fake"):
+    body = await request.json()
+    stats["chat"] += 1
+    stats["concurrent"] += 1
+    stats["max_concurrent"] = max(stats["max_concurrent"], stats["concurrent"])
+    try:
+        await asyncio.sleep(config["latency"])
+        if random.random() < config["error_rate"]:
+            return _error()
+        messages = body.get("messages", [])
+        answer = _respuesta(messages)
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", deployment)}
+
+        if body.get("stream"):
+            async def eventos():
+                # Azure manda primero un chunk sin choices (filtro de contenido)
+                yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': []})}\n\n"
+                for i in range(0, len(answer), 4):
+                    chunk = {**base, "object": "chat.completion.chunk", "choices": [
+                        {"index": 0, "delta": {"content": answer[i:i + 4]}, "finish_reason": None}
+                    ]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(config["token_delay"])
+                fin = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                yield f"data: {json.dumps(fin)}\n\n"
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    uso = {**base, "object": "chat.completion.chunk", "choices": [], "usage": _usage(messages, answer)}
+                    yield f"data: {json.dumps(uso)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(eventos(), media_type="text/event-stream")
+
+        return {
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": _usage(messages, answer),
+        }
+    finally:
+        stats["concurrent"] -= 1
+
+
+@app.post("/openai/deployments/{deployment}/embeddings")
+@app.post("/v1/embeddings")
+async def embeddings(request: Request, deployment: str = "fake"):
+    body = await request.json()
+    stats["embeddings"] += 1
+    textos = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    data = []
+    for i, texto in enumerate(textos):
+        # Vector determinista por texto: la misma pregunta da el mismo embedding
+        semilla = int(hashlib.sha1(texto.encode("utf-8")).hexdigest()[:8], 16)
+        rnd = random.Random(semilla)
+        data.append({"object": "embedding", "index": i, "embedding": [rnd.uniform(-1, 1) for _ in range(64)]})
+    return {"object": "list", "data": data, "model": deployment, "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+
+@app.post("/_fake/config")
+async def set_config(request: Request):
+    config.update(await request.json())
+    return config
+
+
+@app.get("/_fake/stats")
+async def get_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=config["latency"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"])
+    parser.add_argument("--error-status", type=int, default=config["error_status"])
+    parser.add_argument("--retry-after", type=float, default=config["retry_after"])
+    args = parser.parse_args()
+    config.update({
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "error_status": args.error_status,
+        "retry_after": args.retry_after,
+    })
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,240 @@
+"""
+Sustitutos locales para correr la app sin Azure ni SQL Server:
+
+- FakeLLM: misma interfaz que LLMService (ask_llm / astream_llm / discard_answer / aclose), respuestas
+  deterministas por pregunta y latencia configurable.
+- SQLite con las tablas Efectividad_Andromeda e Historial_Chat sembradas con datos
+  sinteticos, detras de una conexion que traduce lo minimo de T-SQL que usa la app
+  (nombres [db].[dbo].[tabla], TOP n, GETDATE()).
+
+Uso:
+    sembrar("/tmp/bench.db", filas=100_000)
+    pool = sqlite_pool("/tmp/bench.db")
+    llm = FakeLLM(latency=0.3, jitter=0.1)
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import asyncio
+import datetime as dt
+import hashlib
+import random
+import re
+import sqlite3
+from typing import AsyncGenerator, Optional
+from services.connection_pool import ConnectionPool
+
+
+TABLA = "[RPA].[dbo].[Efectividad_Andromeda]"
+ESTATUS = ["Activa", "Inactiva", "Pendiente", "Cancelada"]
+REGIONES = ["Norte", "Centro", "Sur", "Occidente", "Oriente"]
+
+# Preguntas de la carga y la respuesta del LLM falso para cada una
+PREGUNTAS = {
+    "¿Cuántas registros activos hay?":
+        f"SELECT COUNT(*) AS total FROM {TABLA} WHERE [Estatus] = 'Activa';",
+    "Efectividad promedio por estatus":
+        f"SELECT [Estatus], AVG([Efectividad]) AS efectividad FROM {TABLA} GROUP BY [Estatus];",
+    "Monto total por region":
+        f"SELECT [Region], SUM([Monto]) AS monto, COUNT(*) AS registros FROM {TABLA} GROUP BY [Region] ORDER BY monto DESC;",
+    "Dame las primeras 5 filas de la tabla de efectividad":
+        f"SELECT TOP 5 * FROM {TABLA};",
+    "Dame las primeras 500 filas de la tabla de efectividad":
+        f"SELECT TOP 500 * FROM {TABLA};",
+    "Registros pendientes con efectividad mayor a 90":
+        f"SELECT TOP 100 [Id], [Region], [Efectividad], [Fecha] FROM {TABLA} WHERE [Estatus] = 'Pendiente' AND [Efectividad] > 90 ORDER BY [Efectividad] DESC;",
+    "Hola":
+        "Hola, Mi nombre es Cikuel, tu agente experto en sql.  ¿En que puedo ayudarte?",
+}
+
+# Preguntas compuestas del modo tablero: varias consultas independientes en una respuesta
+TABLERO = {
+    "Efectividad por estatus y total de registros activos":
+        f"-- Efectividad por estatus\n{PREGUNTAS['Efectividad promedio por estatus']}\n"
+        f"-- Registros activos\n{PREGUNTAS['¿Cuántas registros activos hay?']}",
+    "Monto por region, registros activos y pendientes con efectividad alta":
+        f"-- Monto por region\n{PREGUNTAS['Monto total por region']}\n"
+        f"-- Registros activos\n{PREGUNTAS['¿Cuántas registros activos hay?']}\n"
+        f"-- Pendientes con efectividad mayor a 90\n{PREGUNTAS['Registros pendientes con efectividad mayor a 90']}",
+}
+
+
+# ---------------------------------------------------------------------- #
+# LLM
+# ---------------------------------------------------------------------- #
+class FakeLLM:
+    """
+    Sustituto determinista de LLMService: la respuesta sale de `answers` (o `default`) y la
+    latencia es `latency` mas una fraccion fija de `jitter` que depende solo de la pregunta,
+    de modo que dos corridas con los mismos argumentos hacen exactamente el mismo trabajo.
+    """
+
+    semantic_cache = None
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.0, token_delay: float = 0.01, answers: Optional[dict] = None, default: Optional[str] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.answers = answers if answers is not None else {**PREGUNTAS, **TABLERO}
+        self.default = default or f"SELECT TOP 5 * FROM {TABLA};"
+        self.calls = 0
+
+    def _latencia(self, pregunta: str) -> float:
+        fraccion = int(hashlib.sha1(pregunta.encode("utf-8")).hexdigest()[:4], 16) / 0xFFFF
+        return self.latency + self.jitter * fraccion
+
+    async def ask_llm(self, user_message: str, system_message: str = None, temperatura: float = 0.5, chat_memory: list = None, contexto: Optional[str] = None) -> str:
+        self.calls += 1
+        await asyncio.sleep(self._latencia(user_message))
+        return self.answers.get(user_message, self.default)
+
+    async def ask_dashboard(self, user_message: str, temperatura: float = 0.5, chat_memory: list = None, contexto: Optional[str] = None, max_queries: int = 6) -> str:
+        return await self.ask_llm(user_message, temperatura=temperatura, chat_memory=chat_memory, contexto=contexto)
+
+    async def astream_llm(self, user_message: str, system_message: str = None, temperatura: float = 0.5, chat_memory: list = None, contexto: Optional[str] = None) -> AsyncGenerator[str, None]:
+        self.calls += 1
+        await asyncio.sleep(self._latencia(user_message))
+        answer = self.answers.get(user_message, self.default)
+        for i in range(0, len(answer), 4):
+            yield answer[i:i + 4]
+            await asyncio.sleep(self.token_delay)
+
+    def discard_answer(self, answer: str) -> None:
+        return None
+
+    async def aclose(self) -> None:
+        return None
+
+
+# ---------------------------------------------------------------------- #
+# SQL
+# ---------------------------------------------------------------------- #
+_TRES_PARTES = re.compile(r"(?:\[[^\]]+\]|\w+)\.(?:\[[^\]]+\]|\w+)\.(\[[^\]]+\]|\w+)")
+_DBO = re.compile(r"(?:\[dbo\]|\bdbo)\.", re.IGNORECASE)
+_TOP = re.compile(r"^(\s*SELECT\s+(?:DISTINCT\s+)?)TOP\s*(?:\(\s*(\d+|\?)\s*\)|(\d+))\s*", re.IGNORECASE)
+_GETDATE = re.compile(r"\bGETDATE\(\)", re.IGNORECASE)
+
+
+def tsql_a_sqlite(sql: str, params: tuple = ()) -> tuple:
+    """
+    Traduce el subconjunto de T-SQL que genera la app a SQLite. Devuelve (sql, params):
+    `TOP (?)` pasa a `LIMIT ?` al final, por lo que su parametro se mueve al final.
+    """
+    sql = _TRES_PARTES.sub(r"\1", sql)
+    sql = _DBO.sub("", sql)
+    sql = _GETDATE.sub("CURRENT_TIMESTAMP", sql)
+    match = _TOP.match(sql)
+    if match:
+        limite = match.group(2) or match.group(3)
+        cuerpo = sql[match.end():].rstrip().rstrip(";")
+        sql = f"{match.group(1)}{cuerpo} LIMIT {limite}"
+        if limite == "?" and params:
+            params = tuple(params[1:]) + (params[0],)
+    return sql, params
+
+
+class _CursorSQLite:
+    """
+    Cursor DB-API que traduce cada sentencia antes de ejecutarla; lo demas se delega.
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, params: tuple = ()):
+        sql, params = tsql_a_sqlite(sql, tuple(params))
+        self._cursor.execute(sql, params)
+        return self
+
+    def executemany(self, sql: str, seq):
+        sql, _ = tsql_a_sqlite(sql)
+        self._cursor.executemany(sql, seq)
+        return self
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class _ConexionSQLite:
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def cursor(self) -> _CursorSQLite:
+        return _CursorSQLite(self._conn.cursor())
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+
+def sembrar(ruta: str, filas: int = 100_000, turnos: int = 1_000, seed: int = 7) -> None:
+    """
+    Crea (o recrea) la base SQLite con Efectividad_Andromeda y Historial_Chat sinteticas.
+    """
+    rnd = random.Random(seed)
+    base = dt.datetime(2024, 1, 1)
+    conn = sqlite3.connect(ruta)
+    try:
+        conn.executescript("""
+            DROP TABLE IF EXISTS Efectividad_Andromeda;
+            DROP TABLE IF EXISTS Historial_Chat;
+            CREATE TABLE Efectividad_Andromeda (
+                Id INTEGER PRIMARY KEY, Estatus TEXT, Region TEXT,
+                Efectividad REAL, Monto REAL, Fecha TEXT
+            );
+            CREATE TABLE Historial_Chat (
+                session_id TEXT, date DATETIME DEFAULT CURRENT_TIMESTAMP,
+                user_message TEXT, sql_query TEXT, result TEXT
+            );
+            CREATE INDEX ix_historial_sesion ON Historial_Chat (session_id, date);
+        """)
+        conn.executemany(
+            "INSERT INTO Efectividad_Andromeda VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    i,
+                    rnd.choice(ESTATUS),
+                    rnd.choice(REGIONES),
+                    round(rnd.random() * 100, 2),
+                    round(rnd.uniform(0, 10_000), 2),
+                    (base + dt.timedelta(minutes=rnd.randint(0, 10**6))).isoformat(sep=" "),
+                )
+                for i in range(filas)
+            ),
+        )
+        preguntas = list(PREGUNTAS.items())
+        conn.executemany(
+            "INSERT INTO Historial_Chat (session_id, date, user_message, sql_query, result) VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    f"sesion-{rnd.randint(0, 49)}",
+                    (base + dt.timedelta(seconds=i)).isoformat(sep=" "),
+                    *rnd.choice(preguntas),
+                    "Resultado de ejemplo",
+                )
+                for i in range(turnos)
+            ),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def sqlite_factory(ruta: str):
+    """
+    Fabrica de conexiones a la base SQLite `ruta` con la traduccion de T-SQL.
+    En modo WAL los lectores no bloquean al escritor del historial.
+    """
+    def factory():
+        conn = sqlite3.connect(ruta, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return _ConexionSQLite(conn)
+
+    return factory
+
+
+def sqlite_pool(ruta: str, max_size: int = 10, nombre: str = "sqlite") -> ConnectionPool:
+    """
+    Pool de conexiones a la base SQLite `ruta` (ver `sqlite_factory`).
+    """
+    return ConnectionPool(factory=sqlite_factory(ruta), max_size=max_size, nombre=nombre)
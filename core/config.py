@@ -8,6 +8,18 @@ import os
 
 load_dotenv()
 
+
+def _parse_mapping(texto: str, cast=float) -> dict:
+    """
+    Convierte "Tabla1=300,Tabla2=0" en {"Tabla1": 300.0, "Tabla2": 0.0}.
+    """
+    mapping = {}
+    for par in filter(None, (p.strip() for p in texto.split(","))):
+        clave, _, valor = par.rpartition("=")
+        mapping[clave.strip()] = cast(valor.strip())
+    return mapping
+
+
 # Para llm_service
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
@@ -16,12 +28,125 @@ AZURE_OPENAI_RESOURCE_NAME = os.getenv("AZURE_OPENAI_RESOURCE_NAME")
 AZURE_OPENAI_DEPLOYMENT_EMBEDDING_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_EMBEDDING_NAME")
 AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 
+# Cache semantico pregunta -> SQL (requiere AZURE_OPENAI_DEPLOYMENT_EMBEDDING_NAME)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("1", "true", "si", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+
 # Para sql_connector
 SERVER_SQL = os.getenv("SERVER_SQL")
 DATABASE = os.getenv("DATABASE")
 USER = os.getenv("USER")
 PASSWORD = os.getenv("PASSWORD", "")
 
+# Tabla del historial del chat
+HISTORIAL_TABLE = os.getenv("HISTORIAL_TABLE", "[Agente].[dbo].[Historial_Chat]")
+
+# Pool de conexiones de sql_connector
+SQL_POOL_MIN_SIZE = int(os.getenv("SQL_POOL_MIN_SIZE", "1"))
+SQL_POOL_MAX_SIZE = int(os.getenv("SQL_POOL_MAX_SIZE", "10"))
+SQL_POOL_TIMEOUT = float(os.getenv("SQL_POOL_TIMEOUT", "30"))
+SQL_POOL_PING_AFTER = float(os.getenv("SQL_POOL_PING_AFTER", "5"))
+
+# Ejecutor de consultas fuera del event loop
+SQL_EXECUTOR_MAX_WORKERS = int(os.getenv("SQL_EXECUTOR_MAX_WORKERS", "8"))
+SQL_QUERY_TIMEOUT = float(os.getenv("SQL_QUERY_TIMEOUT", "60"))
+SQL_FETCH_BATCH_SIZE = int(os.getenv("SQL_FETCH_BATCH_SIZE", "1000"))
+
+# Guardia de las consultas generadas por el LLM (solo un SELECT, tope de filas y timeout)
+SQL_GUARD_ENABLED = os.getenv("SQL_GUARD_ENABLED", "true").lower() in ("1", "true", "si", "yes")
+SQL_GUARD_MAX_ROWS = int(os.getenv("SQL_GUARD_MAX_ROWS", "10000"))
+SQL_GUARD_TIMEOUT = float(os.getenv("SQL_GUARD_TIMEOUT", "30"))
+
+# Modo tablero: varias consultas independientes por pregunta, ejecutadas en paralelo
+DASHBOARD_MAX_QUERIES = int(os.getenv("DASHBOARD_MAX_QUERIES", "6"))
+DASHBOARD_CONCURRENCY = int(os.getenv("DASHBOARD_CONCURRENCY", "4"))
+
+# Corridas por lotes (services/batch_runner.py): llamadas al LLM y consultas en vuelo, filas por parte Parquet
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+BATCH_DB_CONCURRENCY = int(os.getenv("BATCH_DB_CONCURRENCY", "4"))
+BATCH_PARQUET_ROWS = int(os.getenv("BATCH_PARQUET_ROWS", "1000"))
+
+# Espejo analitico local (SQLite) de tablas calientes: tabla=columna_watermark[:columna_llave]
+MIRROR_ENABLED = os.getenv("MIRROR_ENABLED", "false").lower() in ("1", "true", "si", "yes")
+MIRROR_TABLES = _parse_mapping(os.getenv("MIRROR_TABLES", ""), cast=str)
+MIRROR_PATH = os.getenv("MIRROR_PATH", "data/mirror.db")
+MIRROR_SYNC_INTERVAL = float(os.getenv("MIRROR_SYNC_INTERVAL", "60"))
+MIRROR_MAX_LAG = float(os.getenv("MIRROR_MAX_LAG", "300"))
+MIRROR_FULL_RESYNC = float(os.getenv("MIRROR_FULL_RESYNC", "86400"))
+MIRROR_BATCH_SIZE = int(os.getenv("MIRROR_BATCH_SIZE", "5000"))
+
+# Almacen de resultados del lado del servidor (/panel)
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", "200"))
+RESULT_STORE_TTL = float(os.getenv("RESULT_STORE_TTL", "1800"))
+
+# Paginacion de resultados grandes
+RESULTS_PAGE_SIZE = int(os.getenv("RESULTS_PAGE_SIZE", "50"))
+RESULTS_MAX_PAGE_SIZE = int(os.getenv("RESULTS_MAX_PAGE_SIZE", "500"))
+
+# Cache de resultados de consultas
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "si", "yes")
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+RESULT_CACHE_TTL_TABLAS = _parse_mapping(os.getenv("RESULT_CACHE_TTL_TABLAS", ""))
+
+# Escritura write-behind del historial de chat
+HISTORY_WRITER_ENABLED = os.getenv("HISTORY_WRITER_ENABLED", "true").lower() in ("1", "true", "si", "yes")
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "50"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+HISTORY_QUEUE_MAX = int(os.getenv("HISTORY_QUEUE_MAX", "10000"))
+HISTORY_QUEUE_POLICY = os.getenv("HISTORY_QUEUE_POLICY", "drop_oldest")  # drop_oldest | drop_new | block
+
+# Cache del historial por sesion y ventana de memoria del LLM
+SESSION_CACHE_MAX_SESSIONS = int(os.getenv("SESSION_CACHE_MAX_SESSIONS", "500"))
+SESSION_CACHE_MAX_TURNS = int(os.getenv("SESSION_CACHE_MAX_TURNS", "200"))
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "2000"))
+MEMORY_STRATEGY = os.getenv("MEMORY_STRATEGY", "recent")  # recent | relevant
+
+# Sesiones por cliente (cookie o header X-Session-ID) y almacen del estado de la sesion
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # memory (un worker) | sqlite (varios workers)
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "data/sessions.db")
+SESSION_COOKIE_NAME = os.getenv("SESSION_COOKIE_NAME", "agente_sid")
+SESSION_COOKIE_MAX_AGE = int(os.getenv("SESSION_COOKIE_MAX_AGE", "2592000"))
+SESSION_COOKIE_SECURE = os.getenv("SESSION_COOKIE_SECURE", "false").lower() in ("1", "true", "si", "yes")
+
+# Calentamiento del worker en el arranque (pool de conexiones, prompt, tokenizador)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "si", "yes")
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "15"))
+
+# Catalogo de esquema para el prompt
+SCHEMA_CATALOG_ENABLED = os.getenv("SCHEMA_CATALOG_ENABLED", "true").lower() in ("1", "true", "si", "yes")
+SCHEMA_TABLES = [t.strip() for t in os.getenv(
+    "SCHEMA_TABLES", "[RPA].[dbo].[Efectividad_Andromeda],[Agente].[dbo].[Historial_Chat]"
+).split(",") if t.strip()]
+SCHEMA_REFRESH_INTERVAL = float(os.getenv("SCHEMA_REFRESH_INTERVAL", "600"))
+SCHEMA_MAX_AGE = float(os.getenv("SCHEMA_MAX_AGE", "3600"))
+SCHEMA_SAMPLE_VALUES = int(os.getenv("SCHEMA_SAMPLE_VALUES", "5"))
+SCHEMA_CONTEXT_MAX_TABLES = int(os.getenv("SCHEMA_CONTEXT_MAX_TABLES", "3"))
+SCHEMA_CONTEXT_MAX_COLUMNS = int(os.getenv("SCHEMA_CONTEXT_MAX_COLUMNS", "25"))
+
+# Planificador de llamadas al LLM (0 = sin limite)
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "300"))
+# Pedir el uso real de tokens al final del streaming (stream_options, api-version 2024-09-01-preview o posterior)
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "false").lower() in ("1", "true", "si", "yes")
+
+# Logging (cola + hilo de escritura, JSON por linea)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = _parse_mapping(os.getenv("LOG_LEVELS", ""), cast=str)  # p.ej. services.sql_connector=WARNING
+LOG_FILE = os.getenv("LOG_FILE", "log/app.log")
+LOG_JSON = os.getenv("LOG_JSON", "true").lower() in ("1", "true", "si", "yes")
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", "2000"))
+LOG_SAMPLE_RATES = _parse_mapping(os.getenv("LOG_SAMPLE_RATES", ""))  # p.ej. sql.ok=0.1,history.insert=0.05
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+
 
 # Funcion para obtener las variables
 
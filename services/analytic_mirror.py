@@ -0,0 +1,847 @@
+"""
+El modulo implementa un espejo analitico local (SQLite) de las tablas mas consultadas y el
+ruteo de las consultas de lectura generadas por el LLM:
+
+- Cada tabla se copia por paginas ordenadas por una columna watermark y despues solo se
+  traen las filas con watermark mayor al ultimo sincronizado (con llave, las filas
+  modificadas se reemplazan). Cada `full_resync` segundos se recarga completa para
+  reflejar los borrados.
+- `translate` convierte un SELECT de T-SQL a SQLite solo cuando el resultado es el mismo
+  en ambos motores; ante cualquier construccion dudosa devuelve None y la consulta se
+  ejecuta en SQL Server.
+- El texto se compara con la colacion UNICODE_CI (mayusculas y minusculas iguales tambien
+  con acentos, como la colacion CI_AS de SQL Server) y LIKE se reemplaza por una version
+  con el mismo criterio; NOCASE y el LIKE de SQLite solo igualan letras ASCII.
+- Los DECIMAL se guardan como REAL (para comparar y ordenar) y las fechas como texto ISO; al
+  leer, las columnas tal cual vuelven a Decimal con su escala y a datetime/date/time. Las
+  expresiones sobre ellas (SUM, AVG, MIN/MAX, aritmetica...) se ejecutan en SQL Server.
+"""
+import asyncio
+import datetime as dt
+import decimal
+import functools
+import itertools
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from services.connection_pool import ConnectionPool, get_pool
+from services.logger import Logger
+from services.metrics import REGISTRY
+from utils.sql_text import (
+    is_select,
+    mask_literals,
+    paren_depths,
+    referenced_tables,
+    split_identifier,
+    split_statements,
+    strip_comments,
+    table_name,
+)
+
+
+MIRROR_QUERIES = REGISTRY.counter("mirror_queries_total", "Consultas de lectura por destino (mirror/sqlserver) y motivo.", ["target", "reason"])
+MIRROR_SYNC_SECONDS = REGISTRY.histogram("mirror_sync_seconds", "Duracion de las sincronizaciones del espejo.", ["mode"])
+
+# Construcciones de T-SQL sin equivalente exacto en SQLite
+_NO_SOPORTADO = re.compile(
+    r"[@#]|::|\b(PIVOT|UNPIVOT|APPLY|XML|JSON|OPTION|OFFSET|FETCH|PERCENT|TIES|COLLATE|TABLESAMPLE|"
+    r"CONTAINS|FREETEXT|INTO|OUTPUT|ROLLUP|CUBE|GROUPING|WITHIN)\b",
+    re.IGNORECASE,
+)
+_JOIN_EXTERNO = re.compile(r"\b(RIGHT|FULL)\s+(OUTER\s+)?JOIN\b", re.IGNORECASE)
+_NOLOCK = re.compile(r"\bWITH\s*\(\s*NOLOCK\s*\)", re.IGNORECASE)
+_HINT = re.compile(r"\bWITH\s*\(", re.IGNORECASE)
+_NOMBRE = r"(?:\[[^\]]*\]|[A-Za-z_][\w$]*)"
+_CALIFICADO = re.compile(rf"{_NOMBRE}(?:\s*\.\s*{_NOMBRE})+")
+_FUNCION = re.compile(r"\b([A-Za-z_]\w*)\s*\(")
+_COLUMNA = re.compile(rf"\s*(?:DISTINCT\s+)?(?:{_NOMBRE}\s*\.\s*)?({_NOMBRE})\s*", re.IGNORECASE)
+_ORDER_BY = re.compile(r"\bORDER\s+BY\b", re.IGNORECASE)
+_ORDINAL = re.compile(r"(?:^|,)\s*\d+\b")
+_IDENTIFICADOR = re.compile(r"\[([^\]]*)\]|\b([A-Za-z_]\w*)\b")
+_LIKE = re.compile(r"\bLIKE\s*N?'", re.IGNORECASE)
+_UNICODE = re.compile(r"\bN'")
+_ARITMETICA = re.compile(r"[-+*/%]")
+_RESULTADO_CASE = re.compile(rf"\b(?:THEN|ELSE)\s+(?:{_NOMBRE}\s*\.\s*)?({_NOMBRE})", re.IGNORECASE)
+_LITERAL = re.compile(r"'[^']*'")
+_SELECT = re.compile(r"\bSELECT\b", re.IGNORECASE)
+_FROM = re.compile(r"\bFROM\b", re.IGNORECASE)
+_CON_NOMBRE = re.compile(
+    rf"\s*(?:\*|(?:{_NOMBRE}\s*\.\s*)*(?:{_NOMBRE}|\*)|.*\bAS\s+(?:{_NOMBRE}|'[^']*')|.*[\w\])']\s+(?!END\b){_NOMBRE})\s*",
+    re.IGNORECASE | re.DOTALL,
+)
+_SET_OP = re.compile(r"\b(UNION|EXCEPT|INTERSECT)\b", re.IGNORECASE)
+_TOP = re.compile(r"\bTOP\b", re.IGNORECASE)
+_MODIFICADOR = re.compile(r"\s*(?:(?:ALL|DISTINCT)\b)?", re.IGNORECASE)
+_TOP_LITERAL = re.compile(r"\s*(?:(?:ALL|DISTINCT)\b\s*)?TOP\s*(?:\(\s*(\d+)\s*\)|(\d+))", re.IGNORECASE)
+_FECHA_ISO = re.compile(r"^(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?)?$")
+_PARECE_FECHA = re.compile(r"^\s*(\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}|\d{8})(?!\d)")
+
+# Palabras que pueden ir seguidas de "(" sin ser una funcion
+_PALABRAS = {
+    "IN", "EXISTS", "AS", "AND", "OR", "NOT", "ON", "OVER", "FROM", "JOIN", "WHERE", "SELECT", "THEN",
+    "ELSE", "WHEN", "BY", "HAVING", "VALUES", "ALL", "ANY", "SOME", "DISTINCT", "CASE", "END", "IS",
+    "LIKE", "BETWEEN", "UNION", "EXCEPT", "INTERSECT", "TOP", "WITH",
+}
+# Funciones con la misma semantica en ambos motores
+_FUNCIONES = {
+    "COUNT", "SUM", "ABS", "ROUND", "COALESCE", "NULLIF", "LTRIM", "RTRIM",
+    "REPLACE", "ROW_NUMBER", "RANK", "DENSE_RANK",
+}
+_RENOMBRES = {"ISNULL": "IFNULL", "SUBSTRING": "SUBSTR"}
+_PARTES_FECHA = {"YEAR": "%Y", "MONTH": "%m", "DAY": "%d"}
+_FUNCIONES_TEXTO = {"UPPER", "LOWER", "LTRIM", "RTRIM", "REPLACE", "SUBSTRING"}
+# Funciones cuyo resultado SQLite compara con BINARY; en SQL Server conserva la colacion de la columna
+_FUNCIONES_COLACION = {"LTRIM", "RTRIM", "REPLACE", "SUBSTRING", "COALESCE", "ISNULL", "NULLIF"}
+# Tipo declarado de cada columna del espejo. Los que terminan en _REAL/_TEXT dan la afinidad
+# (REAL/TEXT) y su nombre completo elige el conversor que restaura el tipo al leer
+_AFINIDAD = {
+    "int": "INTEGER", "real": "REAL", "text": "TEXT", "blob": "BLOB", "inexact": "REAL",
+    "datetime": "DATETIME_TEXT", "date": "DATE_TEXT", "time": "TIME_TEXT",
+}
+# Tipos que solo son exactos leidos tal cual de la columna (con su conversor)
+_CONVERTIDOS = {"decimal", "datetime", "date", "time"}
+_FECHAS = {"datetime", "date", "time"}
+# Digitos significativos que un REAL conserva sin perdida
+_DIGITOS_REAL = 15
+_CONTEXTO_DECIMAL = decimal.Context(prec=38)
+
+
+def _a_decimal(escala: int):
+    exponente = decimal.Decimal(1).scaleb(-escala)
+    return lambda valor: decimal.Decimal(valor.decode()).quantize(exponente, context=_CONTEXTO_DECIMAL)
+
+
+for _escala in range(39):
+    sqlite3.register_converter(f"DECIMAL{_escala}_REAL", _a_decimal(_escala))
+sqlite3.register_converter("DATETIME_TEXT", lambda valor: dt.datetime.fromisoformat(valor.decode()))
+sqlite3.register_converter("DATE_TEXT", lambda valor: dt.date.fromisoformat(valor[:10].decode()))
+sqlite3.register_converter("TIME_TEXT", lambda valor: dt.time.fromisoformat(valor.decode()))
+
+
+# Colacion del texto del espejo: sin distinguir mayusculas en todo Unicode ('Área' = 'área')
+_COLACION = "UNICODE_CI"
+
+
+def _comparar(a: str, b: str) -> int:
+    a, b = a.casefold(), b.casefold()
+    return (a > b) - (a < b)
+
+
+@functools.lru_cache(maxsize=256)
+def _patron_like(patron: str, escape: Optional[str]) -> "re.Pattern":
+    partes, escapado = [], False
+    for c in patron:
+        if escapado:
+            partes.append(re.escape(c.casefold()))
+            escapado = False
+        elif c == escape:
+            escapado = True
+        elif c == "%":
+            partes.append(".*")
+        elif c == "_":
+            partes.append(".")
+        else:
+            partes.append(re.escape(c.casefold()))
+    return re.compile("".join(partes), re.DOTALL)
+
+
+def _like(patron: Optional[str], valor: Any, escape: Optional[str] = None) -> Optional[bool]:
+    """
+    LIKE sin distinguir mayusculas en todo Unicode (el de SQLite solo iguala letras ASCII).
+    Los patrones con '[' no llegan aqui: se ejecutan en SQL Server.
+    """
+    if patron is None or valor is None:
+        return None
+    return _patron_like(str(patron), escape).fullmatch(str(valor).casefold()) is not None
+
+
+def _registrar_funciones(conn: sqlite3.Connection) -> None:
+    """
+    Registra en una conexion del espejo la colacion del texto y el LIKE equivalente al de SQL Server.
+    """
+    conn.create_collation(_COLACION, _comparar)
+    conn.create_function("like", 2, _like, deterministic=True)
+    conn.create_function("like", 3, _like, deterministic=True)
+
+
+def _quote(nombre: str) -> str:
+    return "[" + nombre.replace("]", "]]") + "]"
+
+
+def _kind(valor: Any) -> Optional[str]:
+    """
+    Tipo logico de un valor devuelto por el driver, usado para declarar la columna del espejo.
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, int):
+        return "int"
+    if isinstance(valor, float):
+        return "real"
+    if isinstance(valor, decimal.Decimal):
+        return "decimal"
+    if isinstance(valor, dt.datetime):
+        return "datetime"
+    if isinstance(valor, dt.date):
+        return "date"
+    if isinstance(valor, dt.time):
+        return "time"
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        return "blob"
+    return "text"
+
+
+def _tipo(kind: Optional[str], escala: int = 0) -> Optional[str]:
+    """
+    Tipo declarado de una columna del espejo (None = sin afinidad).
+    """
+    if kind == "decimal":
+        return f"DECIMAL{escala}_REAL"
+    return _AFINIDAD.get(kind)
+
+
+def _escala(valor: Any) -> int:
+    exponente = valor.as_tuple().exponent if isinstance(valor, decimal.Decimal) else 0
+    return min(max(-exponente, 0), 38) if isinstance(exponente, int) else 0
+
+
+def _exacto(valor: Any) -> bool:
+    """
+    True si el Decimal cabe en un REAL sin perder digitos.
+    """
+    return not isinstance(valor, decimal.Decimal) or (valor.is_finite() and len(valor.as_tuple().digits) <= _DIGITOS_REAL)
+
+
+def _valor(valor: Any) -> Any:
+    """
+    Convierte un valor del driver al que se guarda en SQLite. Las fechas se guardan como texto
+    ISO 'YYYY-MM-DD HH:MM:SS[.ffffff]' (las de tipo date a medianoche) para que se comparen
+    igual que en SQL Server; el texto pierde los espacios finales, que SQL Server ignora al comparar
+    (por eso los literales con espacios finales no se rutean al espejo). Los Decimal se guardan
+    como REAL y el conversor de la columna les devuelve su escala al leer.
+    """
+    if valor is None or isinstance(valor, (int, float)):
+        return valor
+    if isinstance(valor, str):
+        return valor.rstrip(" ")
+    if isinstance(valor, decimal.Decimal):
+        return float(valor)
+    if isinstance(valor, dt.datetime):
+        return valor.isoformat(sep=" ")
+    if isinstance(valor, dt.date):
+        return f"{valor.isoformat()} 00:00:00"
+    if isinstance(valor, dt.time):
+        return valor.isoformat()
+    if isinstance(valor, (bytearray, memoryview)):
+        return bytes(valor)
+    return valor if isinstance(valor, bytes) else str(valor)
+
+
+def _fecha_literal(texto: str) -> Optional[str]:
+    """
+    Normaliza un literal de fecha ISO al formato con el que se guardan las fechas en el espejo.
+    Devuelve el texto sin cambios si no parece fecha, o None si es una fecha en otro formato
+    (SQL Server la interpretaria segun el idioma de la sesion).
+    """
+    if not _PARECE_FECHA.match(texto):
+        return texto
+    fecha = _FECHA_ISO.match(texto.strip())
+    if fecha is None:
+        return None
+    y, m, d, hh, mi, ss, frac = fecha.groups()
+    fraccion = (frac or "").ljust(6, "0")
+    fraccion = f".{fraccion}" if fraccion and int(fraccion) else ""
+    return f"{y}-{m}-{d} {hh or '00'}:{mi or '00'}:{ss or '00'}{fraccion}"
+
+
+def _identificadores(texto: str) -> set:
+    """
+    Nombres (en minusculas) que aparecen en `texto`, con o sin corchetes.
+    """
+    return {(i.group(1) or i.group(2) or "").lower() for i in _IDENTIFICADOR.finditer(texto)}
+
+
+def _cierre(masked: str, abre: int) -> Optional[int]:
+    """
+    Posicion del parentesis que cierra al que esta en `abre`.
+    """
+    profundidad = 0
+    for i in range(abre, len(masked)):
+        if masked[i] == "(":
+            profundidad += 1
+        elif masked[i] == ")":
+            profundidad -= 1
+            if profundidad == 0:
+                return i
+    return None
+
+
+class _Tabla:
+    """
+    Estado de sincronizacion de una tabla del espejo.
+    """
+
+    def __init__(self, identifier: str, watermark: str, key: Optional[str]):
+        self.identifier = identifier
+        self.parts = [p.lower() for p in split_identifier(identifier)]
+        self.name = split_identifier(identifier)[-1]
+        self.watermark = watermark
+        self.key = key
+        self.columns: Optional[List[str]] = None
+        self.kinds: Dict[str, Optional[str]] = {}  # "inexact": decimal que no cabe en un REAL
+        self.last_value: Any = None
+        self.rows = 0
+        self.synced_at: Optional[float] = None
+        self.full_at = 0.0
+        self.full = True
+        self.stale = False
+        self.changes = 0
+
+
+class AnalyticMirror:
+    """
+    Espejo SQLite de tablas permitidas, sincronizado desde SQL Server a traves de ConsultadorSQL.
+
+    - `refresh` (bloqueante) trae las filas nuevas de cada tabla; la primera vez, tras un DDL o
+      cada `full_resync` segundos la recarga completa en una tabla nueva que reemplaza a la
+      anterior en una sola transaccion (los lectores nunca ven una carga a medias).
+    - Las escrituras que pasan por el consultador marcan la tabla como desfasada: deja de
+      rutearse al espejo hasta la siguiente sincronizacion, que se adelanta.
+    - `translate(sql)` devuelve la sentencia para SQLite o None si debe ir a SQL Server.
+    - Las lecturas usan un pool de conexiones de solo lectura (`pool`).
+
+    Uso:
+        mirror = AnalyticMirror(consultador, {"[RPA].[dbo].[Efectividad_Andromeda]": "Fecha:Id"})
+        await mirror.arefresh()
+        sql = mirror.translate("SELECT COUNT(*) FROM [RPA].[dbo].[Efectividad_Andromeda]")
+    """
+
+    def __init__(
+        self,
+        consultador: Any,
+        tables: Dict[str, str],
+        path: str = "data/mirror.db",
+        max_lag: float = 300,
+        full_resync: float = 86400,
+        batch_size: int = 5000,
+        pool_size: int = 4,
+        max_translations: int = 512,
+        index_max_distinct: int = 1000,
+    ):
+        """
+        Args:
+            consultador (ConsultadorSQL): consultador usado para leer las tablas de origen.
+            tables (dict): identificador de la tabla -> "columna_watermark" o
+                "columna_watermark:columna_llave". Sin llave la tabla se trata como de solo
+                inserciones (las filas modificadas se duplicarian hasta la siguiente recarga).
+            path (str): archivo SQLite del espejo.
+            max_lag (float): segundos maximos desde la ultima sincronizacion para usar una tabla.
+            full_resync (float): segundos entre recargas completas.
+            batch_size (int): filas por pagina al leer del origen.
+            pool_size (int): conexiones de lectura al espejo.
+            max_translations (int): traducciones que se recuerdan por sentencia.
+            index_max_distinct (int): se indexan las columnas de texto con hasta estos valores distintos.
+        Raises:
+            ValueError: si dos tablas tienen el mismo nombre simple o falta la columna watermark.
+        """
+        self.consultador = consultador
+        self.path = path
+        self.max_lag = max_lag
+        self.full_resync = full_resync
+        self.batch_size = batch_size
+        self.max_translations = max_translations
+        self.index_max_distinct = index_max_distinct
+
+        self._tablas: Dict[str, _Tabla] = {}
+        for identifier, columnas in tables.items():
+            watermark, _, key = columnas.partition(":")
+            if not watermark.strip():
+                raise ValueError(f"[Error.AnalyticMirror] Falta la columna watermark de {identifier}")
+            tabla = _Tabla(identifier, watermark.strip(), key.strip() or None)
+            if table_name(identifier) in self._tablas:
+                raise ValueError(f"[Error.AnalyticMirror] Hay dos tablas llamadas {tabla.name}")
+            self._tablas[table_name(identifier)] = tabla
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._escritor = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        _registrar_funciones(self._escritor)
+        self._escritor.execute("PRAGMA journal_mode=WAL")
+        self._escritor.execute("PRAGMA synchronous=NORMAL")
+        self.pool: ConnectionPool = get_pool(f"mirror:{path}", self._conexion_lectura, min_size=0, max_size=pool_size)
+
+        self._sync_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._traducciones: "OrderedDict[str, Tuple[Optional[str], str, List[str]]]" = OrderedDict()
+        self._closed = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats = {"syncs": 0, "sync_errors": 0, "full_loads": 0, "rows_synced": 0, "queries_mirror": 0, "queries_sqlserver": 0, "fallbacks": 0}
+
+        consultador.add_table_listener(self.mark_stale)
+
+    def _conexion_lectura(self) -> sqlite3.Connection:
+        # PARSE_DECLTYPES: los conversores de DECIMAL*_REAL y *_TEXT restauran Decimal y fechas
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES)
+        _registrar_funciones(conn)
+        # El espejo solo se escribe desde la sincronizacion
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    # ------------------------------------------------------------------ #
+    # Ruteo
+    # ------------------------------------------------------------------ #
+    def translate(self, sql: str) -> Optional[str]:
+        """
+        Devuelve `sql` traducida a SQLite si puede resolverse en el espejo con el mismo
+        resultado, o None si debe ejecutarse en SQL Server.
+        """
+        if self._closed:
+            return None
+        with self._lock:
+            cacheada = self._traducciones.get(sql)
+            if cacheada is not None:
+                self._traducciones.move_to_end(sql)
+        if cacheada is None:
+            cacheada = self._traducir(sql)
+            with self._lock:
+                self._traducciones[sql] = cacheada
+                while len(self._traducciones) > self.max_translations:
+                    self._traducciones.popitem(last=False)
+        traducida, motivo, nombres = cacheada
+
+        if traducida is not None:
+            ahora = time.time()
+            for nombre in nombres:
+                tabla = self._tablas[nombre]
+                if tabla.stale or tabla.synced_at is None or ahora - tabla.synced_at > self.max_lag:
+                    traducida, motivo = None, "desfasada"
+                    break
+
+        destino = "mirror" if traducida is not None else "sqlserver"
+        MIRROR_QUERIES.inc(target=destino, reason=motivo)
+        with self._lock:
+            self._stats[f"queries_{destino}"] += 1
+        if traducida is None:
+            Logger.debug("[AnalyticMirror] Consulta a SQL Server (%s): %s", motivo, sql, event="mirror.route")
+        return traducida
+
+    def fallback(self, sql: str, error: Exception) -> None:
+        """
+        Registra que una consulta traducida fallo en el espejo y se reintenta en SQL Server.
+        """
+        MIRROR_QUERIES.inc(target="sqlserver", reason="error")
+        with self._lock:
+            self._stats["fallbacks"] += 1
+        Logger.warning("[AnalyticMirror] Fallo en el espejo, se usa SQL Server (%s): %s", error, sql, event="mirror.error")
+
+    def _traducir(self, sql: str) -> Tuple[Optional[str], str, List[str]]:
+        """
+        Traduce un SELECT de T-SQL a SQLite. Devuelve (sql, motivo, tablas); sql es None
+        cuando la traduccion no es segura y `motivo` explica por que.
+        """
+        sentencias = split_statements(strip_comments(sql))
+        if len(sentencias) != 1 or not is_select(sentencias[0]):
+            return None, "no_select", []
+        s = sentencias[0]
+        m = mask_literals(s)
+        if _NO_SOPORTADO.search(m) or (sqlite3.sqlite_version_info < (3, 39) and _JOIN_EXTERNO.search(m)):
+            return None, "sintaxis", []
+
+        nombres = sorted(referenced_tables(s))
+        if not nombres or any(n not in self._tablas for n in nombres):
+            return None, "tabla", []
+        tablas = [self._tablas[n] for n in nombres]
+        if any(t.columns is None for t in tablas):
+            return None, "desfasada", []
+        kinds: Dict[str, Optional[str]] = {}
+        for tabla in tablas:
+            for columna, kind in tabla.kinds.items():
+                kinds[columna] = "text" if "text" in (kind, kinds.get(columna)) else kind
+        texto = {c for c, k in kinds.items() if k == "text"}
+        # Decimal y fechas solo son exactos leidos tal cual; como operandos se resuelven en SQL Server
+        convertidas = {c for t in tablas for c, k in t.kinds.items() if k in _CONVERTIDOS}
+        fechas = {c for t in tablas for c, k in t.kinds.items() if k in _FECHAS}
+        if any(k == "inexact" for t in tablas for k in t.kinds.values()):
+            return None, "tipo", []
+
+        cambios: List[Tuple[int, int, str]] = []
+
+        # Nombres de 2 y 3 partes: solo las tablas del espejo, con su misma base y esquema
+        for q in _CALIFICADO.finditer(m):
+            partes = [p.lower() for p in split_identifier(s[q.start():q.end()])]
+            tabla = self._tablas.get(partes[-1])
+            if tabla is not None and tabla.parts[-len(partes):] == partes:
+                cambios.append((q.start(), q.end(), _quote(tabla.name)))
+            elif tabla is not None or len(partes) >= 3:
+                return None, "tabla", []
+
+        # El unico hint de tabla que se acepta es NOLOCK, que en SQLite no hace falta
+        hints = list(_NOLOCK.finditer(m))
+        if len(_HINT.findall(m)) > len(hints):
+            return None, "sintaxis", []
+        cambios += [(h.start(), h.end(), "") for h in hints]
+
+        for u in _UNICODE.finditer(m):
+            cambios.append((u.start(), u.start() + 1, ""))
+        for like in _LIKE.finditer(m):
+            literal = _LITERAL.match(s, like.end() - 1)
+            if literal is None or "[" in literal.group(0):
+                return None, "sintaxis", []
+
+        hay_fechas = bool(fechas)
+        for literal in _LITERAL.finditer(m):
+            contenido = s[literal.start() + 1:literal.end() - 1]
+            if contenido != contenido.rstrip(" "):
+                # En el espejo el texto se guarda sin espacios finales
+                return None, "espacios", []
+            if not hay_fechas or "'" in contenido:
+                continue
+            normal = _fecha_literal(contenido)
+            if normal is None:
+                return None, "fecha", []
+            if normal != contenido:
+                cambios.append((literal.start() + 1, literal.end() - 1, normal))
+
+        for f in _FUNCION.finditer(m):
+            nombre = f.group(1).upper()
+            abre = f.end() - 1
+            if nombre in _PALABRAS:
+                continue
+            if convertidas:
+                cierre = _cierre(m, abre)
+                if cierre is None:
+                    return None, "sintaxis", []
+                usadas = _identificadores(s[abre + 1:cierre]) & convertidas
+                if usadas and not (nombre == "COUNT" or nombre in _PARTES_FECHA and usadas <= fechas):
+                    return None, "tipo", []
+            if nombre in _FUNCIONES_COLACION:
+                cierre = _cierre(m, abre)
+                if cierre is None:
+                    return None, "sintaxis", []
+                cambios.append((cierre, cierre + 1, f") COLLATE {_COLACION}"))
+            if nombre in _FUNCIONES:
+                continue
+            if nombre in _RENOMBRES:
+                cambios.append((f.start(1), f.end(1), _RENOMBRES[nombre]))
+                continue
+            cierre = _cierre(m, abre)
+            if cierre is None:
+                return None, "sintaxis", []
+            columna = _COLUMNA.fullmatch(s, abre + 1, cierre)
+            kind = kinds.get(columna.group(1).strip("[]").lower()) if columna else None
+            if nombre == "LEN":
+                cambios += [(f.start(1), abre + 1, "LENGTH(RTRIM("), (cierre, cierre + 1, "))")]
+            elif nombre in _PARTES_FECHA:
+                cambios += [(f.start(1), abre + 1, f"CAST(strftime('{_PARTES_FECHA[nombre]}', "), (cierre, cierre + 1, ") AS INTEGER)")]
+            elif nombre == "AVG":
+                # En SQL Server el promedio de enteros es entero (truncado)
+                if kind == "int":
+                    cambios += [(f.start(1), f.start(1), "CAST("), (cierre, cierre + 1, ") AS INTEGER)")]
+                elif kind != "real":
+                    return None, "funcion", []
+            elif nombre in ("MIN", "MAX"):
+                # El orden del texto depende de la colacion
+                if kind == "text" or kind is None and columna is not None:
+                    return None, "colacion", []
+            else:
+                return None, "funcion", []
+
+        for operador in _ARITMETICA.finditer(m):
+            operandos = re.search(rf"({_NOMBRE})$", s[:operador.start()].rstrip()), re.match(rf"(?:{_NOMBRE}\s*\.\s*)?({_NOMBRE})", s[operador.end():].lstrip())
+            if any(o is not None and o.group(1).strip("[]").lower() in convertidas for o in operandos):
+                return None, "tipo", []
+        for resultado in _RESULTADO_CASE.finditer(s):
+            if resultado.group(1).strip("[]").lower() in convertidas:
+                return None, "tipo", []
+
+        # '+' concatena texto en T-SQL y suma en SQLite
+        for mas in re.finditer(r"\+", m):
+            izquierda, derecha = m[:mas.start()].rstrip(), m[mas.end():].lstrip()
+            if izquierda.endswith("'") or derecha.startswith(("'", "N'")):
+                return None, "concatenacion", []
+            operandos = re.search(rf"({_NOMBRE})$", s[:mas.start()].rstrip()), re.match(rf"(?:{_NOMBRE}\s*\.\s*)?({_NOMBRE})", s[mas.end():].lstrip())
+            if any(o is not None and o.group(1).strip("[]").lower() in texto for o in operandos):
+                return None, "concatenacion", []
+            if any(f.group(1).upper() in _FUNCIONES_TEXTO for f in _FUNCION.finditer(m)):
+                return None, "concatenacion", []
+
+        # ORDER BY sobre texto (o por posicion) depende de la colacion
+        for orden in _ORDER_BY.finditer(m):
+            fin = _cierre("(" + m[orden.end():], 0)
+            clausula = s[orden.end():orden.end() + fin - 1 if fin is not None else len(s)]
+            if _ORDINAL.search(mask_literals(clausula)):
+                return None, "colacion", []
+            for ident in _IDENTIFICADOR.finditer(clausula):
+                if (ident.group(1) or ident.group(2) or "").lower() in texto:
+                    return None, "colacion", []
+
+        niveles = paren_depths(m)
+        principal = next((x for x in _SELECT.finditer(m) if niveles[x.start()] == 0), None)
+        if principal is None:
+            return None, "sintaxis", []
+        limite, inicio = "", _MODIFICADOR.match(m, principal.end()).end()
+        tops = list(_TOP.finditer(m))
+        if tops:
+            top = _TOP_LITERAL.match(m, principal.end())
+            if len(tops) > 1 or top is None or any(niveles[x.start()] == 0 for x in _SET_OP.finditer(m)):
+                return None, "sintaxis", []
+            fin = top.end()
+            while fin < len(m) and m[fin] == " ":
+                fin += 1
+            cambios.append((tops[0].start(), fin, ""))
+            limite, inicio = f" LIMIT {top.group(1) or top.group(2)}", top.end()
+
+        # SQL Server deja sin nombre las expresiones sin alias; SQLite las nombra con su texto
+        desde = next((x.start() for x in _FROM.finditer(m, inicio) if niveles[x.start()] == 0), len(m))
+        for i in [i for i in range(inicio, desde) if m[i] == "," and niveles[i] == 0] + [desde]:
+            if _CON_NOMBRE.fullmatch(m, inicio, i) is None:
+                fin = len(s[:i].rstrip())
+                cambios.append((fin, fin, ' AS ""'))
+            inicio = i + 1
+
+        cambios.sort()
+        for (_, fin_a, _), (inicio_b, _, _) in zip(cambios, cambios[1:]):
+            if inicio_b < fin_a:
+                return None, "sintaxis", []
+        traducida = s
+        for inicio, fin, reemplazo in reversed(cambios):
+            traducida = traducida[:inicio] + reemplazo + traducida[fin:]
+        return traducida.strip() + limite, "ok", nombres
+
+    # ------------------------------------------------------------------ #
+    # Sincronizacion
+    # ------------------------------------------------------------------ #
+    def mark_stale(self, tables: List[str], ddl: bool = False) -> None:
+        """
+        Marca tablas modificadas por una escritura del consultador: dejan de rutearse al espejo
+        hasta sincronizarse (tras un DDL, con recarga completa) y se adelanta la sincronizacion.
+        """
+        afectadas = [self._tablas[t] for t in map(table_name, tables) if t in self._tablas]
+        if not afectadas:
+            return
+        with self._lock:
+            for tabla in afectadas:
+                tabla.stale = True
+                tabla.changes += 1
+                tabla.full = tabla.full or ddl
+        if self._wakeup is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def refresh(self, full: bool = False) -> int:
+        """
+        Sincroniza todas las tablas (bloqueante). Un fallo en una tabla no detiene las demas;
+        la tabla fallida se recarga completa en el siguiente intento.
+
+        Returns:
+            int: tablas sincronizadas.
+        """
+        sincronizadas = 0
+        with self._sync_lock:
+            for tabla in self._tablas.values():
+                if self._closed:
+                    break
+                completa = full or tabla.full or time.time() - tabla.full_at > self.full_resync
+                try:
+                    self._sincronizar(tabla, completa)
+                    sincronizadas += 1
+                except Exception as e:
+                    tabla.full = True
+                    with self._lock:
+                        self._stats["sync_errors"] += 1
+                    Logger.warning(f"[AnalyticMirror] No se pudo sincronizar {tabla.identifier}: {e}", event="mirror.sync")
+        return sincronizadas
+
+    async def arefresh(self, full: bool = False) -> int:
+        """
+        Version async de `refresh`. Corre en un hilo propio y no en el ejecutor SQL: una recarga
+        completa puede durar mas que el timeout de las consultas.
+        """
+        return await asyncio.to_thread(self.refresh, full)
+
+    async def run_auto_refresh(self, interval: float) -> None:
+        """
+        Sincroniza al arrancar y despues cada `interval` segundos, o antes si una escritura
+        marco alguna tabla. Pensado para correr como tarea de fondo del lifespan.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await self.arefresh()
+            except Exception as e:
+                Logger.warning(f"[AnalyticMirror] Fallo la sincronizacion del espejo: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _sincronizar(self, tabla: _Tabla, completa: bool) -> None:
+        inicio, reloj = time.time(), time.perf_counter()
+        cambios = tabla.changes
+        destino = f"{tabla.name}__carga" if completa else tabla.name
+        conn = self._escritor
+        filas, ultimo = 0, None if completa else tabla.last_value
+        columnas: Optional[List[str]] = None if completa else tabla.columns
+        kinds = {} if completa else dict(tabla.kinds)
+        escalas: Dict[str, int] = {}
+
+        conn.execute("BEGIN")
+        try:
+            if completa:
+                conn.execute(f"DROP TABLE IF EXISTS {_quote(destino)}")
+                # Las filas sin watermark solo llegan en las recargas completas
+                nulos = self.consultador.fetch_all(f"SELECT * FROM {tabla.identifier} WHERE {_quote(tabla.watermark)} IS NULL")
+                paginas = itertools.chain([(*nulos, None)], self._paginas(tabla, None))
+            else:
+                paginas = self._paginas(tabla, ultimo)
+
+            insert, nombres = None, columnas
+            for nombres, rows, ultimo_pagina in paginas:
+                if self._closed:
+                    raise RuntimeError("el espejo se cerro durante la sincronizacion")
+                if not rows:
+                    continue
+                creada = insert is not None or not completa
+                for i, columna in enumerate(nombres):
+                    clave = columna.lower()
+                    if kinds.get(clave) is None:
+                        primero = next((r[i] for r in rows if r[i] is not None), None)
+                        kinds[clave] = _kind(primero)
+                        escalas[clave] = _escala(primero)
+                        if creada and kinds[clave] in _CONVERTIDOS:
+                            # La columna se creo sin tipo (solo nulos hasta ahora): no hay conversor al leer
+                            kinds[clave] = "inexact"
+                    if kinds[clave] == "decimal" and not all(_exacto(r[i]) for r in rows):
+                        kinds[clave] = "inexact"
+                if insert is None:
+                    if completa:
+                        columnas = list(nombres)
+                        self._crear_tabla(destino, columnas, kinds, escalas)
+                    elif [c.lower() for c in nombres] != [c.lower() for c in columnas]:
+                        raise LookupError(f"cambiaron las columnas de {tabla.identifier}")
+                    verbo = "INSERT OR REPLACE" if tabla.key and not completa else "INSERT"
+                    insert = f"{verbo} INTO {_quote(destino)} ({', '.join(map(_quote, columnas))}) VALUES ({', '.join('?' * len(columnas))})"
+                conn.executemany(insert, ([_valor(v) for v in row] for row in rows))
+                filas += len(rows)
+                if ultimo_pagina is not None:
+                    ultimo = ultimo_pagina
+            if completa and insert is None:
+                # Tabla vacia en el origen: las columnas quedan sin afinidad
+                columnas = list(nombres)
+                self._crear_tabla(destino, columnas, kinds, escalas)
+
+            if completa:
+                conn.execute(f"DROP TABLE IF EXISTS {_quote(tabla.name)}")
+                conn.execute(f"ALTER TABLE {_quote(destino)} RENAME TO {_quote(tabla.name)}")
+                if tabla.key:
+                    conn.execute(f"CREATE UNIQUE INDEX {_quote('ux_' + tabla.name)} ON {_quote(tabla.name)} ({_quote(tabla.key)})")
+                self._indexar(tabla.name, columnas, kinds)
+            total = conn.execute(f"SELECT COUNT(*) FROM {_quote(tabla.name)}").fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._lock:
+            tabla.columns, tabla.kinds, tabla.last_value, tabla.rows = columnas, kinds, ultimo, total
+            tabla.synced_at = inicio
+            tabla.stale = tabla.changes != cambios
+            if completa:
+                tabla.full, tabla.full_at = False, inicio
+                # Los tipos de las columnas pudieron cambiar
+                self._traducciones.clear()
+            self._stats["syncs"] += 1
+            self._stats["full_loads"] += int(completa)
+            self._stats["rows_synced"] += filas
+        modo = "full" if completa else "incremental"
+        MIRROR_SYNC_SECONDS.observe(time.perf_counter() - reloj, mode=modo)
+        Logger.info("[AnalyticMirror] %s sincronizada (%s): %d filas nuevas, %d en total", tabla.identifier, modo, filas, total, event="mirror.sync")
+
+    def _crear_tabla(self, nombre: str, columnas: List[str], kinds: Dict[str, Optional[str]], escalas: Dict[str, int]) -> None:
+        """
+        Crea la tabla del espejo. El tipo declarado sale del tipo de los valores del origen (ver
+        `_AFINIDAD`) y el texto se compara sin distinguir mayusculas (tambien las acentuadas),
+        como la colacion CI por defecto de SQL Server.
+        """
+        definicion = ", ".join(
+            " ".join(filter(None, (_quote(c), _tipo(kinds.get(c.lower()), escalas.get(c.lower(), 0)), f"COLLATE {_COLACION}"))) for c in columnas
+        )
+        self._escritor.execute(f"CREATE TABLE {_quote(nombre)} ({definicion})")
+
+    def _indexar(self, nombre: str, columnas: List[str], kinds: Dict[str, Optional[str]]) -> None:
+        """
+        Indexa las columnas de texto con pocos valores distintos (estatus, region...), que son
+        las de los filtros y GROUP BY de las preguntas, y actualiza las estadisticas del planificador.
+        """
+        for columna in columnas:
+            if kinds.get(columna.lower()) != "text":
+                continue
+            distintos = self._escritor.execute(
+                f"SELECT COUNT(*) FROM (SELECT DISTINCT {_quote(columna)} FROM {_quote(nombre)} LIMIT ?)", (self.index_max_distinct + 1,)
+            ).fetchone()[0]
+            if distintos <= self.index_max_distinct:
+                self._escritor.execute(f"CREATE INDEX {_quote(f'ix_{nombre}_{columna}')} ON {_quote(nombre)} ({_quote(columna)})")
+        self._escritor.execute(f"ANALYZE {_quote(nombre)}")
+
+    def _paginas(self, tabla: _Tabla, desde: Any) -> Iterator[Tuple[List[str], list, Any]]:
+        """
+        Lee del origen las filas con watermark mayor a `desde` (todas si es None) en paginas
+        de `batch_size` ordenadas por el watermark. Entrega (columnas, filas, ultimo_watermark).
+        Si una pagina corta un grupo de filas con el mismo watermark, el grupo se lee completo
+        para no perder filas al continuar con '>'.
+        """
+        watermark = _quote(tabla.watermark)
+        ultimo = desde
+        while True:
+            if ultimo is None:
+                columnas, rows = self.consultador.fetch_all(
+                    f"SELECT TOP (?) * FROM {tabla.identifier} WHERE {watermark} IS NOT NULL ORDER BY {watermark}", (self.batch_size,)
+                )
+            else:
+                columnas, rows = self.consultador.fetch_all(
+                    f"SELECT TOP (?) * FROM {tabla.identifier} WHERE {watermark} > ? ORDER BY {watermark}", (self.batch_size, ultimo)
+                )
+            if not rows:
+                return
+            i = [c.lower() for c in columnas].index(tabla.watermark.lower())
+            if len(rows) < self.batch_size:
+                yield columnas, rows, rows[-1][i]
+                return
+            empate = rows[-1][i]
+            _, grupo = self.consultador.fetch_all(f"SELECT * FROM {tabla.identifier} WHERE {watermark} = ?", (empate,))
+            yield columnas, [r for r in rows if r[i] != empate] + list(grupo), empate
+            ultimo = empate
+
+    # ------------------------------------------------------------------ #
+    # Estado
+    # ------------------------------------------------------------------ #
+    def stats(self) -> Dict[str, Any]:
+        ahora = time.time()
+        with self._lock:
+            datos = dict(self._stats)
+            tablas = list(self._tablas.values())
+        listas = [t for t in tablas if t.synced_at is not None]
+        datos.update({
+            "tables": len(tablas),
+            "ready": sum(1 for t in listas if not t.stale),
+            "rows": sum(t.rows for t in tablas),
+            "lag_seconds": max((ahora - t.synced_at for t in listas), default=0.0),
+        })
+        return datos
+
+    def close(self) -> None:
+        """
+        Deja de rutear consultas y cierra la conexion de escritura (espera la pagina en curso).
+        """
+        self._closed = True
+        with self._sync_lock:
+            self._escritor.close()
+
+    def __repr__(self):
+        s = self.stats()
+        return f"AnalyticMirror(tablas={s['tables']}, listas={s['ready']}, filas={s['rows']})"
@@ -0,0 +1,350 @@
+"""
+El modulo implementa la corrida por lotes de preguntas en lenguaje natural: lee un JSONL de
+preguntas, las traduce a SQL con el LLM, las revisa con la guardia y las ejecuta, con
+concurrencia acotada por separado para el LLM y para la base de datos.
+
+- Entrada: un objeto JSON por linea con `question` (o `message`) y opcionalmente `id` y
+  `expected_sql` (para pruebas de regresion del prompt). Sin `id` se usa el numero de linea.
+- Salida en streaming: JSONL (una linea por pregunta, en orden de termino) o Parquet (un
+  directorio con un archivo por cada `part_rows` resultados). La propia salida es el punto de
+  control: al reanudar se saltan los ids que ya estan escritos.
+
+Uso:
+    python services/batch_runner.py preguntas.jsonl --out resultados.jsonl
+    python services/batch_runner.py preguntas.jsonl --out reporte/ --format parquet --no-execute
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from core.config import BATCH_DB_CONCURRENCY, BATCH_LLM_CONCURRENCY, BATCH_PARQUET_ROWS
+from services.logger import Logger
+from services.sql_guard import SQLGuard
+from utils.print_colors import Ppp
+from utils.sql_text import normalize_sql
+
+
+def read_questions(path: str) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """
+    Lee el JSONL de preguntas y devuelve (id, pregunta, sql_esperado) por linea valida.
+    Las lineas vacias se ignoran; las invalidas se registran y se saltan.
+    """
+    with open(path, encoding="utf-8") as f:
+        for n, linea in enumerate(f, start=1):
+            if not linea.strip():
+                continue
+            try:
+                dato = json.loads(linea)
+                pregunta = dato.get("question") or dato.get("message")
+                if not pregunta:
+                    raise ValueError("falta `question`")
+            except (ValueError, AttributeError) as e:
+                Logger.warning("[BatchRunner] Linea %s invalida en %s: %s", n, path, e)
+                continue
+            yield str(dato.get("id", n)), pregunta, dato.get("expected_sql")
+
+
+class JsonlSink:
+    """
+    Salida JSONL: cada resultado se escribe y se vacia a disco en cuanto termina. Al abrir un
+    archivo existente se leen los ids ya escritos y se descarta una ultima linea incompleta.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            self.done = self._recuperar()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8")
+
+    def _recuperar(self) -> Set[str]:
+        ids, valido = set(), 0
+        with open(self.path, "rb") as f:
+            for linea in f:
+                if not linea.endswith(b"\n"):
+                    break  # la corrida anterior se corto a mitad de esta linea
+                try:
+                    ids.add(str(json.loads(linea)["id"]))
+                except (ValueError, KeyError):
+                    break
+                valido += len(linea)
+        with open(self.path, "r+b") as f:
+            f.truncate(valido)
+        return ids
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._f.flush()
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class ParquetSink:
+    """
+    Salida Parquet: un directorio con un archivo `part-NNNNN.parquet` por cada `part_rows`
+    resultados (y uno con el resto al cerrar). Cada parte se escribe a un temporal y se renombra,
+    asi una corrida cortada solo pierde la parte en curso. Todas las partes se escriben con el
+    esquema fijo de `_CAMPOS` (una columna sin valores en una parte no cambia de tipo), y las
+    columnas y filas del resultado van como texto JSON en `result`, asi el directorio se lee como
+    un solo dataset. Requiere pyarrow.
+    """
+
+    # Campo -> tipo de pyarrow (nombre del constructor)
+    _CAMPOS = {
+        "id": "string", "question": "string", "sql": "string", "action": "string", "reason": "string",
+        "rows_count": "int64", "truncated": "bool_", "error": "string", "expected_match": "bool_",
+        "llm_ms": "float64", "sql_ms": "float64", "elapsed_ms": "float64", "result": "string",
+    }
+
+    def __init__(self, path: str, part_rows: int = BATCH_PARQUET_ROWS):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("[Error.ParquetSink] La salida Parquet requiere pyarrow (pip install pyarrow)") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._schema = pyarrow.schema([(campo, getattr(pyarrow, tipo)()) for campo, tipo in self._CAMPOS.items()])
+        self.path = path
+        self.part_rows = part_rows
+        self._buffer: List[Dict[str, Any]] = []
+        os.makedirs(path, exist_ok=True)
+        partes = sorted(p for p in os.listdir(path) if p.startswith("part-") and p.endswith(".parquet"))
+        self._siguiente = len(partes)
+        self.done: Set[str] = set()
+        for parte in partes:
+            self.done.update(self._pq.read_table(os.path.join(path, parte), columns=["id"]).column("id").to_pylist())
+
+    def write(self, record: Dict[str, Any]) -> None:
+        fila = {campo: record.get(campo) for campo in self._CAMPOS if campo != "result"}
+        fila["result"] = json.dumps(
+            {"columns": record.get("columns"), "rows": record.get("rows")}, ensure_ascii=False, default=str
+        ) if record.get("columns") is not None else None
+        self._buffer.append(fila)
+        if len(self._buffer) >= self.part_rows:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        tabla = self._pa.Table.from_pylist(self._buffer, schema=self._schema)
+        destino = os.path.join(self.path, f"part-{self._siguiente:05d}.parquet")
+        self._pq.write_table(tabla, destino + ".tmp")
+        os.replace(destino + ".tmp", destino)
+        self._siguiente += 1
+        self._buffer = []
+
+    def close(self) -> None:
+        self._flush()
+
+
+class BatchRunner:
+    """
+    Traduce y ejecuta preguntas por lotes con dos limites independientes: llamadas al LLM en
+    vuelo (`llm_concurrency`) y consultas en la base (`db_concurrency`). Mientras unas preguntas
+    esperan al LLM otras se ejecutan, y a lo mas `llm_concurrency + db_concurrency` estan en
+    proceso a la vez, asi la memoria no depende del tamaño del archivo.
+
+    Uso:
+        runner = BatchRunner(llm, consultador, SQLGuard())
+        stats = await runner.run("preguntas.jsonl", JsonlSink("resultados.jsonl"))
+    """
+
+    def __init__(
+        self,
+        llm,
+        consultador,
+        guard: SQLGuard,
+        llm_concurrency: int = BATCH_LLM_CONCURRENCY,
+        db_concurrency: int = BATCH_DB_CONCURRENCY,
+        execute: bool = True,
+        schema_catalog=None,
+    ):
+        """
+        Args:
+            llm (LLMService): servicio que traduce la pregunta a SQL (los limites por minuto y
+                reintentos de su planificador siguen aplicando).
+            consultador (ConsultadorSQL): ejecuta las sentencias con el pool de conexiones.
+            guard (SQLGuard): revisa cada sentencia (solo SELECT, tope de filas y timeout).
+            llm_concurrency (int): llamadas al LLM en vuelo como maximo.
+            db_concurrency (int): consultas en la base a la vez como maximo.
+            execute (bool): con False solo se traduce (regresion del prompt sin tocar la base).
+            schema_catalog (SchemaCatalog | None): contexto de esquema para el prompt, como en /chat.
+        """
+        if llm_concurrency < 1 or db_concurrency < 1:
+            raise ValueError(f"[Error.BatchRunner] Concurrencias invalidas: llm={llm_concurrency}, db={db_concurrency}")
+        self.llm = llm
+        self.consultador = consultador
+        self.guard = guard
+        self.llm_concurrency = llm_concurrency
+        self.db_concurrency = db_concurrency
+        self.execute = execute
+        self.schema_catalog = schema_catalog
+
+    async def run(self, input_path: str, sink, progress_every: int = 50) -> Dict[str, Any]:
+        """
+        Procesa las preguntas de `input_path` que no esten ya en `sink` y escribe cada resultado
+        en cuanto termina.
+
+        Returns:
+            dict: conteos de la corrida (processed, skipped, errors, por accion) y throughput.
+        """
+        llm_sem = asyncio.Semaphore(self.llm_concurrency)
+        db_sem = asyncio.Semaphore(self.db_concurrency)
+        ventana = asyncio.Semaphore(self.llm_concurrency + self.db_concurrency)
+        conteo: Counter = Counter()
+        inicio = time.perf_counter()
+
+        async def una(qid: str, pregunta: str, esperado: Optional[str]) -> None:
+            try:
+                record = await self._procesar(qid, pregunta, esperado, llm_sem, db_sem)
+                sink.write(record)
+                conteo["processed"] += 1
+                conteo[record["action"]] += 1
+                conteo["errors"] += record["error"] is not None
+                if conteo["processed"] % progress_every == 0:
+                    Ppp.p(f"[BatchRunner] {conteo['processed']} preguntas procesadas", color="Yellow")
+            finally:
+                ventana.release()
+
+        tareas = set()
+        vistos: Set[str] = set()
+        for qid, pregunta, esperado in read_questions(input_path):
+            if qid in sink.done or qid in vistos:
+                conteo["skipped"] += 1
+                continue
+            vistos.add(qid)
+            await ventana.acquire()
+            tarea = asyncio.create_task(una(qid, pregunta, esperado))
+            tareas.add(tarea)
+            tarea.add_done_callback(tareas.discard)
+        if tareas:
+            await asyncio.gather(*tareas)
+
+        transcurrido = time.perf_counter() - inicio
+        stats = {"processed": 0, "skipped": 0, "errors": 0, **conteo}
+        stats["elapsed_s"] = round(transcurrido, 2)
+        stats["questions_per_s"] = round(stats["processed"] / transcurrido, 2) if transcurrido > 0 else 0.0
+        Logger.info("[BatchRunner] Corrida terminada: %s", stats)
+        return stats
+
+    async def _procesar(self, qid: str, pregunta: str, esperado: Optional[str], llm_sem, db_sem) -> Dict[str, Any]:
+        inicio = time.perf_counter()
+        record: Dict[str, Any] = {
+            "id": qid, "question": pregunta, "sql": None, "action": "error", "reason": None,
+            "columns": None, "rows": None, "rows_count": None, "truncated": False, "error": None,
+            "expected_match": None, "llm_ms": None, "sql_ms": None, "elapsed_ms": None,
+        }
+        try:
+            async with llm_sem:
+                t = time.perf_counter()
+                contexto = self.schema_catalog.context_for(pregunta) if self.schema_catalog is not None else None
+                sql_query = await self.llm.ask_llm(pregunta, contexto=contexto)
+                record["llm_ms"] = round((time.perf_counter() - t) * 1000, 1)
+            record["sql"] = sql_query
+            if esperado is not None:
+                record["expected_match"] = normalize_sql(sql_query) == normalize_sql(esperado)
+
+            decision = self.guard.check(sql_query)
+            record["action"], record["reason"] = decision.action, decision.reason
+            if decision.action == "rejected":
+                self.llm.discard_answer(sql_query)
+            if self.execute and decision.executable:
+                async with db_sem:
+                    t = time.perf_counter()
+                    result = await self.consultador.aexecute_sql(decision.sql, timeout=decision.timeout, max_rows=decision.fetch_rows)
+                    record["sql_ms"] = round((time.perf_counter() - t) * 1000, 1)
+                result, record["truncated"] = self.guard.truncate(result, decision)
+                if isinstance(result, dict):
+                    record["columns"] = result.get("columns")
+                    record["rows"] = [list(fila) for fila in result.get("rows") or []]
+                    record["rows_count"] = len(record["rows"])
+                else:
+                    # execute_sql registra el detalle y devuelve "Error"
+                    record["error"] = str(result)
+                    self.llm.discard_answer(sql_query)
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            if record["sql"] is not None:
+                # Timeout o fallo al ejecutar: la SQL no debe quedar en el cache semantico
+                self.llm.discard_answer(record["sql"])
+        record["elapsed_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+        return record
+
+
+async def _main(args) -> Dict[str, Any]:
+    from services.llm_service import LLMService
+    from services.sql_connector import ConsultadorSQL
+    from services.connection_pool import close_pools
+    from services.sql_executor import shutdown_executor
+    from core.config import (
+        SCHEMA_CATALOG_ENABLED,
+        SCHEMA_CONTEXT_MAX_COLUMNS,
+        SCHEMA_CONTEXT_MAX_TABLES,
+        SCHEMA_SAMPLE_VALUES,
+        SCHEMA_TABLES,
+    )
+
+    sink = ParquetSink(args.out) if args.format == "parquet" else JsonlSink(args.out)
+    llm = LLMService()
+    consultador = ConsultadorSQL(auth=args.auth)
+    catalogo = None
+    try:
+        if SCHEMA_CATALOG_ENABLED and not args.no_schema:
+            from services.schema_catalog import SchemaCatalog
+            catalogo = SchemaCatalog(
+                consultador,
+                SCHEMA_TABLES,
+                sample_values=SCHEMA_SAMPLE_VALUES,
+                max_tables=SCHEMA_CONTEXT_MAX_TABLES,
+                max_columns=SCHEMA_CONTEXT_MAX_COLUMNS,
+            )
+            try:
+                await catalogo.arefresh()
+            except Exception as e:
+                Logger.warning("[BatchRunner] Sin catalogo de esquema: %s", e)
+                catalogo = None
+        runner = BatchRunner(
+            llm,
+            consultador,
+            SQLGuard(),
+            llm_concurrency=args.llm_concurrency,
+            db_concurrency=args.db_concurrency,
+            execute=not args.no_execute,
+            schema_catalog=catalogo,
+        )
+        return await runner.run(args.input, sink)
+    finally:
+        sink.close()
+        await llm.aclose()
+        shutdown_executor()
+        close_pools()
+        Logger.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL de preguntas")
+    parser.add_argument("--out", required=True, help="JSONL de salida, o directorio con --format parquet")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--llm-concurrency", type=int, default=BATCH_LLM_CONCURRENCY)
+    parser.add_argument("--db-concurrency", type=int, default=BATCH_DB_CONCURRENCY)
+    parser.add_argument("--no-execute", action="store_true", help="solo traduce, no ejecuta en la base")
+    parser.add_argument("--no-schema", action="store_true", help="sin contexto del catalogo de esquema")
+    parser.add_argument("--auth", choices=["local", "prod"], default="local")
+    args = parser.parse_args()
+
+    stats = asyncio.run(_main(args))
+    Ppp.p(f"[BatchRunner] {json.dumps(stats, ensure_ascii=False)}", color="Green")
+
+
+if __name__ == "__main__":
+    main()
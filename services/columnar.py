@@ -0,0 +1,378 @@
+"""
+Representacion columnar compacta de un resultado SQL: arreglos tipados de NumPy para
+columnas numericas y de fecha, y cadenas codificadas por diccionario para texto de baja
+cardinalidad. Se construye en una sola pasada a partir de lotes de `fetchmany`.
+"""
+import datetime as dt
+from array import array
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, List, Optional, Sequence
+import numpy as np
+
+if TYPE_CHECKING:
+    # pandas solo se importa al convertir a DataFrame, no al arrancar la app
+    import pandas as pd
+
+
+_EPOCH = dt.datetime(1970, 1, 1)
+_EPOCH_DATE = dt.date(1970, 1, 1)
+_US = dt.timedelta(microseconds=1)
+_NAT = np.iinfo(np.int64).min
+# Digitos significativos que un float64 conserva siempre (DBL_DIG)
+_DIGITOS_FLOAT = 15
+
+
+def _exacto(valor: Any) -> bool:
+    """
+    True si el valor cabe en un float64 sin perder digitos.
+    """
+    return not isinstance(valor, Decimal) or (valor.is_finite() and len(valor.as_tuple().digits) <= _DIGITOS_FLOAT)
+
+
+class DictEncoded:
+    """
+    Columna de texto codificada por diccionario: `codes` (int32, -1 = nulo) indexa `categories`.
+    """
+
+    def __init__(self, codes: np.ndarray, categories: List[str]):
+        self.codes = codes
+        self.categories = categories
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + sum(len(c) for c in self.categories)
+
+    def to_pandas(self) -> "pd.Categorical":
+        import pandas as pd
+        return pd.Categorical.from_codes(self.codes, categories=self.categories)
+
+    def to_list(self) -> List[Optional[str]]:
+        cats = self.categories
+        return [None if c < 0 else cats[c] for c in self.codes.tolist()]
+
+    def __len__(self):
+        return len(self.codes)
+
+
+class _ColumnBuilder:
+    """
+    Acumula los valores de una columna en el buffer mas compacto posible. Si aparece un
+    valor que no cabe en el tipo elegido, la columna se degrada a lista de objetos.
+    """
+
+    def __init__(self, type_code: Any, max_categories: int):
+        self.kind = self._kind_from_type(type_code)
+        self.max_categories = max_categories
+        self.n = 0
+        self.nulls = 0
+        self._init_buffers()
+
+    @staticmethod
+    def _kind_from_type(type_code: Any) -> Optional[str]:
+        if type_code is None:
+            return None  # se infiere con el primer valor no nulo (p.ej. sqlite3)
+        if type_code is bool:
+            return "bool"
+        if type_code is int:
+            return "int"
+        if type_code is float:
+            return "float"
+        if type_code is Decimal:
+            return "decimal"
+        if type_code is dt.datetime:
+            return "datetime"
+        if type_code is dt.date:
+            return "date"
+        if type_code is str:
+            return "str"
+        return "object"
+
+    def _init_buffers(self):
+        kind = self.kind
+        if kind == "int":
+            self.buf, self.mask = array("q"), bytearray()
+        elif kind in ("float",):
+            self.buf = array("d")
+        elif kind == "decimal":
+            # Se guardan los Decimal originales hasta saber si todos caben en un float64
+            self.buf, self.exacto = [], True
+        elif kind in ("datetime", "date"):
+            self.buf = array("q")
+        elif kind == "bool":
+            self.buf, self.mask = array("b"), bytearray()
+        elif kind == "str":
+            self.buf, self.lookup, self.categories = array("i"), {}, []
+        else:
+            self.buf = []
+
+    def _degrade(self):
+        """
+        Convierte lo acumulado a una lista de objetos y sigue en modo 'object'.
+        """
+        valores = self.values_as_list()
+        self.kind = "object"
+        self.buf = valores
+
+    def extend(self, values: Sequence[Any]) -> None:
+        if self.kind is None:
+            primero = next((v for v in values if v is not None), None)
+            if primero is None:
+                self.n += len(values)
+                self.nulls += len(values)
+                return
+            pendientes = self.n
+            self.kind = self._kind_from_type(type(primero))
+            self._init_buffers()
+            self.n = 0
+            self.nulls = 0
+            self.extend([None] * pendientes)
+
+        kind = self.kind
+        try:
+            if kind == "int":
+                for v in values:
+                    if v is None:
+                        self.buf.append(0)
+                        self.mask.append(1)
+                        self.nulls += 1
+                    elif type(v) is bool or not isinstance(v, int):
+                        raise TypeError
+                    else:
+                        self.buf.append(v)
+                        self.mask.append(0)
+            elif kind == "float":
+                for v in values:
+                    if v is None:
+                        self.buf.append(np.nan)
+                        self.nulls += 1
+                    elif isinstance(v, (float, int, Decimal)) and type(v) is not bool:
+                        self.buf.append(float(v))
+                    else:
+                        raise TypeError
+            elif kind == "decimal":
+                for v in values:
+                    if v is None:
+                        self.nulls += 1
+                    elif not isinstance(v, (Decimal, float, int)) or type(v) is bool:
+                        raise TypeError
+                    elif self.exacto and not _exacto(v):
+                        self.exacto = False
+                    self.buf.append(v)
+            elif kind == "datetime":
+                for v in values:
+                    if v is None:
+                        self.buf.append(_NAT)
+                        self.nulls += 1
+                    elif type(v) is dt.datetime and v.tzinfo is None:
+                        self.buf.append((v - _EPOCH) // _US)
+                    else:
+                        raise TypeError
+            elif kind == "date":
+                for v in values:
+                    if v is None:
+                        self.buf.append(_NAT)
+                        self.nulls += 1
+                    elif type(v) is dt.date:
+                        self.buf.append((v - _EPOCH_DATE).days * 86400)
+                    else:
+                        raise TypeError
+            elif kind == "bool":
+                for v in values:
+                    if v is None:
+                        self.buf.append(0)
+                        self.mask.append(1)
+                        self.nulls += 1
+                    elif type(v) is bool:
+                        self.buf.append(v)
+                        self.mask.append(0)
+                    else:
+                        raise TypeError
+            elif kind == "str":
+                lookup, categories = self.lookup, self.categories
+                for v in values:
+                    if v is None:
+                        self.buf.append(-1)
+                        self.nulls += 1
+                        continue
+                    if type(v) is not str:
+                        raise TypeError
+                    code = lookup.get(v)
+                    if code is None:
+                        if len(categories) >= self.max_categories:
+                            raise TypeError  # alta cardinalidad: no conviene el diccionario
+                        code = lookup[v] = len(categories)
+                        categories.append(v)
+                    self.buf.append(code)
+            else:
+                self.buf.extend(values)
+                self.nulls += sum(v is None for v in values)
+        except (TypeError, OverflowError):
+            # Se reprocesa el lote completo como objetos (los valores ya agregados se conservan)
+            procesados = self.n_buffered()
+            self._degrade()
+            self.buf.extend(values[procesados - self.n:])
+            self.nulls = sum(v is None for v in self.buf)
+        self.n += len(values)
+
+    def n_buffered(self) -> int:
+        return len(self.buf)
+
+    def values_as_list(self) -> List[Any]:
+        """
+        Decodifica lo acumulado a valores de Python (se usa al degradar la columna).
+        """
+        kind = self.kind
+        if kind == "int":
+            return [None if m else v for v, m in zip(self.buf, self.mask)]
+        if kind == "bool":
+            return [None if m else bool(v) for v, m in zip(self.buf, self.mask)]
+        if kind == "float":
+            return [None if v != v else v for v in self.buf]
+        if kind == "datetime":
+            return [None if v == _NAT else _EPOCH + v * _US for v in self.buf]
+        if kind == "date":
+            return [None if v == _NAT else _EPOCH_DATE + dt.timedelta(seconds=v) for v in self.buf]
+        if kind == "str":
+            return [None if c < 0 else self.categories[c] for c in self.buf]
+        if kind is None:
+            return [None] * self.n
+        return list(self.buf)
+
+    def finish(self):
+        kind = self.kind
+        if kind is None:
+            return [None] * self.n
+        if kind == "int":
+            valores = np.frombuffer(self.buf, dtype=np.int64)
+            if self.nulls:
+                # Igual que pandas: enteros con nulos pasan a float64 con NaN
+                valores = valores.astype(np.float64)
+                valores[np.frombuffer(bytes(self.mask), dtype=np.bool_)] = np.nan
+            return valores
+        if kind == "float":
+            return np.frombuffer(self.buf, dtype=np.float64)
+        if kind == "decimal":
+            if not self.exacto:
+                # Montos con mas de 15 digitos: como float64 se corromperian
+                return self.buf
+            return np.array([np.nan if v is None else float(v) for v in self.buf], dtype=np.float64)
+        if kind == "datetime":
+            return np.frombuffer(self.buf, dtype=np.int64).view("datetime64[us]")
+        if kind == "date":
+            return np.frombuffer(self.buf, dtype=np.int64).view("datetime64[s]")
+        if kind == "bool":
+            if self.nulls:
+                return self.values_as_list()
+            return np.frombuffer(self.buf, dtype=np.bool_)
+        if kind == "str":
+            return DictEncoded(np.frombuffer(self.buf, dtype=np.int32), self.categories)
+        return self.buf
+
+
+class ColumnarResult:
+    """
+    Resultado en columnas tipadas. Cada columna es un `np.ndarray`, un `DictEncoded`
+    o una lista de objetos (tipos no soportados o texto de alta cardinalidad).
+    Los valores DECIMAL se guardan como float64 solo si todos tienen a lo mas 15 digitos
+    significativos; si no, la columna conserva los Decimal originales.
+    """
+
+    def __init__(self, columns: List[str], data: List[Any], n_rows: int):
+        self.columns = columns
+        self.data = data
+        self.n_rows = n_rows
+
+    @classmethod
+    def from_batches(
+        cls,
+        columns: List[str],
+        batches: Iterable[Sequence[Sequence[Any]]],
+        type_codes: Optional[Sequence[Any]] = None,
+        max_categories: int = 1024,
+    ) -> "ColumnarResult":
+        """
+        Construye el resultado en una sola pasada sobre los lotes de filas.
+
+        Args:
+            columns (list): nombres de columnas.
+            batches (Iterable): lotes de filas (p.ej. `cursor.fetchmany`).
+            type_codes (list | None): tipos de Python por columna (`cursor.description[i][1]`);
+                sin ellos el tipo se infiere del primer valor no nulo.
+            max_categories (int): maximo de valores distintos para codificar texto por diccionario.
+        """
+        type_codes = type_codes or [None] * len(columns)
+        builders = [_ColumnBuilder(t, max_categories) for t in type_codes]
+        n_rows = 0
+        for batch in batches:
+            if not batch:
+                continue
+            n_rows += len(batch)
+            for builder, valores in zip(builders, zip(*batch)):
+                builder.extend(valores)
+        return cls(list(columns), [b.finish() for b in builders], n_rows)
+
+    def __len__(self):
+        return self.n_rows
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes aproximados ocupados por los buffers de las columnas.
+        """
+        total = 0
+        for col in self.data:
+            if isinstance(col, (np.ndarray, DictEncoded)):
+                total += col.nbytes
+            else:
+                total += 8 * len(col)
+        return total
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """
+        Convierte a DataFrame sin copiar los arreglos numericos.
+        """
+        import pandas as pd
+        datos = {
+            i: col.to_pandas() if isinstance(col, DictEncoded) else col
+            for i, col in enumerate(self.data)
+        }
+        df = pd.DataFrame(datos, copy=False)
+        df.columns = self.columns
+        return df
+
+    def column_values(self, i: int) -> List[Any]:
+        """
+        Devuelve la columna `i` como lista de valores de Python (None para nulos).
+        """
+        col = self.data[i]
+        if isinstance(col, DictEncoded):
+            return col.to_list()
+        if isinstance(col, np.ndarray):
+            if col.dtype.kind == "M":
+                unidad = np.datetime_data(col.dtype)[0]
+                es_fecha = unidad == "s"
+                return [
+                    None if np.isnat(v) else (v.astype(dt.datetime).date() if es_fecha else v.astype(dt.datetime))
+                    for v in col
+                ]
+            if col.dtype.kind == "f":
+                return [None if v != v else v for v in col.tolist()]
+            return col.tolist()
+        return list(col)
+
+    def iter_rows(self) -> Iterator[List[Any]]:
+        """
+        Recorre las filas como listas de valores de Python.
+        """
+        cols = [self.column_values(i) for i in range(len(self.columns))]
+        for row in zip(*cols):
+            yield list(row)
+
+    def to_dict(self) -> dict:
+        """
+        Devuelve el formato {"columns", "rows"} que consume `format_result`.
+        """
+        return {"columns": self.columns, "rows": list(self.iter_rows())}
+
+    def __repr__(self):
+        return f"ColumnarResult({self.n_rows} filas x {len(self.columns)} columnas, {self.nbytes} bytes)"
@@ -0,0 +1,329 @@
+"""
+El modulo implementa un pool de conexiones acotado y compartido por todo el proceso,
+para no abrir (ni filtrar) una conexion ODBC por cada peticion.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from services.logger import Logger
+from services.metrics import POOL_WAIT_SECONDS
+
+
+class PoolTimeoutError(TimeoutError):
+    """
+    Se lanza cuando no se obtiene una conexion del pool dentro del tiempo de espera.
+    """
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones thread-safe con tamaño minimo/maximo, tiempo de espera al
+    pedir una conexion, chequeo de vida al prestarla y reconexion transparente.
+
+    No depende de pyodbc: recibe una fabrica que devuelve conexiones DB-API, por lo que
+    puede probarse con sqlite3 como sustituto local.
+    Uso:
+        pool = ConnectionPool(factory=lambda: sqlite3.connect(":memory:", check_same_thread=False))
+        with pool.connection() as conn:
+            conn.cursor().execute("SELECT 1")
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        ping_query: str = "SELECT 1",
+        ping_after: float = 5.0,
+        nombre: str = "default",
+    ):
+        """
+        Args:
+            factory (Callable): funcion sin argumentos que crea una conexion nueva.
+            min_size (int): conexiones que se mantienen abiertas tras `fill()`.
+            max_size (int): maximo de conexiones abiertas al mismo tiempo.
+            timeout (float): segundos maximos de espera al pedir una conexion.
+            ping_query (str): sentencia usada para validar una conexion ociosa.
+            ping_after (float): segundos de inactividad a partir de los cuales se valida la conexion al prestarla.
+            nombre (str): identificador del pool en logs y metricas.
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"[Error.ConnectionPool] Tamaños invalidos: min_size={min_size}, max_size={max_size}")
+
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping_query = ping_query
+        self.ping_after = ping_after
+        self.nombre = nombre
+
+        self._cond = threading.Condition()
+        self._idle: deque = deque()  # (conexion, ultimo_uso)
+        self._total = 0
+        self._in_use = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "ping_failures": 0,
+        }
+
+    # ------------------------------------------------------------------ #
+    # Ciclo de vida
+    # ------------------------------------------------------------------ #
+    def fill(self) -> int:
+        """
+        Abre conexiones hasta tener `min_size` en el pool.
+
+        Returns:
+            int: numero de conexiones nuevas abiertas.
+        """
+        abiertas = 0
+        while True:
+            with self._cond:
+                if self._closed or self._total >= self.min_size:
+                    return abiertas
+                self._total += 1
+            try:
+                conn = self._create()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+            abiertas += 1
+
+    def close(self) -> None:
+        """
+        Cierra las conexiones ociosas y marca el pool como cerrado. Las conexiones
+        prestadas se cierran al devolverse.
+        """
+        with self._cond:
+            self._closed = True
+            ociosas = list(self._idle)
+            self._idle.clear()
+            self._total -= len(ociosas)
+            self._cond.notify_all()
+        for conn, _ in ociosas:
+            self._close_quietly(conn)
+        Logger.info(f"[ConnectionPool:{self.nombre}] Pool cerrado.")
+
+    # ------------------------------------------------------------------ #
+    # Prestamo y devolucion
+    # ------------------------------------------------------------------ #
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        """
+        Presta una conexion viva del pool, esperando si todas estan ocupadas.
+
+        Args:
+            timeout (float | None): segundos maximos de espera; por defecto `self.timeout`.
+        Returns:
+            Conexion DB-API lista para usarse.
+        Raises:
+            PoolTimeoutError: si no se libera ninguna conexion a tiempo.
+            ConnectionError: si el pool esta cerrado o no se puede abrir una conexion.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        deadline = inicio + timeout
+        espero = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise ConnectionError(f"[Error.ConnectionPool:{self.nombre}] El pool esta cerrado.")
+                if self._idle:
+                    conn, ultimo_uso = self._idle.pop()
+                    crear = False
+                    break
+                if self._total < self.max_size:
+                    self._total += 1
+                    conn, ultimo_uso = None, None
+                    crear = True
+                    break
+                restante = deadline - time.monotonic()
+                if restante <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"[Error.ConnectionPool:{self.nombre}] Sin conexiones disponibles tras {timeout}s "
+                        f"(en uso: {self._in_use}/{self.max_size})"
+                    )
+                espero = True
+                self._cond.wait(restante)
+            self._in_use += 1
+
+        try:
+            if crear:
+                conn = self._create()
+            elif time.monotonic() - ultimo_uso >= self.ping_after and not self._is_alive(conn):
+                # Reconexion transparente: la conexion ociosa ya no responde
+                self._stats["ping_failures"] += 1
+                self._stats["discarded"] += 1
+                self._close_quietly(conn)
+                Logger.warning(f"[ConnectionPool:{self.nombre}] Conexion caducada, reconectando.")
+                conn = self._create()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        espera = time.monotonic() - inicio
+        with self._cond:
+            self._stats["checkouts"] += 1
+            if espero:
+                self._stats["waits"] += 1
+            self._stats["wait_time_total"] += espera
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], espera)
+        POOL_WAIT_SECONDS.observe(espera, pool=self.nombre)
+        return conn
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        """
+        Devuelve una conexion al pool.
+
+        Args:
+            conn: conexion obtenida con `acquire`.
+            discard (bool): si es True la conexion se cierra en lugar de reutilizarse.
+        """
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._total -= 1
+                self._stats["discarded"] += int(discard)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if discard or self._closed:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        Context manager que presta una conexion y la devuelve al salir.
+        Si el bloque falla se hace rollback; si el rollback tambien falla la conexion se descarta.
+        """
+        conn = self.acquire(timeout=timeout)
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=not self._rollback_quietly(conn))
+            raise
+        else:
+            self.release(conn)
+
+    # ------------------------------------------------------------------ #
+    # Metricas
+    # ------------------------------------------------------------------ #
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Devuelve una foto de las metricas del pool (en uso, ociosas, tiempos de espera, etc.).
+        """
+        with self._cond:
+            datos = dict(self._stats)
+            datos.update({
+                "nombre": self.nombre,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "total": self._total,
+                "max_size": self.max_size,
+            })
+        datos["wait_time_avg"] = datos["wait_time_total"] / datos["checkouts"] if datos["checkouts"] else 0.0
+        return datos
+
+    # ------------------------------------------------------------------ #
+    # Auxiliares
+    # ------------------------------------------------------------------ #
+    def _create(self) -> Any:
+        conn = self.factory()
+        if conn is None:
+            raise ConnectionError(f"[Error.ConnectionPool:{self.nombre}] No se pudo establecer la conexion.")
+        with self._cond:
+            self._stats["created"] += 1
+        return conn
+
+    def _is_alive(self, conn: Any) -> bool:
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self.ping_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _rollback_quietly(conn: Any) -> bool:
+        try:
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def __repr__(self):
+        m = self.metrics()
+        return f"ConnectionPool({self.nombre}: en uso={m['in_use']}, ociosas={m['idle']}, max={self.max_size})"
+
+
+# Registro de pools a nivel proceso: un pool por cadena de conexion
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(clave: str, factory: Callable[[], Any], **kwargs) -> ConnectionPool:
+    """
+    Devuelve el pool compartido para `clave`, creandolo la primera vez.
+
+    Args:
+        clave (str): identificador del pool (p.ej. el tipo de autenticacion).
+        factory (Callable): fabrica de conexiones usada si el pool no existe.
+        **kwargs: argumentos extra para `ConnectionPool`.
+    """
+    with _pools_lock:
+        pool = _pools.get(clave)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(factory=factory, nombre=clave, **kwargs)
+            _pools[clave] = pool
+        return pool
+
+
+def close_pools() -> None:
+    """
+    Cierra todos los pools registrados en el proceso.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def pools_metrics() -> Dict[str, Dict[str, Any]]:
+    """
+    Devuelve las metricas de cada pool registrado, por nombre.
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {clave: pool.metrics() for clave, pool in pools}
@@ -1,20 +1,23 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-import pandas as pd
 from utils.print_colors import Ppp
-from typing import Literal, Tuple
-import pandas as pd
+from typing import Any, Dict, Literal, Optional, Tuple
+from services.table_renderer import render_html_table, render_text_table
+import math
+import time
 
 
 def format_result(
     result: dict,
-    formato: Literal["html", "text"] = "html"
+    formato: Literal["html", "text"] = "html", 
+    max_rows: Optional[int] = None
 ) -> Tuple[str, str]:
     """
     Dado un dict con:
       - 'columns' & 'rows'  => formatea como tabla
       - 'image', 'iframe', 'svg' => regresa tipo 'grafico' con el HTML
+    Con `max_rows` solo se pintan las primeras filas y el resumen lo indica.
     """
     # 1) Gráficos
     if "image" in result:
@@ -33,21 +36,58 @@ def format_result(
         # caso una celda
         if len(cols) == 1 and len(rows) == 1:
             return "texto", f"<b>{cols[0]}</b>: {rows[0][0]}"
-        # DataFrame para HTML
-        df = pd.DataFrame(rows, columns=cols)
         print(f"Formato: {formato}")
 
         # Formato HTML para pintar en el lado derecho de la pantalla 
         if formato == "html":
-            resumen = f"<p><strong>Resumen:</strong> {len(df)} filas, {len(cols)} columnas.</p>"
-            tabla = df.to_html(index=False, classes="dataframe", border=0)
-            return "tabla", resumen + tabla
+            resumen = f"<p><strong>Resumen:</strong> {len(rows)} filas, {len(cols)} columnas."
+            if max_rows is not None and len(rows) > max_rows: 
+                resumen += f" Se muestran las primeras {max_rows}."
+            tabla = render_html_table(cols, rows, classes="dataframe", max_rows=max_rows)
+            return "tabla", resumen + "</p>" + tabla
         else:
             # texto plano
-            lines = ["\t".join(cols)] + [
-                "\t".join(str(cell) for cell in row) for row in rows
-            ]
-            return "tabla", "```\n" + "\n".join(lines) + "\n```"
+            return "tabla", render_text_table(cols, rows, max_rows=max_rows)
 
     # 3) Texto genérico
     return "texto", str(result)
+
+
+def format_page(
+    result: dict, 
+    page: int = 1, 
+    page_size: int = 50
+) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    Formatea como tabla HTML solo una pagina de un resultado {'columns', 'rows'}. 
+    El costo de renderizar no depende del total de filas sino del tamaño de pagina.
+
+    Args: 
+        result (dict): resultado con 'columns' y 'rows'.
+        page (int): numero de pagina (empieza en 1); se ajusta al rango valido.
+        page_size (int): filas por pagina.
+    Returns: 
+        tuple: (tipo_respuesta, html, info) donde info trae page, pages, page_size, total y elapsed_ms.
+    """
+    inicio = time.perf_counter()
+    cols = result["columns"]
+    rows = result["rows"] or []
+    total = len(rows)
+    pages = max(1, math.ceil(total / page_size))
+    page = min(max(1, page), pages)
+    page_rows = rows[(page - 1) * page_size: page * page_size]
+
+    tabla = render_html_table(cols, page_rows, classes="dataframe")
+    info = {
+        "page": page, 
+        "pages": pages, 
+        "page_size": page_size, 
+        "total": total, 
+        "columns": len(cols), 
+        "elapsed_ms": round((time.perf_counter() - inicio) * 1000, 2), 
+    }
+    resumen = (
+        f"<p><strong>Resumen:</strong> {total} filas, {len(cols)} columnas. "
+        f"Página {page} de {pages} ({page_size} filas por página, {info['elapsed_ms']} ms).</p>"
+    )
+    return "tabla", resumen + tabla, info
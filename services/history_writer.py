@@ -0,0 +1,294 @@
+"""
+El modulo implementa una cola write-behind para el historial de chat: las peticiones solo
+encolan la fila y un hilo de fondo la persiste por lotes (`executemany`), fuera de la
+latencia que ve el usuario.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from services.logger import Logger
+from utils.text_preview import repr_prefix
+
+
+_POLICIES = ("drop_oldest", "drop_new", "block")
+# Errores del driver que pueden desaparecer al reintentar (conexion, bloqueo, timeout)
+_TRANSITORIOS = ("OperationalError", "InterfaceError")
+
+
+def is_transient(error: Optional[Exception]) -> bool:
+    """
+    Indica si vale la pena reintentar un lote que fallo con `error`. Los errores de datos
+    (p.ej. texto truncado o llave duplicada) se repiten igual en cada intento.
+    """
+    if error is None:
+        return False
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in _TRANSITORIOS
+
+
+def summarize_result(result: Any, limit: int = 33) -> str:
+    """
+    Devuelve `str(result)[:limit]` dejando de serializar en cuanto se alcanza el limite,
+    para no convertir a texto un resultado completo solo para guardar unos caracteres.
+    """
+    if isinstance(result, str):
+        return result[:limit]
+    return repr_prefix(result, limit)
+
+
+class HistoryWriter:
+    """
+    Escritor write-behind thread-safe para filas de historial.
+
+    - `submit` encola la fila y regresa de inmediato.
+    - Un hilo de fondo entrega lotes al `sink` cuando se juntan `batch_size` filas o pasan
+      `flush_interval` segundos desde la fila mas antigua pendiente.
+    - La cola esta acotada (`max_queue`); al llenarse aplica la politica de contrapresion:
+        * "drop_oldest": descarta la fila pendiente mas antigua.
+        * "drop_new": descarta la fila nueva.
+        * "block": el llamador espera hasta `put_timeout` segundos y, si sigue lleno, la descarta.
+    - Un lote que falla por un error transitorio (conexion, timeout) se reintenta con backoff.
+      Si el error es de datos, se escribe fila por fila sin reintentar y solo se descartan
+      las filas que fallan.
+    - `close` drena todo lo pendiente antes de terminar.
+    - `pending(session_id)` expone las filas aun no persistidas, para que las lecturas del
+      historial vean sus propias escrituras.
+
+    Uso:
+        writer = HistoryWriter(sink=consultador.insert_rows_historial)
+        writer.start()
+        writer.submit({"session_id": ..., "user_message": ..., "sql_query": ..., "result": ...})
+        writer.close()
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[List[Dict[str, Any]]], bool],
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        policy: str = "drop_oldest",
+        put_timeout: float = 0.5,
+        max_retries: int = 2,
+    ):
+        """
+        Args:
+            sink (Callable): recibe una lista de filas y devuelve True si se persistieron.
+            batch_size (int): filas maximas por lote.
+            flush_interval (float): segundos maximos que una fila espera antes de escribirse.
+            max_queue (int): filas maximas pendientes en memoria.
+            policy (str): politica al llenarse la cola ("drop_oldest", "drop_new" o "block").
+            put_timeout (float): segundos de espera de `submit` con la politica "block".
+            max_retries (int): reintentos de un lote que fallo por un error transitorio.
+        """
+        if policy not in _POLICIES:
+            raise ValueError(f"[Error.HistoryWriter] Politica invalida: {policy}. Opciones: {_POLICIES}")
+        if batch_size < 1 or max_queue < 1:
+            raise ValueError(f"[Error.HistoryWriter] Tamaños invalidos: batch_size={batch_size}, max_queue={max_queue}")
+
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.policy = policy
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+
+        self._cond = threading.Condition()
+        self._queue: deque = deque()  # (fila, encolada_en)
+        self._inflight: List[Dict[str, Any]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._closing = False
+        self._flush_now = False
+        self._stats = {
+            "submitted": 0,
+            "written": 0,
+            "batches": 0,
+            "dropped": 0,
+            "failed": 0,
+            "retries": 0,
+            "max_backlog": 0,
+        }
+
+    # ------------------------------------------------------------------ #
+    # Ciclo de vida
+    # ------------------------------------------------------------------ #
+    def start(self) -> "HistoryWriter":
+        with self._cond:
+            if self._thread is None:
+                self._closing = False
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+        return self
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """
+        Detiene el hilo tras escribir todas las filas pendientes.
+        """
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            if thread.is_alive():
+                Logger.warning(f"[HistoryWriter] El drenado no termino en {timeout}s; quedan {len(self._queue)} filas")
+        with self._cond:
+            self._thread = None
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que se escriba todo lo encolado hasta ahora.
+
+        Returns:
+            bool: True si la cola quedo vacia dentro del tiempo.
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_now = True
+            self._cond.notify_all()
+            while self._queue or self._inflight:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._cond.wait(restante if restante is not None else 0.1)
+        return True
+
+    # ------------------------------------------------------------------ #
+    # Productores
+    # ------------------------------------------------------------------ #
+    def submit(self, row: Dict[str, Any]) -> bool:
+        """
+        Encola una fila para escribirla en segundo plano.
+
+        Returns:
+            bool: False si la fila se descarto por contrapresion o porque el escritor esta cerrado.
+        """
+        with self._cond:
+            if self._closing:
+                Logger.warning("[HistoryWriter] Fila descartada: el escritor esta cerrado")
+                self._stats["dropped"] += 1
+                return False
+            if len(self._queue) >= self.max_queue:
+                if self.policy == "drop_new":
+                    return self._drop("cola llena")
+                if self.policy == "drop_oldest":
+                    self._queue.popleft()
+                    self._drop("cola llena, se descarta la fila mas antigua")
+                else:
+                    limite = time.monotonic() + self.put_timeout
+                    while len(self._queue) >= self.max_queue and not self._closing:
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            return self._drop(f"cola llena tras esperar {self.put_timeout}s")
+                        self._cond.wait(restante)
+                    if self._closing:
+                        return self._drop("el escritor se cerro mientras esperaba")
+
+            self._queue.append((row, time.monotonic()))
+            self._stats["submitted"] += 1
+            self._stats["max_backlog"] = max(self._stats["max_backlog"], len(self._queue))
+            # La primera fila arranca el temporizador del lote; un lote lleno se escribe ya
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def pending(self, session_id: str) -> List[Dict[str, Any]]:
+        """
+        Devuelve, en orden, las filas de `session_id` que aun no se han persistido.
+        """
+        with self._cond:
+            filas = self._inflight + [row for row, _ in self._queue]
+        return [row for row in filas if row.get("session_id") == session_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            datos = dict(self._stats)
+            datos.update({"backlog": len(self._queue), "inflight": len(self._inflight)})
+        return datos
+
+    # ------------------------------------------------------------------ #
+    # Hilo de escritura
+    # ------------------------------------------------------------------ #
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._ready():
+                    espera = None
+                    if self._queue:
+                        espera = max(self._queue[0][1] + self.flush_interval - time.monotonic(), 0)
+                    self._cond.wait(espera)
+                if not self._queue and self._closing:
+                    return
+                if not self._queue:
+                    continue
+                n = min(self.batch_size, len(self._queue))
+                self._inflight = [self._queue.popleft()[0] for _ in range(n)]
+                lote = list(self._inflight)
+                # Hay espacio en la cola: despierta a los productores en espera
+                self._cond.notify_all()
+
+            self._write(lote)
+
+            with self._cond:
+                self._inflight = []
+                self._cond.notify_all()
+
+    def _ready(self) -> bool:
+        if not self._queue:
+            self._flush_now = False
+            return self._closing
+        if self._closing or self._flush_now or len(self._queue) >= self.batch_size:
+            return True
+        return time.monotonic() - self._queue[0][1] >= self.flush_interval
+
+    def _write(self, lote: List[Dict[str, Any]]) -> None:
+        for intento in range(self.max_retries + 1):
+            ok, error = self._entregar(lote)
+            if ok:
+                return
+            if not is_transient(error) or intento == self.max_retries:
+                break
+            with self._cond:
+                self._stats["retries"] += 1
+            time.sleep(min(0.5 * 2 ** intento, 5))
+        if len(lote) == 1 or is_transient(error):
+            # Sin conexion tampoco entraria fila por fila
+            self._descartar(lote, error)
+            return
+        # Una fila invalida (p.ej. mas larga que la columna) no debe tumbar las de otros usuarios
+        fallidas = [row for row in lote if not self._entregar([row])[0]]
+        if fallidas:
+            self._descartar(fallidas, error)
+
+    def _entregar(self, lote: List[Dict[str, Any]]) -> Tuple[bool, Optional[Exception]]:
+        """
+        Entrega `lote` al sink. Devuelve (persistido, error); error es None si el sink
+        devolvio False sin lanzar.
+        """
+        try:
+            if self.sink(lote):
+                with self._cond:
+                    self._stats["written"] += len(lote)
+                    self._stats["batches"] += 1
+                return True, None
+            return False, None
+        except Exception as e:
+            Logger.error(f"[Error.HistoryWriter._write] {e}")
+            return False, e
+
+    def _descartar(self, filas: List[Dict[str, Any]], error: Optional[Exception]) -> None:
+        with self._cond:
+            self._stats["failed"] += len(filas)
+        Logger.error(f"[Error.HistoryWriter] Se descartan {len(filas)} filas: {error}")
+
+    def _drop(self, motivo: str) -> bool:
+        self._stats["dropped"] += 1
+        # Bajo saturacion se registra solo la primera y una de cada 100 para no inundar el log
+        if self._stats["dropped"] % 100 == 1:
+            Logger.warning(f"[HistoryWriter] Fila descartada ({self._stats['dropped']} en total): {motivo}")
+        return False
+
+    def __repr__(self):
+        s = self.stats()
+        return f"HistoryWriter(pendientes={s['backlog']}, escritas={s['written']}, descartadas={s['dropped']})"
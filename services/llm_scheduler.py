@@ -0,0 +1,290 @@
+"""
+El modulo implementa el planificador de llamadas al LLM: agrupa peticiones identicas en
+vuelo (single-flight), limita peticiones y tokens por minuto (token bucket), reintenta con
+backoff exponencial con jitter respetando Retry-After y corta rapido con un circuit breaker
+cuando el servicio esta caido.
+"""
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from services.logger import Logger
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Se lanza sin llamar al modelo mientras el circuit breaker esta abierto.
+    """
+
+
+class TokenBucket:
+    """
+    Token bucket async: `rate_per_minute` unidades por minuto con rafagas de hasta `capacity`.
+    Con `rate_per_minute` <= 0 no limita.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self) -> None:
+        ahora = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (ahora - self._updated) * self.rate)
+        self._updated = ahora
+
+    async def acquire(self, n: float = 1) -> float:
+        """
+        Espera hasta poder consumir `n` unidades (una peticion mayor a la capacidad espera
+        a tener el bucket lleno). Devuelve los segundos esperados.
+        """
+        if not self.enabled:
+            return 0.0
+        n = min(n, self.capacity)
+        esperado = 0.0
+        # El lock mantiene el orden de llegada: nadie se salta a quien ya esta esperando
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return esperado
+                espera = (n - self._tokens) / self.rate
+                esperado += espera
+                await asyncio.sleep(espera)
+
+    def adjust(self, delta: float) -> None:
+        """
+        Corrige el consumo con el uso real (delta > 0 consume mas, delta < 0 devuelve).
+        Puede dejar el bucket en negativo: las siguientes peticiones esperan la deuda.
+        """
+        if self.enabled:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - delta)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de tres estados:
+    - closed: las llamadas pasan; `failure_threshold` fallos seguidos lo abren.
+    - open: las llamadas fallan de inmediato durante `reset_timeout` segundos.
+    - half_open: pasa una llamada de prueba; si funciona se cierra, si falla se vuelve a abrir.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe = False
+
+    def before_call(self) -> None:
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                restante = self.reset_timeout - (time.monotonic() - self._opened_at)
+                raise CircuitOpenError(f"[Error.CircuitBreaker] El LLM no esta disponible, reintenta en {restante:.0f}s")
+            self.state = "half_open"
+            self._probe = False
+        if self.state == "half_open":
+            if self._probe:
+                raise CircuitOpenError("[Error.CircuitBreaker] El LLM se esta recuperando, reintenta en unos segundos")
+            self._probe = True
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            Logger.info("[CircuitBreaker] Circuito cerrado: el LLM respondio")
+        self.state = "closed"
+        self._failures = 0
+        self._probe = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                Logger.warning(f"[CircuitBreaker] Circuito abierto tras {self._failures} fallos seguidos")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            self._probe = False
+
+    def release_probe(self) -> None:
+        """
+        Libera la llamada de prueba que no llego a terminar (p.ej. cancelada porque el cliente se
+        desconecto): no cuenta como exito ni como fallo y la siguiente llamada vuelve a probar.
+        """
+        if self.state == "half_open":
+            self._probe = False
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return status
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """
+    Lee Retry-After / retry-after-ms de la respuesta de error, si existe.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None  # Retry-After como fecha HTTP: se usa el backoff normal
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Errores transitorios: 408, 409, 429, 5xx, timeouts y fallos de conexion.
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    nombre = type(error).__name__
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or nombre in ("APIConnectionError", "APITimeoutError")
+
+
+class LLMScheduler:
+    """
+    Envuelve las llamadas al LLM con single-flight, limites por minuto, reintentos y circuit breaker.
+
+    Uso:
+        scheduler = LLMScheduler(rpm=60, tpm=60000)
+        response = await scheduler.run(lambda: client.chat.completions.create(...), key=huella, tokens=800)
+    """
+
+    def __init__(
+        self,
+        rpm: float = 0,
+        tpm: float = 0,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        """
+        Args:
+            rpm (float): peticiones por minuto permitidas (0 = sin limite).
+            tpm (float): tokens por minuto permitidos (0 = sin limite).
+            max_retries (int): reintentos ante errores transitorios.
+            backoff_base (float): espera base del backoff exponencial, en segundos.
+            backoff_max (float): espera maxima entre reintentos, en segundos.
+            breaker (CircuitBreaker | None): circuit breaker; por defecto 5 fallos / 30 s.
+        """
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = {
+            "calls": 0,
+            "coalesced": 0,
+            "retries": 0,
+            "failures": 0,
+            "rejected": 0,
+            "throttle_wait": 0.0,
+        }
+
+    async def run(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        key: Optional[str] = None,
+        tokens: float = 0,
+    ) -> Any:
+        """
+        Ejecuta `fn` aplicando las politicas del planificador.
+
+        Args:
+            fn (Callable): corrutina sin argumentos que hace la llamada al LLM.
+            key (str | None): huella de la peticion; las llamadas con la misma huella en vuelo
+                comparten una sola ejecucion. None para no agrupar (p.ej. streaming).
+            tokens (float): tokens estimados de la peticion para el limite por minuto.
+        Raises:
+            CircuitOpenError: si el circuito esta abierto.
+            Exception: el ultimo error del LLM si se agotan los reintentos o no es transitorio.
+        """
+        if key is None:
+            return await self._call(fn, tokens)
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(self._call(fn, tokens))
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: si quien la inicio se cancela, la llamada sigue para los demas que la esperan
+        return await asyncio.shield(future)
+
+    def record_usage(self, estimated: float, actual: Optional[float]) -> None:
+        """
+        Ajusta el bucket de tokens con el uso real reportado por la respuesta.
+        """
+        if actual is not None:
+            self.tokens.adjust(actual - estimated)
+
+    async def _call(self, fn: Callable[[], Awaitable[Any]], tokens: float) -> Any:
+        intento = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._stats["rejected"] += 1
+                raise
+
+            try:
+                self._stats["throttle_wait"] += await self.requests.acquire(1)
+                self._stats["throttle_wait"] += await self.tokens.acquire(tokens)
+                self._stats["calls"] += 1
+                result = await fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    # Error del cliente (400, 401...): el servicio respondio, no cuenta como caida
+                    if self.breaker.state == "half_open":
+                        self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if intento >= self.max_retries or self.breaker.state == "open":
+                    self._stats["failures"] += 1
+                    raise
+                espera = self._backoff(intento, _retry_after(e))
+                intento += 1
+                self._stats["retries"] += 1
+                Logger.warning(f"[LLMScheduler] Error transitorio ({_status_code(e) or type(e).__name__}), reintento {intento}/{self.max_retries} en {espera:.2f}s")
+                await asyncio.sleep(espera)
+                continue
+            except BaseException:
+                # CancelledError no es Exception: sin esto la prueba del half_open quedaria tomada
+                self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def _backoff(self, intento: int, retry_after: Optional[float]) -> float:
+        # Full jitter: reparte los reintentos de varios clientes en vez de sincronizarlos
+        espera = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** intento))
+        if retry_after is not None:
+            espera = max(espera, retry_after)
+        return espera
+
+    def stats(self) -> Dict[str, Any]:
+        datos = dict(self._stats)
+        datos.update({"inflight": len(self._inflight), "breaker": self.breaker.state})
+        return datos
@@ -2,36 +2,107 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from openai import AsyncAzureOpenAI 
-from typing import Optional
+from typing import AsyncGenerator, Optional
 from core.config import (
     AZURE_OPENAI_API_KEY, 
     AZURE_OPENAI_API_VERSION, 
     AZURE_OPENAI_DEPLOYMENT_EMBEDDING_NAME, 
     AZURE_OPENAI_DEPLOYMENT_NAME, 
     AZURE_OPENAI_ENDPOINT, 
-    AZURE_OPENAI_RESOURCE_NAME
+    AZURE_OPENAI_RESOURCE_NAME, 
+    SEMANTIC_CACHE_ENABLED, 
+    SEMANTIC_CACHE_THRESHOLD, 
+    SEMANTIC_CACHE_MAX_ENTRIES, 
+    SEMANTIC_CACHE_TTL, 
+    LLM_RPM, 
+    LLM_TPM, 
+    LLM_MAX_RETRIES, 
+    LLM_BACKOFF_BASE, 
+    LLM_BACKOFF_MAX, 
+    LLM_BREAKER_FAILURES, 
+    LLM_BREAKER_RESET, 
+    LLM_MAX_OUTPUT_TOKENS, 
+    LLM_STREAM_USAGE, 
+    DASHBOARD_MAX_QUERIES
 )
+from services.semantic_cache import AzureEmbedder, SemanticCache
+from services.llm_scheduler import CircuitBreaker, CircuitOpenError, LLMScheduler
+from services.metrics import LLM_TOKENS
+from services.session_history import count_tokens
 import asyncio
+import hashlib
+import json
 from pathlib import Path
+from types import SimpleNamespace
+
+
+SYSTEM_PATH = Path("assets/system_prompt.txt")
+
+# Se agrega al system prompt en el modo tablero
+_INSTRUCCION_TABLERO = (
+    "Modo tablero: si la pregunta pide varios datos independientes, responde con una consulta "
+    "SELECT por cada uno (a lo mas {max_queries}), separadas por ';'. Cada consulta debe poder "
+    "ejecutarse sola (sin tablas temporales ni variables compartidas) y va precedida de una "
+    "linea de comentario `-- titulo` que describe lo que responde. Si basta una consulta, "
+    "responde solo con ella."
+)
 
 
 class LLMService(): 
+    """
+    Servicio que traduce lenguaje natural a SQL con Azure OpenAI. 
+    Esta pensado para vivir toda la vida de la aplicacion: el cliente (y su pool HTTP) 
+    se reutiliza entre peticiones y el system prompt solo se relee si cambia el archivo.
+    """
     
     def __init__(self,
-        system_prompt: Optional[str] = None    
+        system_prompt: Optional[str] = None, 
+        semantic_cache: Optional[SemanticCache] = None, 
+        scheduler: Optional[LLMScheduler] = None
     ):
+        """
+        Args: 
+            system_prompt (str | None): prompt del sistema; si no se indica se lee de assets/system_prompt.txt.
+            semantic_cache (SemanticCache | None): cache semantico a usar; si no se indica y hay deployment 
+                de embeddings configurado, se crea uno sobre el mismo cliente.
+            scheduler (LLMScheduler | None): planificador de llamadas (single-flight, limites por minuto, 
+                reintentos y circuit breaker); por defecto uno configurado con las variables LLM_*.
+        """
 
         self.model_name = AZURE_OPENAI_DEPLOYMENT_NAME 
         self.system_prompt = system_prompt 
+        self._prompt_mtime = None
+        self._fingerprint_src = None
+        self._fingerprint = None
         try: 
             # Crear el cliente de Azure 
+            # Los reintentos los hace el LLMScheduler (con Retry-After y circuit breaker), no el SDK
             self.client = AsyncAzureOpenAI(
                 api_key=AZURE_OPENAI_API_KEY, 
                 api_version=AZURE_OPENAI_API_VERSION, 
-                azure_endpoint=AZURE_OPENAI_ENDPOINT
+                azure_endpoint=AZURE_OPENAI_ENDPOINT, 
+                max_retries=0
+            )
+            self.scheduler = scheduler or LLMScheduler(
+                rpm=LLM_RPM, 
+                tpm=LLM_TPM, 
+                max_retries=LLM_MAX_RETRIES, 
+                backoff_base=LLM_BACKOFF_BASE, 
+                backoff_max=LLM_BACKOFF_MAX, 
+                breaker=CircuitBreaker(failure_threshold=LLM_BREAKER_FAILURES, reset_timeout=LLM_BREAKER_RESET)
             )
 
-            self._load_system_prompt()
+            if system_prompt is None: 
+                self._load_system_prompt()
+
+            if semantic_cache is None and SEMANTIC_CACHE_ENABLED and AZURE_OPENAI_DEPLOYMENT_EMBEDDING_NAME: 
+                semantic_cache = SemanticCache(
+                    embedder=AzureEmbedder(self.client, AZURE_OPENAI_DEPLOYMENT_EMBEDDING_NAME), 
+                    threshold=SEMANTIC_CACHE_THRESHOLD, 
+                    max_entries=SEMANTIC_CACHE_MAX_ENTRIES, 
+                    ttl=SEMANTIC_CACHE_TTL
+                )
+            self.semantic_cache = semantic_cache
         except Exception as e:
             raise RuntimeError(f"Error al inicializar el cliente de Azure OpenAI: {str(e)}")
             # Un RuntimeError es una excepción que indica que ha ocurrido un error en tiempo de ejecución.
@@ -44,20 +115,215 @@ class LLMService():
         system_message: str = None,
         temperatura: float = 0.5, 
         chat_memory: list = None,
+        contexto: Optional[str] = None,
+    ) -> str: 
+        """
+        Traduce la pregunta del usuario a SQL.
+
+        Args: 
+            user_message (str): pregunta del usuario.
+            system_message (str | None): system prompt propio; por defecto el de assets/system_prompt.txt.
+            temperatura (float): temperatura del modelo, entre 0 y 1.
+            chat_memory (list | None): mensajes previos user/assistant de la sesion.
+            contexto (str | None): contexto extra que se agrega al system prompt 
+                (p.ej. el esquema relevante del SchemaCatalog).
+        """
+
+        messages = self._build_messages(user_message, system_message, temperatura, chat_memory, contexto)
+
+        # Cache semantico: solo para preguntas sin memoria ni system prompt propio, 
+        # porque una pregunta de seguimiento depende de la conversacion previa
+        usar_cache = self.semantic_cache is not None and not chat_memory and system_message is None
+        vector = None
+        if usar_cache: 
+            cached, vector = await self.semantic_cache.lookup(user_message, self.prompt_fingerprint)
+            if cached is not None: 
+                return cached
+
+        tokens = self._estimate_tokens(messages)
+
+        async def completar(): 
+            response = await self.client.chat.completions.create( 
+                model=AZURE_OPENAI_DEPLOYMENT_NAME, 
+                messages=messages, 
+                temperature=temperatura, 
+            )
+            # Dentro de la llamada compartida: el uso se registra una vez por llamada al modelo, 
+            # no una vez por cada peticion agrupada
+            self._registrar_uso(tokens, getattr(response, "usage", None))
+            return response
+
+        try:
+            # Generar peticion; las peticiones identicas en vuelo comparten una sola llamada
+            response = await self.scheduler.run(
+                completar, 
+                key=self._request_key(messages, temperatura), 
+                tokens=tokens
+            )
+            answer = response.choices[0].message.content
+            if usar_cache: 
+                self.semantic_cache.store(user_message, answer, vector, self.prompt_fingerprint)
+            return answer
+        except CircuitOpenError: 
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Error al comunicarse con el modelo LLM: {str(e)}")
+            # Un RuntimeError es una excepción que indica que ha ocurrido un error en tiempo de ejecución.
+
+    async def ask_dashboard(
+        self, 
+        user_message: str, 
+        temperatura: float = 0.5, 
+        chat_memory: list = None, 
+        contexto: Optional[str] = None, 
+        max_queries: int = DASHBOARD_MAX_QUERIES, 
     ) -> str: 
+        """
+        Modo tablero: como `ask_llm`, pero el modelo puede responder una pregunta compuesta con 
+        varias consultas SELECT independientes separadas por ';' (ver `SQLGuard.check_many`). 
+        Usa un system prompt propio, asi que no comparte el cache semantico con `ask_llm`.
+        """
+        self._refresh_system_prompt()
+        instruccion = _INSTRUCCION_TABLERO.format(max_queries=max_queries)
+        system_message = f"{self.system_prompt}\n\n{instruccion}" if self.system_prompt else instruccion
+        return await self.ask_llm(
+            user_message, 
+            system_message=system_message, 
+            temperatura=temperatura, 
+            chat_memory=chat_memory, 
+            contexto=contexto
+        )
 
+    async def astream_llm(
+        self, 
+        user_message: str, 
+        system_message: str = None,
+        temperatura: float = 0.5, 
+        chat_memory: list = None,
+        contexto: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]: 
+        """
+        Variante de `ask_llm` que entrega la respuesta por fragmentos (deltas) conforme el modelo 
+        los genera. Recibe los mismos argumentos. Un acierto del cache semantico se entrega 
+        en un solo fragmento; una respuesta completa se guarda en el cache al terminar.
+        """
+        messages = self._build_messages(user_message, system_message, temperatura, chat_memory, contexto)
+
+        usar_cache = self.semantic_cache is not None and not chat_memory and system_message is None
+        vector = None
+        if usar_cache: 
+            cached, vector = await self.semantic_cache.lookup(user_message, self.prompt_fingerprint)
+            if cached is not None: 
+                yield cached
+                return
+
+        partes = []
+        tokens = self._estimate_tokens(messages)
+        opciones = {"stream_options": {"include_usage": True}} if LLM_STREAM_USAGE else {}
+        try: 
+            # Solo la apertura del stream pasa por el planificador (limites, reintentos, breaker); 
+            # un stream no se comparte entre peticiones
+            stream = await self.scheduler.run(
+                lambda: self.client.chat.completions.create( 
+                    model=AZURE_OPENAI_DEPLOYMENT_NAME, 
+                    messages=messages, 
+                    temperature=temperatura, 
+                    stream=True, 
+                    **opciones, 
+                ), 
+                tokens=tokens
+            )
+        except CircuitOpenError: 
+            raise
+        except Exception as e: 
+            raise RuntimeError(f"Error al comunicarse con el modelo LLM: {str(e)}")
+
+        usage = None
+        try: 
+            async for chunk in stream: 
+                # Con include_usage el ultimo chunk trae el uso y no trae choices
+                usage = getattr(chunk, "usage", None) or usage
+                # Azure envia un primer chunk sin choices (resultados del filtro de contenido)
+                if not chunk.choices: 
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta: 
+                    partes.append(delta)
+                    yield delta
+        except Exception as e: 
+            raise RuntimeError(f"Error al recibir la respuesta del modelo LLM: {str(e)}")
+        finally: 
+            # Si el consumidor abandona el stream se libera la conexion HTTP
+            await stream.close()
+            if usage is None: 
+                # Sin el uso del servicio se cuenta localmente lo enviado y lo recibido hasta aqui
+                prompt = tokens - LLM_MAX_OUTPUT_TOKENS
+                completion = count_tokens("".join(partes))
+                usage = SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion, total_tokens=prompt + completion)
+            self._registrar_uso(tokens, usage)
+
+        if usar_cache: 
+            self.semantic_cache.store(user_message, "".join(partes), vector, self.prompt_fingerprint)
+
+    def discard_answer(self, answer: str) -> None: 
+        """
+        Saca `answer` del cache semantico. Las rutas lo llaman cuando la guardia bloquea la 
+        respuesta o la consulta falla, para que la pregunta vuelva a pasar por el modelo.
+        """
+        if self.semantic_cache is not None and answer: 
+            self.semantic_cache.discard(answer)
+
+    def _registrar_uso(self, estimado: int, usage) -> None: 
+        """
+        Ajusta el limite de tokens por minuto con el uso real de una llamada al modelo y lo 
+        suma a las metricas. Se llama una sola vez por llamada, aunque la compartan varias peticiones.
+        """
+        self.scheduler.record_usage(estimado, getattr(usage, "total_tokens", None))
+        if usage is not None: 
+            LLM_TOKENS.inc(usage.prompt_tokens or 0, kind="prompt")
+            LLM_TOKENS.inc(usage.completion_tokens or 0, kind="completion")
+
+    @staticmethod
+    def _estimate_tokens(messages: list) -> int: 
+        """
+        Tokens estimados de una peticion: los mensajes mas el maximo esperado de salida.
+        """
+        return sum(count_tokens(m["content"]) + 4 for m in messages) + LLM_MAX_OUTPUT_TOKENS
+
+    @staticmethod
+    def _request_key(messages: list, temperatura: float) -> str: 
+        """
+        Huella de la peticion para agrupar llamadas identicas en vuelo.
+        """
+        datos = json.dumps([AZURE_OPENAI_DEPLOYMENT_NAME, temperatura, messages], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(datos.encode("utf-8")).hexdigest()
+
+    def _build_messages(
+        self, 
+        user_message: str, 
+        system_message: Optional[str], 
+        temperatura: float, 
+        chat_memory: Optional[list], 
+        contexto: Optional[str]
+    ) -> list: 
+        """
+        Valida la temperatura y arma la lista de mensajes (system, memoria, usuario).
+        """
         if temperatura > 1.0 or temperatura < 0: 
             raise ValueError("La temperaura debe tomar valores solo entre 0 y 1")
         if not isinstance(temperatura, (float, int)):
             raise TypeError("La temperatura debe ser un número.")
 
-        # TODO: que el chatbot tenga memoria,
         messages = []
+        self._refresh_system_prompt()
 
         # Si se incluye el system prompt
         if system_message or self.system_prompt: 
+            contenido = system_message or self.system_prompt
+            if contexto: 
+                contenido = f"{contenido}\n\n{contexto}"
             messages.append(
-                {"role": "system", "content": system_message or self.system_prompt}
+                {"role": "system", "content": contenido}
             )
 
         # Si se incluye el chat memory
@@ -69,26 +335,49 @@ class LLMService():
         messages.append(
             {"role": "user", "content": user_message}
         )
-        try:
-            # Generar peticion
-            response = await self.client.chat.completions.create( 
-                model=AZURE_OPENAI_DEPLOYMENT_NAME, 
-                messages=messages, 
-                temperature=temperatura, 
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            raise RuntimeError(f"Error al comunicarse con el modelo LLM: {str(e)}")
-            # Un RuntimeError es una excepción que indica que ha ocurrido un error en tiempo de ejecución.
+        return messages
 
     def _load_system_prompt(self): 
-        SYSTEM_PATH = Path("assets/system_prompt.txt")
         if SYSTEM_PATH.exists():
+            mtime = SYSTEM_PATH.stat().st_mtime
             with open(SYSTEM_PATH, "r", encoding="utf-8") as file:
                 self.system_prompt = file.read()
+            self._prompt_mtime = mtime
         else:
             raise FileNotFoundError(f"El archivo {SYSTEM_PATH} no existe. Por favor, crea el archivo con el prompt del sistema.")
 
+    @property
+    def prompt_fingerprint(self) -> Optional[str]: 
+        """
+        Huella del system prompt vigente; al cambiar se invalida el cache semantico.
+        """
+        if self.system_prompt is None: 
+            return None
+        if self._fingerprint_src is not self.system_prompt: 
+            self._fingerprint_src = self.system_prompt
+            self._fingerprint = hashlib.sha1(self.system_prompt.encode("utf-8")).hexdigest()
+        return self._fingerprint
+
+    def _refresh_system_prompt(self): 
+        """
+        Recarga el system prompt solo si el archivo cambio desde la ultima lectura. 
+        No aplica cuando el prompt se paso explicitamente al constructor.
+        """
+        if self._prompt_mtime is None: 
+            return
+        try: 
+            mtime = SYSTEM_PATH.stat().st_mtime
+        except OSError: 
+            return  # se conserva el ultimo prompt valido
+        if mtime != self._prompt_mtime: 
+            self._load_system_prompt()
+
+    async def aclose(self): 
+        """
+        Cierra el cliente de Azure y su pool de conexiones HTTP.
+        """
+        await self.client.close()
+
 
     def __repr__(self):
         return f"Servicio de Respuesta que implementa un modelo LLM para hacer consultas a AzureOpenai"
@@ -1,63 +1,250 @@
 """
-El modulo denota una clase que modela un logger, donde podremos registrar los 
-eventos relevantes. 
+El modulo denota una clase que modela un logger, donde podremos registrar los
+eventos relevantes.
+
+Los registros se encolan (QueueHandler) y un hilo de fondo (QueueListener) los formatea y
+escribe, de modo que registrar un evento en una peticion solo cuesta encolarlo:
+- Archivo en JSON por linea (log/app.log) y consola con colores.
+- Niveles por modulo (LOG_LEVELS="services.sql_connector=WARNING").
+- Formato perezoso: `Logger.info("Consulta: %s", query)` solo arma el texto si el nivel esta activo.
+- Tope de tamaño por mensaje y por argumento (LOG_MAX_CHARS), sin serializar objetos completos.
+- Muestreo de eventos frecuentes (`event="sql.ok"` con LOG_SAMPLE_RATES="sql.ok=0.1").
+- Cada registro hecho dentro de una peticion lleva su `request_id` (header X-Request-ID).
 """
-import logging 
-import os 
-import glob 
-import colorama 
+import atexit
+import copy
+import datetime as dt
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import colorama
+from core.config import (
+    LOG_LEVEL,
+    LOG_LEVELS,
+    LOG_FILE,
+    LOG_JSON,
+    LOG_MAX_CHARS,
+    LOG_SAMPLE_RATES,
+    LOG_QUEUE_MAX
+)
+from utils.text_preview import preview
+from services.metrics import current_request_id
+
+
+_RAIZ = "agente"
+_CAMPOS_ESTANDAR = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+_COLORES = {
+    logging.DEBUG: colorama.Fore.LIGHTBLACK_EX,
+    logging.INFO: colorama.Fore.LIGHTCYAN_EX,
+    logging.WARNING: colorama.Fore.LIGHTYELLOW_EX,
+    logging.ERROR: colorama.Fore.RED,
+    logging.CRITICAL: colorama.Fore.RED,
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Un objeto JSON por linea: ts, level, logger, msg, los campos extra y la excepcion si hay.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": dt.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for clave, valor in record.__dict__.items():
+            if clave not in _CAMPOS_ESTANDAR and not clave.startswith("_"):
+                datos[clave] = valor
+        if record.exc_info:
+            datos["exc"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """
+    Formato legible con color por nivel para la consola.
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        return _COLORES.get(record.levelno, "") + super().format(record) + colorama.Fore.RESET
 
 
-class Logger: 
+class SamplingFilter(logging.Filter):
+    """
+    Deja pasar solo una fraccion de los registros con `event` en `rates` (evento -> probabilidad).
+    Los errores nunca se muestrean.
+    """
 
-    os.makedirs("log", exist_ok=True)
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
 
-    logging.basicConfig(
-        # filename="log/app.log",
-        level=logging.INFO, 
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler("log/app.log"), 
-            logging.StreamHandler()  # Muestra en consola 
-        ],
-        encoding="utf-8"
-    )
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(getattr(record, "event", None))
+        if rate is None or record.levelno >= logging.ERROR:
+            return True
+        if random.random() < rate:
+            record.sample_rate = rate
+            return True
+        return False
 
-    logger = logging.getLogger()
-    print(colorama.Fore.RESET, "")
 
-    @staticmethod 
-    def info(message):
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que recorta el mensaje en el hilo que registra (sin serializar objetos completos)
+    y descarta registros si la cola esta llena en vez de bloquear la peticion.
+    """
+
+    def __init__(self, cola: queue.Queue, max_chars: int):
+        super().__init__(cola)
+        self.max_chars = max_chars
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Copia con el mensaje ya armado; la excepcion se formatea en el hilo del listener
+        record = copy.copy(record)
+        if isinstance(record.args, tuple):
+            record.args = tuple(
+                a if isinstance(a, (int, float, bool, type(None))) else preview(a, self.max_chars)
+                for a in record.args
+            )
+        record.msg, record.args = preview(record.getMessage(), self.max_chars), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class Logger:
+    """
+    Fachada de logging del proyecto. Conserva la API de siempre (`Logger.info/error/warning`)
+    y la configuracion se hace en el primer uso, no al importar el modulo.
+
+    Uso:
+        Logger.info("Consulta realizada en %.1f ms: %s", ms, query, event="sql.ok")
+        Logger.error("[Error.ConsultadorSQL.execute_sql] %s", e)
+    """
+
+    _lock = threading.Lock()
+    _listener = None
+    _handler = None
+    _loggers = {}
+
+    @staticmethod
+    def _setup() -> None:
+        with Logger._lock:
+            if Logger._listener is not None:
+                return
+            raiz = logging.getLogger(_RAIZ)
+            raiz.setLevel(LOG_LEVEL.upper())
+            raiz.propagate = False
+            for nombre, nivel in LOG_LEVELS.items():
+                logging.getLogger(f"{_RAIZ}.{nombre}").setLevel(nivel.upper())
+
+            destinos = []
+            if LOG_FILE:
+                os.makedirs(os.path.dirname(LOG_FILE) or ".", exist_ok=True)
+                archivo = logging.FileHandler(LOG_FILE, encoding="utf-8")
+                archivo.setFormatter(JsonFormatter() if LOG_JSON else logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+                destinos.append(archivo)
+            consola = logging.StreamHandler(sys.stderr)
+            consola.setFormatter(ConsoleFormatter())
+            destinos.append(consola)
+
+            cola = queue.Queue(maxsize=LOG_QUEUE_MAX)
+            Logger._handler = BoundedQueueHandler(cola, LOG_MAX_CHARS)
+            if LOG_SAMPLE_RATES:
+                Logger._handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+            raiz.addHandler(Logger._handler)
+
+            Logger._listener = logging.handlers.QueueListener(cola, *destinos, respect_handler_level=True)
+            Logger._listener.start()
+            atexit.register(Logger.shutdown)
+
+    @staticmethod
+    def shutdown() -> None:
+        """
+        Escribe lo pendiente y detiene el hilo del listener.
+        """
+        with Logger._lock:
+            if Logger._listener is not None:
+                Logger._listener.stop()
+                for handler in Logger._listener.handlers:
+                    handler.close()
+                logging.getLogger(_RAIZ).removeHandler(Logger._handler)
+                Logger._listener = None
+
+    @staticmethod
+    def get(nombre: str) -> logging.Logger:
+        """
+        Devuelve el logger del modulo `nombre` (bajo la raiz "agente").
+        """
+        if Logger._listener is None:
+            Logger._setup()
+        logger = Logger._loggers.get(nombre)
+        if logger is None:
+            logger = Logger._loggers[nombre] = logging.getLogger(f"{_RAIZ}.{nombre}")
+        return logger
+
+    @staticmethod
+    def _log(nivel: int, message, args: tuple, event: str = None, exc_info=None, **fields) -> None:
+        # El modulo que llama define el logger (y por tanto su nivel)
+        logger = Logger.get(sys._getframe(2).f_globals.get("__name__", "app"))
+        if not logger.isEnabledFor(nivel):
+            return
+        if event is not None:
+            fields["event"] = event
+        request_id = current_request_id()
+        if request_id is not None:
+            fields.setdefault("request_id", request_id)
+        logger.log(nivel, message, *args, exc_info=exc_info, extra=fields or None, stacklevel=3)
+
+    @staticmethod
+    def debug(message, *args, **fields):
+        """
+        Registra un evento DEBUG.
+        """
+        Logger._log(logging.DEBUG, message, args, **fields)
+
+    @staticmethod
+    def info(message, *args, **fields):
         """
         Guarda un log del tipo INFO en el archivo de logs.
         """
-        print(colorama.Fore.LIGHTCYAN_EX, "")
-        Logger.logger.info(message)
-        print(colorama.Fore.RESET)
+        Logger._log(logging.INFO, message, args, **fields)
 
     @staticmethod
-    def error(message: str):
+    def error(message: str, *args, **fields):
         """
         Guarda un log del tipo error en el log file
         """
-        print(colorama.Fore.RED, "")
-        Logger.logger.error(message)    
-        print(colorama.Fore.RESET)
+        Logger._log(logging.ERROR, message, args, **fields)
 
     @staticmethod
-    def warning(message: str):
+    def warning(message: str, *args, **fields):
         """
-        Guarda un log del tipo error en el log file
+        Guarda un log del tipo warning en el log file
         """
-        print(colorama.Fore.LIGHTYELLOW_EX, "")
-        Logger.logger.warning(message)    
-        print(colorama.Fore.RESET)
+        Logger._log(logging.WARNING, message, args, **fields)
 
 
 
-if __name__ == '__main__': 
+if __name__ == '__main__':
 
     Logger.error("Ejemplo de error")
     Logger.info("Ejemplo de info ")
     Logger.warning("Ejemplo de warning")
-    Logger.warning("No se leer ni escribir, solo se deletrear")
\ No newline at end of file
+    Logger.warning("No se leer ni escribir, solo se deletrear")
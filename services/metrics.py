@@ -0,0 +1,265 @@
+"""
+El modulo implementa las metricas del proceso: contadores e histogramas en memoria, la
+medicion de etapas por peticion (para el header Server-Timing) y la exposicion en el
+formato de texto de Prometheus para el endpoint /metrics.
+
+Uso:
+    with stage("llm"):
+        sql = await llm.ask_llm(...)
+
+    RESULT_ROWS.observe(len(rows), endpoint="/chat")
+    texto = REGISTRY.render()
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+_PREFIJO = "agente"
+
+# Buckets por defecto en segundos: de 5 ms a 60 s
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _escape(valor: Any) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(nombres: Tuple[str, ...], valores: Tuple[Any, ...], extra: str = "") -> str:
+    pares = [f'{n}="{_escape(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    if valor == math.inf:
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Counter:
+    """
+    Contador monotono con etiquetas.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        clave = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[clave] = self._values.get(clave, 0) + amount
+
+    def collect(self) -> List[str]:
+        lineas = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            valores = list(self._values.items())
+        for clave, valor in valores:
+            lineas.append(f"{self.name}{_labels(self.labelnames, clave)} {_numero(valor)}")
+        return lineas
+
+
+class Histogram:
+    """
+    Histograma acumulativo con buckets fijos y etiquetas (compatible con Prometheus).
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # clave de etiquetas -> [conteos por bucket (+Inf al final), suma]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        clave = tuple(labels.get(n, "") for n in self.labelnames)
+        indice = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += value
+
+    def collect(self) -> List[str]:
+        lineas = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(clave, list(conteos), suma) for clave, (conteos, suma) in self._series.items()]
+        for clave, conteos, suma in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (math.inf,), conteos):
+                acumulado += conteo
+                le = f'le="{_numero(limite)}"'
+                lineas.append(f"{self.name}_bucket{_labels(self.labelnames, clave, le)} {acumulado}")
+            lineas.append(f"{self.name}_sum{_labels(self.labelnames, clave)} {_numero(suma)}")
+            lineas.append(f"{self.name}_count{_labels(self.labelnames, clave)} {acumulado}")
+        return lineas
+
+
+class MetricsRegistry:
+    """
+    Registro de metricas del proceso. Ademas de contadores e histogramas acepta "collectors":
+    funciones que devuelven el `stats()` de un componente (caches, pool, planificador...) y
+    se exponen como gauges al momento de leer /metrics, sin costo en el camino de las peticiones.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: Dict[str, Tuple[Callable[[], Dict[str, Any]], Optional[str]]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = SECONDS_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def add_collector(self, name: str, fn: Callable[[], Dict[str, Any]], label: Optional[str] = None) -> None:
+        """
+        Registra (o reemplaza) un collector.
+
+        Args:
+            name (str): prefijo de las metricas (p.ej. "result_cache" -> agente_result_cache_hits).
+            fn (Callable): devuelve un dict con los valores; solo se exportan los numericos.
+            label (str | None): si se indica, `fn` devuelve {valor_etiqueta: dict} (p.ej. un dict por pool).
+        """
+        with self._lock:
+            self._collectors[name] = (fn, label)
+
+    def remove_collector(self, name: str) -> None:
+        with self._lock:
+            self._collectors.pop(name, None)
+
+    def render(self) -> str:
+        """
+        Devuelve todas las metricas en el formato de texto de Prometheus (version 0.0.4).
+        """
+        with self._lock:
+            metricas = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        lineas: List[str] = []
+        for metrica in metricas:
+            lineas.extend(metrica.collect())
+        for nombre, (fn, label) in collectors:
+            try:
+                datos = fn()
+            except Exception as e:
+                lineas.append(f"# collector {nombre} fallo: {_escape(e)}")
+                continue
+            lineas.extend(self._gauges(nombre, datos, label))
+        return "\n".join(lineas) + "\n"
+
+    def _get_or_create(self, cls, name: str, help: str, labelnames: Iterable[str], **kwargs):
+        nombre = f"{_PREFIJO}_{name}"
+        with self._lock:
+            metrica = self._metrics.get(nombre)
+            if metrica is None:
+                metrica = self._metrics[nombre] = cls(nombre, help, labelnames, **kwargs)
+            elif not isinstance(metrica, cls):
+                raise ValueError(f"[Error.MetricsRegistry] La metrica {nombre} ya existe con otro tipo")
+            return metrica
+
+    @staticmethod
+    def _gauges(nombre: str, datos: Dict[str, Any], label: Optional[str]) -> List[str]:
+        series = datos.items() if label else [(None, datos)]
+        valores: Dict[str, List[str]] = {}
+        for etiqueta, stats in series:
+            sufijo = _labels((label,), (etiqueta,)) if label else ""
+            for clave, valor in (stats or {}).items():
+                if isinstance(valor, bool):
+                    valor = int(valor)
+                if not isinstance(valor, (int, float)):
+                    continue
+                metrica = f"{_PREFIJO}_{nombre}_{clave}".replace(".", "_").replace("-", "_")
+                valores.setdefault(metrica, []).append(f"{metrica}{sufijo} {_numero(valor)}")
+        lineas = []
+        for metrica, muestras in valores.items():
+            lineas.append(f"# TYPE {metrica} gauge")
+            lineas.extend(muestras)
+        return lineas
+
+
+# Registro del proceso y metricas comunes
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Duracion de cada etapa de una peticion.", ["stage"])
+HTTP_SECONDS = REGISTRY.histogram("http_request_seconds", "Duracion de las peticiones HTTP.", ["method", "route", "status"])
+POOL_WAIT_SECONDS = REGISTRY.histogram("db_pool_wait_seconds", "Espera para obtener una conexion del pool.", ["pool"])
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "Tokens consumidos por el LLM segun la respuesta.", ["kind"])
+RESULT_ROWS = REGISTRY.histogram("result_rows", "Filas devueltas por consulta.", ["endpoint"], buckets=ROWS_BUCKETS)
+
+
+# ---------------------------------------------------------------------- #
+# Contexto por peticion
+# ---------------------------------------------------------------------- #
+class RequestTimings:
+    """
+    Id de la peticion y milisegundos acumulados por etapa (en orden de aparicion).
+    """
+
+    __slots__ = ("request_id", "started", "stages")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, nombre: str, segundos: float) -> None:
+        self.stages[nombre] = self.stages.get(nombre, 0.0) + segundos * 1000
+
+    def server_timing(self) -> str:
+        """
+        Valor del header Server-Timing: `history;dur=3.1, llm;dur=812.4, ..., total;dur=905.0`.
+        """
+        partes = [f"{nombre};dur={ms:.1f}" for nombre, ms in self.stages.items()]
+        partes.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(partes)
+
+
+_request: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def begin_request(request_id: str) -> RequestTimings:
+    """
+    Abre el contexto de medicion de la peticion actual (lo usa el middleware).
+    """
+    timings = RequestTimings(request_id)
+    _request.set(timings)
+    return timings
+
+
+def current_request_id() -> Optional[str]:
+    """
+    Id de la peticion en curso, o None fuera de una peticion.
+    """
+    timings = _request.get()
+    return timings.request_id if timings is not None else None
+
+
+@contextmanager
+def stage(nombre: str) -> Iterator[None]:
+    """
+    Mide un bloque como etapa `nombre`: alimenta el histograma `agente_stage_seconds` y, si hay
+    una peticion en curso, su header Server-Timing. Sirve igual en codigo sync y async.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        STAGE_SECONDS.observe(segundos, stage=nombre)
+        timings = _request.get()
+        if timings is not None:
+            timings.add(nombre, segundos)
@@ -0,0 +1,153 @@
+"""
+El modulo implementa un cache de resultados de consultas SQL con TTL por tabla,
+presupuesto de memoria (LRU) e invalidacion explicita por nombre de tabla.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from utils.sql_text import normalize_sql, referenced_tables, table_name
+
+
+def estimate_size(result: Dict[str, Any]) -> int:
+    """
+    Estima en bytes el tamaño en memoria de un resultado {"columns", "rows"}.
+    """
+    size = sys.getsizeof(result["columns"]) + sum(sys.getsizeof(c) for c in result["columns"])
+    rows = result["rows"]
+    size += sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
+
+
+class ResultCache:
+    """
+    Cache thread-safe de payloads {"columns", "rows"} indexado por el texto SQL normalizado.
+
+    - TTL por defecto y TTL por tabla (se usa el menor de las tablas consultadas; 0 = no cachear).
+    - Presupuesto de memoria con expulsion LRU.
+    - `invalidate_table` expulsa solo las entradas que dependen de esa tabla.
+    Los resultados devueltos se comparten entre peticiones: no deben modificarse.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        default_ttl: float = 300,
+        table_ttls: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Args:
+            max_bytes (int): memoria maxima estimada para todos los resultados.
+            default_ttl (float): segundos de vida por defecto.
+            table_ttls (dict | None): TTL por tabla, p.ej. {"Efectividad_Andromeda": 600, "Historial_Chat": 0}.
+        """
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.table_ttls = {table_name(k): v for k, v in (table_ttls or {}).items()}
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_table: Dict[str, set] = {}
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve el resultado cacheado para `query` o None.
+        """
+        key = normalize_sql(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry["expires"] <= time.monotonic():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry["result"]
+
+    def put(self, query: str, result: Dict[str, Any]) -> bool:
+        """
+        Guarda el resultado de `query` si su TTL es mayor a 0 y cabe en el presupuesto.
+
+        Returns:
+            bool: True si se guardo.
+        """
+        tables = referenced_tables(query)
+        ttl = min([self.default_ttl] + [self.table_ttls[t] for t in tables if t in self.table_ttls])
+        if ttl <= 0:
+            return False
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            return False
+
+        key = normalize_sql(query)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "result": result,
+                "tables": tables,
+                "size": size,
+                "expires": time.monotonic() + ttl,
+            }
+            for t in tables:
+                self._by_table.setdefault(t, set()).add(key)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+        return True
+
+    def invalidate_table(self, table: str) -> int:
+        """
+        Expulsa las entradas que consultan `table` (acepta nombres de 1 a 3 partes).
+
+        Returns:
+            int: numero de entradas expulsadas.
+        """
+        with self._lock:
+            keys = list(self._by_table.get(table_name(table), ()))
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devuelve aciertos, fallos, expulsiones, bytes usados y tasa de aciertos.
+        """
+        with self._lock:
+            datos = dict(self._stats)
+            datos.update({"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes})
+        consultas = datos["hits"] + datos["misses"]
+        datos["hit_rate"] = datos["hits"] / consultas if consultas else 0.0
+        return datos
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+        for t in entry["tables"]:
+            keys = self._by_table.get(t)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[t]
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,5 +1,89 @@
-import pandas as pd
-from typing import List, Tuple, Any, Dict
+from functools import cached_property
+from typing import TYPE_CHECKING, List, Tuple, Any, Dict, Optional
+from services.table_renderer import render_html_table
+from services.columnar import ColumnarResult
+
+if TYPE_CHECKING:
+    # pandas solo se importa cuando se pide el DataFrame (KPI, grafico), no al arrancar
+    import pandas as pd
+
+
+class ParsedResult:
+    """
+    Resultado de una consulta con vistas perezosas: cada representacion (JSON, HTML, KPI, 
+    grafico, DataFrame) se calcula solo la primera vez que se pide y queda memorizada. 
+    El DataFrame se construye una sola vez y lo comparten las vistas que lo necesitan.
+    """
+
+    def __init__(
+        self, 
+        parser: "ResultParser", 
+        columns: List[str], 
+        rows: Optional[List[List[Any]]] = None, 
+        columnar: Optional[ColumnarResult] = None
+    ) -> None:
+        if rows is None and columnar is None:
+            raise ValueError("[Error.ParsedResult] Se requieren filas o un ColumnarResult")
+        self.parser = parser
+        self.columns = columns
+        self.columnar = columnar
+        if rows is not None:
+            self.rows = rows
+
+    @cached_property
+    def rows(self) -> List[List[Any]]:
+        # Solo se llega aqui con un ColumnarResult: las filas se decodifican bajo demanda
+        return list(self.columnar.iter_rows())
+
+    @property
+    def rows_count(self) -> int:
+        return len(self.columnar) if self.columnar is not None else len(self.rows)
+
+    @property
+    def columns_count(self) -> int:
+        return len(self.columns)
+
+    @cached_property
+    def dataframe(self) -> "pd.DataFrame":
+        if self.columnar is not None:
+            return self.columnar.to_dataframe()  # sin copiar los arreglos
+        return self.parser.to_dataframe(self.columns, self.rows)
+
+    @cached_property
+    def json(self) -> List[Dict[str, Any]]:
+        return self.parser.to_json(self.columns, self.rows)
+
+    @cached_property
+    def html(self) -> str:
+        # El renderizador trabaja sobre las filas, no necesita el DataFrame
+        return self.parser.to_html_table(self.columns, self.rows)
+
+    @cached_property
+    def kpi(self) -> Dict[str, Any]:
+        # Un KPI es un resultado 1x1: se detecta sin construir el DataFrame
+        if self.columns_count == 1 and self.rows_count == 1:
+            return self.parser.detect_kpi(self.dataframe)
+        return {}
+
+    @cached_property
+    def chart(self) -> Dict[str, Any]:
+        # Solo los resultados de 2 columnas pueden graficarse; el resto no paga el DataFrame
+        if self.columns_count == 2:
+            return self.parser.detect_chart_data(self.dataframe)
+        return {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Materializa todas las vistas (equivale al antiguo `ResultParser.parse_result`).
+        """
+        return {
+            "json": self.json,
+            "html": self.html,
+            "kpi": self.kpi,
+            "chart": self.chart,
+            "rows_count": self.rows_count,
+            "columns_count": self.columns_count,
+        }
 
 
 class ResultParser:
@@ -20,20 +104,20 @@ class ResultParser:
         """
         return [dict(zip(columns, row)) for row in rows]
 
-    def to_dataframe(self, columns: List[str], rows: List[List[Any]]) -> pd.DataFrame:
+    def to_dataframe(self, columns: List[str], rows: List[List[Any]]) -> "pd.DataFrame":
         """
         Convierte los datos a un DataFrame de pandas.
         """
+        import pandas as pd
         return pd.DataFrame(rows, columns=columns)
 
     def to_html_table(self, columns: List[str], rows: List[List[Any]]) -> str:
         """
         Convierte los datos a una tabla HTML con clases de estilo.
         """
-        df = self.to_dataframe(columns, rows)
-        return df.to_html(classes="table table-striped table-sm", index=False, border=0)
+        return render_html_table(columns, rows, classes="table table-striped table-sm")
 
-    def detect_kpi(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def detect_kpi(self, df: "pd.DataFrame") -> Dict[str, Any]:
         """
         Si el DataFrame contiene un solo valor, lo devuelve como KPI.
         """
@@ -41,12 +125,13 @@ class ResultParser:
             return {"label": df.columns[0], "value": df.iloc[0, 0]}
         return {}
 
-    def detect_chart_data(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def detect_chart_data(self, df: "pd.DataFrame") -> Dict[str, Any]:
         """
         Detecta si los datos son graficables automáticamente.
         Si hay 2 columnas (categórica + numérica), retorna datos para gráfico de barras.
         """
-        if df.shape[1] == 2 and pd.api.types.is_numeric_dtype(df[df.columns[1]]):
+        from pandas.api.types import is_numeric_dtype
+        if df.shape[1] == 2 and is_numeric_dtype(df[df.columns[1]]):
             return {
                 "type": "bar",
                 "x": df[df.columns[0]].astype(str).tolist(),
@@ -56,19 +141,25 @@ class ResultParser:
             }
         return {}
 
+    def parse(self, columns: List[str], rows: List[List[Any]]) -> ParsedResult:
+        """
+        Devuelve un ParsedResult cuyas vistas se calculan bajo demanda.
+        """
+        return ParsedResult(self, columns, rows)
+
+    def parse_columnar(self, columnar: ColumnarResult) -> ParsedResult:
+        """
+        Devuelve un ParsedResult sobre un ColumnarResult; el DataFrame se arma sin copias 
+        y las filas solo se decodifican si se pide la vista JSON o HTML.
+        """
+        return ParsedResult(self, columnar.columns, columnar=columnar)
+
     def parse_result(self, columns: List[str], rows: List[List[Any]]) -> Dict[str, Any]:
         """
         Método principal: devuelve una estructura con múltiples formatos del resultado.
+        Usa un solo DataFrame compartido; si solo se necesita una vista conviene `parse`.
         """
-        df = self.to_dataframe(columns, rows)
-        return {
-            "json": self.to_json(columns, rows),
-            "html": self.to_html_table(columns, rows),
-            "kpi": self.detect_kpi(df),
-            "chart": self.detect_chart_data(df),
-            "rows_count": len(rows),
-            "columns_count": len(columns),
-        }
+        return self.parse(columns, rows).to_dict()
 
 
 
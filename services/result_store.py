@@ -0,0 +1,52 @@
+"""
+El modulo implementa un almacen de resultados del lado del servidor: /chat guarda el 
+resultado y el navegador solo recibe un ID, en lugar de reenviar la tabla completa a /panel.
+"""
+import uuid
+from typing import Any, Dict, Optional
+from services.session_store import MemorySessionStore, SessionStore
+
+
+class ResultStore:
+    """
+    Almacen acotado y con expiracion de resultados por ID, sobre un `SessionStore` (en memoria
+    del proceso por defecto; con el almacen compartido /panel y la paginacion funcionan aunque
+    la peticion la atienda otro worker).
+    Uso:
+        result_id = await store.put({"message": ..., "html": ...})
+        entry = await store.get(result_id)   # None si expiro o fue expulsado
+    """
+
+    def __init__(self, max_entries: int = 200, ttl: float = 1800, store: Optional[SessionStore] = None):
+        """
+        Args:
+            max_entries (int): numero maximo de resultados guardados si no se indica `store`.
+            ttl (float): segundos que vive cada resultado.
+            store (SessionStore | None): almacen de los resultados; por defecto uno en memoria del proceso.
+        """
+        self.ttl = ttl
+        self.store = store if store is not None else MemorySessionStore(max_results=max_entries)
+
+    @staticmethod
+    def new_id() -> str:
+        """
+        Genera un ID nuevo, util cuando el contenido a guardar necesita conocer su propio ID.
+        """
+        return uuid.uuid4().hex
+
+    async def put(self, data: Dict[str, Any], result_id: Optional[str] = None) -> str:
+        """
+        Guarda `data` y devuelve su ID (se genera uno si no se indica).
+        """
+        result_id = result_id or self.new_id()
+        await self.store.acall(self.store.put_result, result_id, data, self.ttl)
+        return result_id
+
+    async def get(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve el resultado guardado con `result_id`, o None si no existe o ya expiro.
+        """
+        return await self.store.acall(self.store.get_result, result_id)
+
+    def __len__(self):
+        return self.store.stats()["results"]
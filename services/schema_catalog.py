@@ -0,0 +1,366 @@
+"""
+El modulo implementa un catalogo en memoria del esquema de las tablas permitidas
+(columnas, tipos, filas estimadas y valores de ejemplo) y arma, por pregunta, el
+fragmento de esquema relevante que se inyecta en el prompt del LLM.
+"""
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+from services.logger import Logger
+from services.semantic_cache import normalize_question
+from utils.sql_text import split_identifier, table_name
+
+
+_TEXT_TYPES = {"char", "varchar", "nchar", "nvarchar"}
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+def _words(texto: str) -> Set[str]:
+    """
+    Palabras normalizadas de un nombre o texto: separa snake_case y camelCase, sin acentos.
+    """
+    return set(normalize_question(_CAMEL_RE.sub(" ", texto).replace("_", " ")).split())
+
+
+def _match(pregunta: Set[str], palabras: Set[str]) -> int:
+    """
+    Cuenta las palabras de `palabras` que aparecen en la pregunta, tolerando plurales y
+    flexiones comunes ("region" / "regiones", "activa" / "activas").
+    """
+    total = 0
+    for w in palabras:
+        if w in pregunta or (len(w) >= 4 and any(len(q) >= 4 and (q.startswith(w) or w.startswith(q)) for q in pregunta)):
+            total += 1
+    return total
+
+
+def _quote(nombre: str) -> str:
+    return "[" + nombre.replace("]", "]]") + "]"
+
+
+class ColumnInfo:
+    """
+    Metadatos de una columna del catalogo.
+    """
+
+    __slots__ = ("name", "data_type", "nullable", "max_length", "samples", "words")
+
+    def __init__(self, name: str, data_type: str, nullable: bool = True, max_length: Optional[int] = None):
+        self.name = name
+        self.data_type = data_type
+        self.nullable = nullable
+        self.max_length = max_length
+        self.samples: List[str] = []
+        self.words = _words(name)
+
+    @property
+    def is_text(self) -> bool:
+        return self.data_type.lower() in _TEXT_TYPES
+
+    def describe(self, con_valores: bool = True) -> str:
+        tipo = self.data_type
+        if self.is_text and self.max_length:
+            tipo += "(max)" if self.max_length == -1 else f"({self.max_length})"
+        texto = f"  - {self.name} {tipo}"
+        if con_valores and self.samples:
+            texto += " valores: " + ", ".join("'" + s.replace("'", "''") + "'" for s in self.samples)
+        return texto
+
+
+class TableInfo:
+    """
+    Metadatos de una tabla permitida.
+    """
+
+    def __init__(self, identifier: str, columns: List[ColumnInfo], row_count: Optional[int], version: str):
+        self.identifier = identifier
+        self.columns = columns
+        self.row_count = row_count
+        self.version = version
+        self.words = _words(table_name(identifier))
+        self.loaded_at = time.time()
+
+    def header(self) -> str:
+        filas = f" (~{self.row_count:,} filas)" if self.row_count is not None else ""
+        return f"{self.identifier}{filas}"
+
+
+class SchemaCatalog:
+    """
+    Catalogo del esquema de las tablas permitidas, introspectado a traves de ConsultadorSQL.
+
+    - `refresh` consulta la fecha de modificacion (`sys.objects.modify_date`) de cada tabla y
+      solo vuelve a introspectar las que cambiaron (refresco incremental).
+    - Las sentencias DDL que pasan por el consultador marcan la tabla como pendiente y
+      adelantan el siguiente refresco.
+    - `context_for(pregunta)` devuelve el subconjunto de tablas/columnas relevantes en texto
+      compacto, listo para el prompt.
+    - `on_change` registra funciones que se llaman con la nueva version del catalogo
+      (p.ej. para invalidar el cache semantico). Con `arefresh` se llaman en el event loop,
+      no en el hilo del ejecutor.
+
+    Uso:
+        catalog = SchemaCatalog(consultador, ["[RPA].[dbo].[Efectividad_Andromeda]"])
+        await catalog.arefresh()
+        contexto = catalog.context_for("¿cuantas registros activos hay?")
+    """
+
+    def __init__(
+        self,
+        consultador: Any,
+        tables: List[str],
+        sample_values: int = 5,
+        sample_rows: int = 10000,
+        max_tables: int = 3,
+        max_columns: int = 25,
+        max_age: float = 3600,
+    ):
+        """
+        Args:
+            consultador (ConsultadorSQL): consultador usado para leer los metadatos.
+            tables (list): identificadores de las tablas permitidas (1 a 3 partes).
+            sample_values (int): valores distintos de ejemplo por columna de texto (0 = sin ejemplos).
+            sample_rows (int): filas maximas que se leen para obtener los valores de ejemplo.
+            max_tables (int): tablas maximas por contexto.
+            max_columns (int): columnas maximas por tabla en el contexto.
+            max_age (float): segundos tras los cuales una tabla se reintrospecta aunque no cambie
+                su estructura (para actualizar conteos y valores de ejemplo).
+        """
+        self.consultador = consultador
+        self.tables = list(tables)
+        self.sample_values = sample_values
+        self.sample_rows = sample_rows
+        self.max_tables = max_tables
+        self.max_columns = max_columns
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._catalog: Dict[str, TableInfo] = {}
+        self._stale: Set[str] = set()
+        self._listeners: List[Callable[[str], None]] = []
+        self._version: Optional[str] = None
+        self._pendiente: Optional[str] = None  # version por notificar tras un refresco en otro hilo
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._names = {table_name(t): t for t in self.tables}
+
+        consultador.add_table_listener(self.mark_stale)
+
+    # ------------------------------------------------------------------ #
+    # Refresco
+    # ------------------------------------------------------------------ #
+    @property
+    def version(self) -> Optional[str]:
+        return self._version
+
+    def on_change(self, listener: Callable[[str], None]) -> None:
+        self._listeners.append(listener)
+
+    def mark_stale(self, tables: List[str], ddl: bool = True) -> None:
+        """
+        Marca tablas para reintrospectarlas. El consultador la llama tras cada escritura; las
+        escrituras DML se ignoran (los valores de ejemplo se actualizan en el refresco periodico).
+        """
+        if not ddl:
+            return
+        afectadas = {self._names[t] for t in map(table_name, tables) if t in self._names}
+        if not afectadas:
+            return
+        with self._lock:
+            self._stale |= afectadas
+        if self._wakeup is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def refresh(self, force: bool = False, notify: bool = True) -> bool:
+        """
+        Actualiza el catalogo (bloqueante). Solo reintrospecta las tablas nuevas, marcadas,
+        vencidas (`max_age`) o cuya fecha de modificacion cambio.
+
+        Args:
+            force (bool): reintrospecta todas las tablas.
+            notify (bool): llama aqui a los listeners de `on_change`; con False la nueva version
+                queda pendiente y la notifica `arefresh` desde el event loop.
+        Returns:
+            bool: True si el catalogo cambio.
+        """
+        with self._lock:
+            stale, self._stale = self._stale, set()
+
+        cambio = False
+        for identifier in self.tables:
+            try:
+                version = self._table_version(identifier)
+                actual = self._catalog.get(identifier)
+                vigente = actual is not None and time.time() - actual.loaded_at < self.max_age
+                if not force and vigente and identifier not in stale and actual.version == version:
+                    continue
+                info = self._introspect(identifier, version)
+                if actual is None or self._signature(actual) != self._signature(info):
+                    cambio = True
+                self._catalog[identifier] = info
+            except Exception as e:
+                # Un fallo de metadatos no debe tumbar el chat: se conserva la ultima version conocida
+                Logger.warning(f"[SchemaCatalog] No se pudo introspectar {identifier}: {e}")
+
+        if cambio or self._version is None:
+            firma = "|".join(self._signature(self._catalog[t]) for t in self.tables if t in self._catalog)
+            version = hashlib.sha1(firma.encode("utf-8")).hexdigest()
+            if version != self._version:
+                anterior, self._version = self._version, version
+                Logger.info(f"[SchemaCatalog] Catalogo actualizado: {len(self._catalog)} tablas, version {version[:8]}")
+                if anterior is not None:
+                    if notify:
+                        self._notificar(version)
+                    else:
+                        self._pendiente = version
+                return True
+        return False
+
+    async def arefresh(self, force: bool = False) -> bool:
+        """
+        Version async de `refresh` (corre en el ejecutor SQL). Los listeners se llaman despues,
+        en el event loop, para que no compitan con las corrutinas que usan lo que invalidan.
+        """
+        cambio = await self.consultador.executor.run(self.refresh, force, False)
+        pendiente, self._pendiente = self._pendiente, None
+        if pendiente is not None:
+            self._notificar(pendiente)
+        return cambio
+
+    def _notificar(self, version: str) -> None:
+        for listener in self._listeners:
+            try:
+                listener(version)
+            except Exception as e:
+                Logger.warning(f"[SchemaCatalog] Fallo un listener de on_change: {e}")
+
+    async def run_auto_refresh(self, interval: float) -> None:
+        """
+        Refresca el catalogo al arrancar y despues cada `interval` segundos, o antes si una
+        escritura marco alguna tabla. Pensado para correr como tarea de fondo del lifespan.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await self.arefresh()
+            except Exception as e:
+                Logger.warning(f"[SchemaCatalog] Fallo el refresco del catalogo: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    # ------------------------------------------------------------------ #
+    # Contexto para el prompt
+    # ------------------------------------------------------------------ #
+    def context_for(self, question: str) -> Optional[str]:
+        """
+        Devuelve el esquema relevante para `question` en texto compacto, o None si el catalogo
+        aun no se ha cargado.
+
+        Las tablas se ordenan por coincidencias de la pregunta con su nombre, sus columnas y los
+        valores de ejemplo; si nada coincide se incluyen todas (hasta `max_tables`). Dentro de
+        cada tabla se listan primero las columnas que coinciden, y solo ellas llevan valores.
+        """
+        catalogo = [self._catalog[t] for t in self.tables if t in self._catalog]
+        if not catalogo:
+            return None
+        pregunta = _words(question)
+
+        puntajes = []
+        for info in catalogo:
+            por_columna = {
+                c.name: 2 * _match(pregunta, c.words) + _match(pregunta, {w for s in c.samples for w in _words(s)})
+                for c in info.columns
+            }
+            puntaje = 3 * _match(pregunta, info.words) + sum(por_columna.values())
+            puntajes.append((puntaje, info, por_columna))
+
+        relevantes = [p for p in puntajes if p[0] > 0] or puntajes
+        relevantes.sort(key=lambda p: p[0], reverse=True)
+
+        bloques = ["## Esquema relevante"]
+        for _, info, por_columna in relevantes[: self.max_tables]:
+            columnas = sorted(info.columns, key=lambda c: por_columna[c.name] == 0)  # estable: respeta el orden original
+            bloques.append(info.header())
+            for c in columnas[: self.max_columns]:
+                bloques.append(c.describe(con_valores=por_columna[c.name] > 0))
+            if len(columnas) > self.max_columns:
+                bloques.append(f"  - ... ({len(columnas) - self.max_columns} columnas mas)")
+        return "\n".join(bloques)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tables": len(self._catalog),
+            "columns": sum(len(t.columns) for t in self._catalog.values()),
+            "version": self._version,
+            "stale": len(self._stale),
+        }
+
+    # ------------------------------------------------------------------ #
+    # Introspeccion (T-SQL)
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _parts(identifier: str):
+        partes = split_identifier(identifier)
+        db = partes[-3] if len(partes) >= 3 else None
+        schema = partes[-2] if len(partes) >= 2 else "dbo"
+        prefijo = f"{_quote(db)}." if db else ""
+        return prefijo, schema, partes[-1]
+
+    def _table_version(self, identifier: str) -> str:
+        prefijo, _, _ = self._parts(identifier)
+        _, rows = self.consultador.fetch_all(
+            f"SELECT modify_date FROM {prefijo}sys.objects WHERE object_id = OBJECT_ID(?)", (identifier,)
+        )
+        if not rows:
+            raise LookupError(f"la tabla {identifier} no existe")
+        return str(rows[0][0])
+
+    def _introspect(self, identifier: str, version: str) -> TableInfo:
+        prefijo, schema, nombre = self._parts(identifier)
+        _, rows = self.consultador.fetch_all(
+            f"SELECT COLUMN_NAME, DATA_TYPE, IS_NULLABLE, CHARACTER_MAXIMUM_LENGTH "
+            f"FROM {prefijo}INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ? "
+            f"ORDER BY ORDINAL_POSITION",
+            (schema, nombre),
+        )
+        columns = [ColumnInfo(r[0], r[1], r[2] == "YES", r[3]) for r in rows]
+
+        _, rows = self.consultador.fetch_all(
+            f"SELECT SUM(p.rows) FROM {prefijo}sys.partitions p WHERE p.object_id = OBJECT_ID(?) AND p.index_id IN (0, 1)",
+            (identifier,),
+        )
+        row_count = int(rows[0][0]) if rows and rows[0][0] is not None else None
+
+        if self.sample_values > 0:
+            for c in columns:
+                # Solo texto corto: los valores de categorias (estatus, region...) son los que ayudan al modelo
+                if not c.is_text or c.max_length is None or c.max_length == -1 or c.max_length > 100:
+                    continue
+                col = _quote(c.name)
+                _, rows = self.consultador.fetch_all(
+                    f"SELECT TOP (?) v FROM (SELECT TOP (?) {col} AS v FROM {identifier} WHERE {col} IS NOT NULL) s "
+                    f"GROUP BY v ORDER BY COUNT(*) DESC, v",
+                    (self.sample_values, self.sample_rows),
+                )
+                c.samples = [str(r[0]) for r in rows]
+
+        return TableInfo(identifier, columns, row_count, version)
+
+    @staticmethod
+    def _signature(info: TableInfo) -> str:
+        # La version del catalogo sigue solo la estructura: los valores de ejemplo y el conteo de
+        # filas cambian con los datos y no deben invalidar el cache semantico
+        return info.identifier + ":" + ";".join(
+            f"{c.name} {c.data_type} {c.max_length} {c.nullable}" for c in info.columns
+        )
+
+    def __repr__(self):
+        s = self.stats()
+        return f"SchemaCatalog(tablas={s['tables']}, columnas={s['columns']}, version={(s['version'] or '')[:8]})"
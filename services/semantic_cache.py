@@ -0,0 +1,221 @@
+"""
+El modulo implementa un cache semantico pregunta -> SQL: las preguntas se convierten a
+embeddings y se comparan contra las ya respondidas, para no pagar una llamada completa
+al modelo cuando el usuario repite una pregunta con otras palabras.
+"""
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from services.logger import Logger
+
+
+Embedder = Callable[[str], Awaitable[List[float]]]
+
+
+class AzureEmbedder:
+    """
+    Genera embeddings con el deployment de embeddings de Azure OpenAI.
+    Reutiliza el cliente AsyncAzureOpenAI del LLMService.
+    """
+
+    def __init__(self, client: Any, deployment: str):
+        self.client = client
+        self.deployment = deployment
+
+    async def __call__(self, text: str) -> List[float]:
+        response = await self.client.embeddings.create(model=self.deployment, input=text)
+        return response.data[0].embedding
+
+
+def normalize_question(text: str) -> str:
+    """
+    Normaliza una pregunta para la comparacion exacta: minusculas, sin acentos,
+    sin signos de puntuacion y con espacios simples.
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = "".join(c if c.isalnum() else " " for c in text)
+    return " ".join(text.split())
+
+
+class SemanticCache:
+    """
+    Cache en memoria de respuestas del LLM indexadas por el embedding de la pregunta.
+
+    - Coincidencia exacta (pregunta normalizada) sin calcular embeddings.
+    - Coincidencia semantica por similitud coseno sobre un indice vectorial en memoria.
+    - Expulsion LRU por numero de entradas y expiracion por TTL.
+    - Se invalida completo cuando cambia la huella (fingerprint) del system prompt.
+
+    Uso:
+        cache = SemanticCache(embedder=AzureEmbedder(client, "text-embedding"))
+        answer, vector = await cache.lookup(pregunta, fingerprint)
+        if answer is None:
+            answer = await llamar_llm(...)
+            cache.store(pregunta, answer, vector, fingerprint)
+        # si la guardia bloquea la respuesta o la base de datos no la pudo ejecutar
+        cache.discard(answer)
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        threshold: float = 0.92,
+        max_entries: int = 1000,
+        ttl: Optional[float] = 86400,
+    ):
+        """
+        Args:
+            embedder (Callable): corrutina texto -> vector. En pruebas puede ser un embedder falso determinista.
+            threshold (float): similitud coseno minima para considerar un acierto.
+            max_entries (int): maximo de preguntas guardadas (LRU).
+            ttl (float | None): segundos de vida de cada entrada; None para no expirar.
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError(f"[Error.SemanticCache] threshold debe estar en (0, 1], se recibio {threshold}")
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # pregunta normalizada -> entrada
+        self._fingerprint: Optional[str] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        self._stats = {"hits": 0, "exact_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0, "discards": 0, "errors": 0}
+
+    async def lookup(self, question: str, fingerprint: Optional[str] = None) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Busca una respuesta para `question`.
+
+        Args:
+            question (str): pregunta del usuario.
+            fingerprint (str | None): huella del system prompt vigente.
+        Returns:
+            (respuesta | None, vector | None): el vector se devuelve para reutilizarlo en `store`.
+        """
+        self._check_fingerprint(fingerprint)
+        self._purge_expired()
+
+        key = normalize_question(question)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            self._stats["exact_hits"] += 1
+            return entry["answer"], entry["vector"]
+
+        try:
+            vector = self._normalize(await self.embedder(question))
+        except Exception as e:
+            # El cache nunca debe romper el chat: sin embedding se va directo al LLM
+            self._stats["errors"] += 1
+            Logger.warning(f"[SemanticCache] No se pudo calcular el embedding: {e}")
+            return None, None
+
+        if self._entries:
+            matrix, keys = self._index()
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                hit_key = keys[best]
+                self._entries.move_to_end(hit_key)
+                self._stats["hits"] += 1
+                return self._entries[hit_key]["answer"], vector
+
+        self._stats["misses"] += 1
+        return None, vector
+
+    def store(self, question: str, answer: str, vector: Optional[np.ndarray], fingerprint: Optional[str] = None) -> None:
+        """
+        Guarda la respuesta de `question`. Sin vector (p.ej. fallo el embedder) no se guarda nada.
+        """
+        if vector is None or not answer:
+            return
+        self._check_fingerprint(fingerprint)
+        key = normalize_question(question)
+        self._entries[key] = {"answer": answer, "vector": self._normalize(vector), "created": time.monotonic()}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+        self._matrix = None
+
+    def discard(self, answer: str) -> int:
+        """
+        Quita las entradas cuya respuesta es `answer`, para no seguir sirviendo una SQL que la
+        guardia bloqueo o que fallo al ejecutarse (a esa pregunta ni a las parecidas).
+
+        Args:
+            answer (str): respuesta del LLM tal como se guardo con `store`.
+        Returns:
+            int: numero de entradas quitadas.
+        """
+        quitar = [k for k, e in self._entries.items() if e["answer"] == answer]
+        for k in quitar:
+            del self._entries[k]
+        if quitar:
+            self._stats["discards"] += len(quitar)
+            self._matrix = None
+        return len(quitar)
+
+    def invalidate(self) -> None:
+        """
+        Vacia el cache (p.ej. al cambiar el system prompt o el esquema).
+        """
+        if self._entries:
+            self._stats["invalidations"] += 1
+        self._entries.clear()
+        self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devuelve aciertos, fallos, expulsiones y tasa de aciertos.
+        """
+        datos = dict(self._stats)
+        consultas = datos["hits"] + datos["misses"]
+        datos["entries"] = len(self._entries)
+        datos["hit_rate"] = datos["hits"] / consultas if consultas else 0.0
+        return datos
+
+    # ------------------------------------------------------------------ #
+    # Auxiliares
+    # ------------------------------------------------------------------ #
+    def _check_fingerprint(self, fingerprint: Optional[str]) -> None:
+        if fingerprint != self._fingerprint:
+            if self._fingerprint is not None:
+                self.invalidate()
+            self._fingerprint = fingerprint
+
+    def _purge_expired(self) -> None:
+        if self.ttl is None:
+            return
+        limite = time.monotonic() - self.ttl
+        vencidas = [k for k, e in self._entries.items() if e["created"] < limite]
+        for k in vencidas:
+            del self._entries[k]
+        if vencidas:
+            self._stats["expirations"] += len(vencidas)
+            self._matrix = None
+
+    def _index(self) -> Tuple[np.ndarray, List[str]]:
+        # La matriz se reconstruye solo cuando cambio el contenido del cache
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries.keys())
+            self._matrix = np.vstack([self._entries[k]["vector"] for k in self._matrix_keys])
+        return self._matrix, self._matrix_keys
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norma = np.linalg.norm(v)
+        return v / norma if norma else v
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        s = self.stats()
+        return f"SemanticCache(entradas={s['entries']}, hit_rate={s['hit_rate']:.2%})"
@@ -0,0 +1,221 @@
+"""
+El modulo implementa el cache del historial por sesion (en memoria o compartido entre
+workers, segun el almacen de sesiones) y el selector de la ventana de memoria que se envia al LLM, acotada por un presupuesto de tokens.
+"""
+import threading
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from services.semantic_cache import normalize_question
+from services.session_store import MemorySessionStore, SessionStore
+
+
+Loader = Callable[[str], Awaitable[List[Dict[str, Any]]]]
+
+
+@lru_cache(maxsize=1)
+def _encoder():
+    # tiktoken es opcional: sin el se usa la aproximacion de ~4 caracteres por token
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Cuenta (o aproxima) los tokens de `text`.
+    """
+    if not text:
+        return 0
+    encoder = _encoder()
+    if encoder is not None:
+        return len(encoder.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+
+class Turn:
+    """
+    Un turno del chat (pregunta del usuario y respuesta SQL) con su conteo de tokens
+    calculado una sola vez.
+    """
+
+    __slots__ = ("user_message", "sql_query", "_tokens", "_words")
+
+    # Tokens extra por mensaje que agrega el formato de chat (rol, separadores)
+    OVERHEAD = 4
+
+    def __init__(self, user_message: str, sql_query: str):
+        self.user_message = user_message or ""
+        self.sql_query = sql_query or ""
+        self._tokens: Optional[int] = None
+        self._words: Optional[frozenset] = None
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "Turn":
+        return cls(row.get("user_message"), row.get("sql_query"))
+
+    @property
+    def tokens(self) -> int:
+        if self._tokens is None:
+            self._tokens = count_tokens(self.user_message) + count_tokens(self.sql_query) + 2 * self.OVERHEAD
+        return self._tokens
+
+    @property
+    def words(self) -> frozenset:
+        if self._words is None:
+            self._words = frozenset(normalize_question(self.user_message).split())
+        return self._words
+
+    def to_messages(self) -> List[Dict[str, str]]:
+        return [
+            {"role": "user", "content": self.user_message},
+            {"role": "assistant", "content": self.sql_query},
+        ]
+
+
+def select_window(
+    turns: List[Turn],
+    max_tokens: int,
+    question: Optional[str] = None,
+    strategy: str = "recent",
+    keep_last: int = 1,
+) -> List[Turn]:
+    """
+    Elige los turnos que caben en `max_tokens`, en orden cronologico.
+
+    Args:
+        turns (list): turnos de la sesion, del mas antiguo al mas reciente.
+        max_tokens (int): presupuesto de tokens para la memoria (0 o menos = sin memoria).
+        question (str | None): pregunta actual; se usa con la estrategia "relevant".
+        strategy (str): "recent" toma los turnos mas recientes; "relevant" prioriza los que
+            comparten mas palabras con `question` (los `keep_last` mas recientes siempre entran).
+        keep_last (int): turnos recientes que se priorizan siempre con "relevant".
+    Returns:
+        list: turnos seleccionados en orden cronologico.
+    """
+    if max_tokens <= 0 or not turns:
+        return []
+
+    if strategy == "relevant" and question:
+        palabras = frozenset(normalize_question(question).split())
+        recientes = list(range(len(turns) - 1, max(len(turns) - 1 - keep_last, -1), -1))
+        resto = sorted(
+            range(len(turns) - len(recientes)),
+            key=lambda i: (len(palabras & turns[i].words), i),
+            reverse=True,
+        )
+        orden = recientes + resto
+    elif strategy in ("recent", "relevant"):
+        orden = range(len(turns) - 1, -1, -1)
+    else:
+        raise ValueError(f"[Error.select_window] Estrategia invalida: {strategy}")
+
+    elegidos, usados = [], 0
+    for i in orden:
+        costo = turns[i].tokens
+        if usados + costo > max_tokens:
+            if strategy == "recent":
+                break  # la ventana reciente es contigua
+            continue
+        elegidos.append(i)
+        usados += costo
+    return [turns[i] for i in sorted(elegidos)]
+
+
+class SessionHistoryCache:
+    """
+    Cache de los turnos de cada sesion sobre un `SessionStore`.
+
+    - Lectura a la base (`loader`) solo en un fallo en frio; despues los turnos nuevos se
+      agregan con `append` conforme ocurren.
+    - El almacen define el alcance: en memoria (LRU entre sesiones, un solo worker) o
+      compartido entre workers (`SQLiteSessionStore`), con tope de turnos por sesion.
+
+    Uso:
+        cache = SessionHistoryCache(loader=consultador.aget_historial_by_session_id)
+        turns = await cache.get(session_id)
+        memoria = await cache.memory(session_id, question=mensaje)  # mensajes para ask_llm
+        await cache.append(session_id, mensaje, sql_query)
+    """
+
+    def __init__(
+        self,
+        loader: Loader,
+        max_sessions: int = 500,
+        max_turns: int = 200,
+        max_tokens: int = 2000,
+        strategy: str = "recent",
+        store: Optional[SessionStore] = None,
+    ):
+        """
+        Args:
+            loader (Callable): corrutina session_id -> filas del historial (dicts con user_message y sql_query).
+            max_sessions (int): sesiones maximas en memoria (LRU) si no se indica `store`.
+            max_turns (int): turnos maximos guardados por sesion (se descartan los mas antiguos).
+            max_tokens (int): presupuesto de tokens de la ventana de memoria.
+            strategy (str): "recent" o "relevant" (ver `select_window`).
+            store (SessionStore | None): almacen de los turnos; por defecto uno en memoria del proceso.
+        """
+        self.loader = loader
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.strategy = strategy
+        self.store = store if store is not None else MemorySessionStore(max_sessions=max_sessions)
+
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "appends": 0}
+
+    def _contar(self, evento: str) -> None:
+        with self._lock:
+            self._stats[evento] += 1
+
+    async def get(self, session_id: str) -> List[Turn]:
+        """
+        Devuelve los turnos de la sesion; consulta la base solo si la sesion no esta en el almacen.
+        """
+        turns = await self.store.acall(self.store.get_turns, session_id)
+        if turns is not None:
+            self._contar("hits")
+            return turns
+        self._contar("misses")
+
+        rows = await self.loader(session_id)
+        cargados = [Turn.from_row(row) for row in rows or []][-self.max_turns:]
+        # Si otra peticion (o worker) ya cargo o agrego turnos mientras se leia la base, se respeta lo suyo
+        return await self.store.acall(self.store.init_turns, session_id, cargados)
+
+    async def memory(self, session_id: str, question: Optional[str] = None) -> Optional[List[Dict[str, str]]]:
+        """
+        Devuelve los mensajes user/assistant de la ventana de memoria, o None si no hay historial.
+        """
+        turns = select_window(await self.get(session_id), self.max_tokens, question=question, strategy=self.strategy)
+        if not turns:
+            return None
+        return [message for turn in turns for message in turn.to_messages()]
+
+    async def append(self, session_id: str, user_message: str, sql_query: str) -> None:
+        """
+        Agrega un turno a la sesion si esta en el almacen (si no, se cargara completo de la base).
+        """
+        turn = Turn(user_message, sql_query)
+        # Los tokens se cuentan aqui una sola vez; con el almacen compartido viajan con el turno
+        turn.tokens
+        if await self.store.acall(self.store.append_turn, session_id, turn, self.max_turns):
+            self._contar("appends")
+
+    async def invalidate(self, session_id: Optional[str] = None) -> None:
+        await self.store.acall(self.store.drop_turns, session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            datos = dict(self._stats)
+        almacen = self.store.stats()
+        datos["sessions"] = almacen["sessions"]
+        datos["evictions"] = almacen["evictions"]
+        consultas = datos["hits"] + datos["misses"]
+        datos["hit_rate"] = datos["hits"] / consultas if consultas else 0.0
+        return datos
+
+    def __len__(self):
+        return self.store.stats()["sessions"]
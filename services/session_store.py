@@ -0,0 +1,328 @@
+"""
+El modulo implementa el almacen del estado de las sesiones del chat: los turnos de la
+memoria de cada sesion y los resultados que se muestran en el panel.
+
+- `MemorySessionStore`: en el proceso; suficiente con un solo worker.
+- `SQLiteSessionStore`: un archivo SQLite (WAL) que comparten todos los workers de uvicorn,
+  para que cualquier proceso pueda atender la siguiente peticion de una sesion.
+
+`SessionHistoryCache` y `ResultStore` reciben el mismo almacen (ver `create_session_store`) y
+lo llaman con `acall`, que ejecuta en un hilo las operaciones de los almacenes con I/O para no
+bloquear el event loop.
+"""
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from services.logger import Logger
+
+
+class SessionStore(ABC):
+    """
+    Interfaz comun de los almacenes de sesion. Los turnos y los resultados se guardan como
+    objetos opacos (el almacen compartido los serializa con pickle).
+
+    Los metodos son sincronos; desde el event loop se llaman con `acall`.
+    """
+
+    # True si las operaciones hacen I/O o pueden esperar un bloqueo (se ejecutan en un hilo)
+    blocking = False
+
+    async def acall(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Ejecuta `fn(*args)` (un metodo del almacen) sin bloquear el event loop: en un hilo si el
+        almacen es `blocking`, directo si solo toca memoria.
+        """
+        if self.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    @abstractmethod
+    def get_turns(self, session_id: str) -> Optional[List[Any]]:
+        """
+        Devuelve los turnos de la sesion, o None si la sesion no esta en el almacen.
+        """
+
+    @abstractmethod
+    def init_turns(self, session_id: str, turns: List[Any]) -> List[Any]:
+        """
+        Guarda los turnos cargados de la base si la sesion aun no existe y devuelve los vigentes
+        (si otra peticion la cargo o le agrego turnos mientras tanto, se respeta lo suyo).
+        """
+
+    @abstractmethod
+    def append_turn(self, session_id: str, turn: Any, max_turns: int) -> bool:
+        """
+        Agrega un turno a la sesion si existe, descartando los mas antiguos sobre `max_turns`.
+        Devuelve False si la sesion no esta (se cargara completa de la base).
+        """
+
+    @abstractmethod
+    def drop_turns(self, session_id: Optional[str] = None) -> None:
+        """
+        Olvida los turnos de la sesion (o de todas con None).
+        """
+
+    @abstractmethod
+    def put_result(self, result_id: str, data: Any, ttl: float) -> None:
+        """
+        Guarda un resultado del panel que vive `ttl` segundos.
+        """
+
+    @abstractmethod
+    def get_result(self, result_id: str) -> Optional[Any]:
+        """
+        Devuelve el resultado con `result_id`, o None si no existe o ya expiro.
+        """
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devuelve los conteos del almacen: sessions, results y evictions.
+        """
+
+    def close(self) -> None:
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Almacen en memoria del proceso, con LRU entre sesiones y entre resultados.
+    """
+
+    def __init__(self, max_sessions: int = 500, max_results: int = 200):
+        """
+        Args:
+            max_sessions (int): sesiones maximas guardadas (LRU).
+            max_results (int): resultados maximos guardados (LRU).
+        """
+        self.max_sessions = max_sessions
+        self.max_results = max_results
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self._results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._evictions = 0
+
+    def get_turns(self, session_id: str) -> Optional[List[Any]]:
+        with self._lock:
+            turns = self._sessions.get(session_id)
+            if turns is None:
+                return None
+            self._sessions.move_to_end(session_id)
+            return list(turns)
+
+    def init_turns(self, session_id: str, turns: List[Any]) -> List[Any]:
+        with self._lock:
+            actuales = self._sessions.get(session_id)
+            if actuales is None:
+                actuales = self._sessions[session_id] = list(turns)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self._evictions += 1
+            self._sessions.move_to_end(session_id)
+            return list(actuales)
+
+    def append_turn(self, session_id: str, turn: Any, max_turns: int) -> bool:
+        with self._lock:
+            turns = self._sessions.get(session_id)
+            if turns is None:
+                return False
+            turns.append(turn)
+            if len(turns) > max_turns:
+                del turns[: len(turns) - max_turns]
+            self._sessions.move_to_end(session_id)
+            return True
+
+    def drop_turns(self, session_id: Optional[str] = None) -> None:
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(session_id, None)
+
+    def put_result(self, result_id: str, data: Any, ttl: float) -> None:
+        with self._lock:
+            ahora = time.monotonic()
+            for k in [k for k, e in self._results.items() if e["expires"] <= ahora]:
+                del self._results[k]
+            self._results[result_id] = {"data": data, "expires": ahora + ttl}
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+
+    def get_result(self, result_id: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._results.get(result_id)
+            if entry is None:
+                return None
+            if entry["expires"] <= time.monotonic():
+                del self._results[result_id]
+                return None
+            self._results.move_to_end(result_id)
+            return entry["data"]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "results": len(self._results), "evictions": self._evictions}
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Almacen en un archivo SQLite compartido entre procesos (modo WAL). Cada proceso abre una
+    conexion; las escrituras van en transacciones cortas y SQLite las serializa entre workers.
+
+    - Las sesiones se expulsan por ultima actividad (el ultimo turno agregado) sobre `max_sessions`.
+    - Los resultados expiran por reloj de pared (`time.time()`, comun a todos los procesos) y
+      se descartan los mas antiguos sobre `max_results`.
+    - Las escrituras pueden esperar hasta `busy_timeout` el bloqueo de otro worker, por eso
+      es `blocking` y se llama desde un hilo.
+    """
+
+    blocking = True
+
+    _ESQUEMA = (
+        "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, last_access REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)",
+        "CREATE TABLE IF NOT EXISTS turns (session_id TEXT NOT NULL, seq INTEGER NOT NULL, turn BLOB NOT NULL, "
+        "PRIMARY KEY (session_id, seq)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS results (result_id TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS results_expires ON results (expires)",
+    )
+
+    def __init__(self, path: str = "data/sessions.db", max_sessions: int = 500, max_results: int = 200, busy_timeout: float = 5.0):
+        """
+        Args:
+            path (str): archivo SQLite; todos los workers deben apuntar al mismo.
+            max_sessions (int): sesiones maximas guardadas.
+            max_results (int): resultados maximos guardados.
+            busy_timeout (float): segundos que se espera el bloqueo de escritura de otro worker.
+        """
+        self.path = path
+        self.max_sessions = max_sessions
+        self.max_results = max_results
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=busy_timeout)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaccion():
+            for sentencia in self._ESQUEMA:
+                self._conn.execute(sentencia)
+
+    @contextmanager
+    def _transaccion(self) -> Iterator[sqlite3.Connection]:
+        """
+        Transaccion de escritura (BEGIN IMMEDIATE) bajo el lock del proceso.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _leer_turnos(self, session_id: str) -> Optional[List[Any]]:
+        if self._conn.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone() is None:
+            return None
+        filas = self._conn.execute("SELECT turn FROM turns WHERE session_id = ? ORDER BY seq", (session_id,)).fetchall()
+        return [pickle.loads(turn) for (turn,) in filas]
+
+    def get_turns(self, session_id: str) -> Optional[List[Any]]:
+        with self._lock:
+            return self._leer_turnos(session_id)
+
+    def init_turns(self, session_id: str, turns: List[Any]) -> List[Any]:
+        with self._transaccion() as conn:
+            actuales = self._leer_turnos(session_id)
+            if actuales is not None:
+                return actuales
+            conn.execute("INSERT INTO sessions (session_id, last_access) VALUES (?, ?)", (session_id, time.time()))
+            conn.executemany(
+                "INSERT INTO turns (session_id, seq, turn) VALUES (?, ?, ?)",
+                [(session_id, seq, pickle.dumps(turn, pickle.HIGHEST_PROTOCOL)) for seq, turn in enumerate(turns)],
+            )
+            sobrantes = [s for (s,) in conn.execute(
+                "SELECT session_id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?", (self.max_sessions,)
+            )]
+            if sobrantes:
+                conn.executemany("DELETE FROM turns WHERE session_id = ?", [(s,) for s in sobrantes])
+                conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(s,) for s in sobrantes])
+                self._evictions += len(sobrantes)
+            return list(turns)
+
+    def append_turn(self, session_id: str, turn: Any, max_turns: int) -> bool:
+        with self._transaccion() as conn:
+            if conn.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (time.time(), session_id)).rowcount == 0:
+                return False
+            (seq,) = conn.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM turns WHERE session_id = ?", (session_id,)).fetchone()
+            conn.execute(
+                "INSERT INTO turns (session_id, seq, turn) VALUES (?, ?, ?)",
+                (session_id, seq, pickle.dumps(turn, pickle.HIGHEST_PROTOCOL)),
+            )
+            conn.execute("DELETE FROM turns WHERE session_id = ? AND seq <= ?", (session_id, seq - max_turns))
+            return True
+
+    def drop_turns(self, session_id: Optional[str] = None) -> None:
+        with self._transaccion() as conn:
+            if session_id is None:
+                conn.execute("DELETE FROM turns")
+                conn.execute("DELETE FROM sessions")
+            else:
+                conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+                conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def put_result(self, result_id: str, data: Any, ttl: float) -> None:
+        blob = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        ahora = time.time()
+        with self._transaccion() as conn:
+            conn.execute("DELETE FROM results WHERE expires <= ?", (ahora,))
+            conn.execute("INSERT OR REPLACE INTO results (result_id, data, expires) VALUES (?, ?, ?)", (result_id, blob, ahora + ttl))
+            conn.execute(
+                "DELETE FROM results WHERE result_id IN "
+                "(SELECT result_id FROM results ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                (self.max_results,),
+            )
+
+    def get_result(self, result_id: str) -> Optional[Any]:
+        with self._lock:
+            fila = self._conn.execute("SELECT data, expires FROM results WHERE result_id = ?", (result_id,)).fetchone()
+        if fila is None or fila[1] <= time.time():
+            return None
+        return pickle.loads(fila[0])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (sesiones,) = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            (resultados,) = self._conn.execute("SELECT COUNT(*) FROM results WHERE expires > ?", (time.time(),)).fetchone()
+            return {"sessions": sesiones, "results": resultados, "evictions": self._evictions}
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception as e:
+                Logger.warning("[SQLiteSessionStore] No se pudo cerrar %s: %s", self.path, e)
+
+
+def create_session_store(backend: str = "memory", path: str = "data/sessions.db", max_sessions: int = 500, max_results: int = 200) -> SessionStore:
+    """
+    Crea el almacen de sesiones segun `backend`: "memory" (un solo worker) o "sqlite"
+    (varios workers sobre el mismo archivo).
+
+    Raises:
+        ValueError: si el backend no existe.
+    """
+    if backend == "memory":
+        return MemorySessionStore(max_sessions=max_sessions, max_results=max_results)
+    if backend == "sqlite":
+        return SQLiteSessionStore(path, max_sessions=max_sessions, max_results=max_results)
+    raise ValueError(f"[Error.create_session_store] Backend invalido: {backend} (memory | sqlite)")
@@ -1,37 +1,87 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-import pyodbc
-import pandas as pd
 import warnings
-import urllib
-from typing import Literal, Tuple, List, Dict, Optional, Generator
-from sqlalchemy import create_engine
-from core.config import SERVER_SQL, DATABASE, USER, PASSWORD
+import asyncio
+import itertools
+import time
+import urllib.parse
+from typing import TYPE_CHECKING, Literal, Tuple, List, Dict, Optional, Generator, AsyncGenerator, Callable
+from core.config import (
+    SERVER_SQL, 
+    DATABASE, 
+    USER, 
+    PASSWORD, 
+    SQL_POOL_MIN_SIZE, 
+    SQL_POOL_MAX_SIZE, 
+    SQL_POOL_TIMEOUT, 
+    SQL_POOL_PING_AFTER, 
+    SQL_FETCH_BATCH_SIZE
+)
+from services.connection_pool import ConnectionPool, get_pool
+from services.sql_executor import CancelToken, SQLExecutor, get_executor
+from services.result_cache import ResultCache
+from services.columnar import ColumnarResult
+from services.history_writer import HistoryWriter
+from services.analytic_mirror import AnalyticMirror
+from utils.sql_text import is_ddl, is_write, referenced_tables
 from services.logger import Logger
 from utils.print_colors import Ppp
 
+if TYPE_CHECKING:
+    # pandas y SQLAlchemy solo se usan en los metodos que devuelven DataFrames; se importan ahi
+    import pandas as pd
+
 # Ignorar advertencias innecesarias de pandas
 warnings.filterwarnings("ignore", category=UserWarning)
 
 class ConsultadorSQL: 
     """
     Clase para manejar y ejecutar sentencias de SQL en nuestro servidor de SQL Server. 
+    Las conexiones se toman prestadas de un pool compartido por todo el proceso.
 
     """
 
-    def __init__(self, auth: Literal['local', 'prod'], tabla_historial: str = "Historial_Chat"): 
+    def __init__(
+        self, 
+        auth: Literal['local', 'prod'], 
+        tabla_historial: str = "Historial_Chat", 
+        pool: Optional[ConnectionPool] = None, 
+        executor: Optional[SQLExecutor] = None, 
+        result_cache: Optional[ResultCache] = None, 
+        history_writer: Optional[HistoryWriter] = None, 
+        mirror: Optional[AnalyticMirror] = None
+    ): 
         """ 
         Inicializa la con la cadena de conexión adecuada. 
 
         Args: 
             auth (Literal['local', 'prod']): tipo de conexión, local o productivo. 
+            tabla_historial (str): tabla donde se guarda el historial del chat.
+            pool (ConnectionPool | None): pool a usar; por defecto el pool compartido del proceso para `auth`.
+                Permite inyectar un pool sobre sqlite3 para pruebas locales.
+            executor (SQLExecutor | None): ejecutor de hilos para los metodos async; por defecto el del proceso.
+            result_cache (ResultCache | None): cache de resultados; sin cache si no se indica.
+            history_writer (HistoryWriter | None): cola write-behind del historial; sin ella 
+                `ainsert_row_historial` escribe de forma sincrona.
+            mirror (AnalyticMirror | None): espejo local; las lecturas que se pueden traducir 
+                se resuelven ahi en lugar de SQL Server.
         """
         self.auth = auth
-        self.connection = self._get_connection()
-        if not self.connection: 
-            raise ValueError("[Error.ConsutadorSQL] Error al incializar ConsultadorSQL")
         self.tabla_historial = tabla_historial
+        self.pool = pool or get_pool(
+            f"sql:{auth}", 
+            self._get_connection, 
+            min_size=SQL_POOL_MIN_SIZE, 
+            max_size=SQL_POOL_MAX_SIZE, 
+            timeout=SQL_POOL_TIMEOUT, 
+            ping_after=SQL_POOL_PING_AFTER
+        )
+        self.executor = executor or get_executor()
+        self.result_cache = result_cache
+        self.history_writer = history_writer
+        self.mirror = mirror
+        self._table_listeners: List[Callable[[List[str], bool], None]] = []
 
     def _get_conn_str(self) -> tuple[str |None,  str | None]:
         """
@@ -68,10 +118,11 @@ class ConsultadorSQL:
     def _get_connection(self) : 
         """
         Establece una conexión a la base de datos y devuelve el objeto de conexión.
-        Raises:
-            ValueError: Si no se puede establecer la conexión.
+        Es la fabrica de conexiones del pool; devuelve None si no se puede conectar.
         """
+        import pyodbc  # solo se requiere el driver cuando se abre una conexion real
 
+        sv = SERVER_SQL
         try: 
             # Obtener la cadena de conexion, y el nombre del servidor
             conn_str, sv = self._get_conn_str()
@@ -88,45 +139,167 @@ class ConsultadorSQL:
             return None 
 
     
-    def execute_sql(self, query):
+    def execute_sql(self, query, token: Optional[CancelToken] = None, max_rows: Optional[int] = None):
         """ 
         Ejecuta una consulta SQL y devuelve los resultados.
 
         Args: 
             query (str): sentencia SQL.
+            token (CancelToken | None): permite cancelar la sentencia desde otro hilo.
+            max_rows (int | None): filas maximas a leer; las demas no se traen del servidor.
         Returns: 
             dict: {"columns": [...], "rows": [[...], [...]]}
 
         Raises:
             RuntimeError: Si ocurre un error al ejecutar la consulta.  
         """
-        if not self.connection:
-            raise ValueError("[Error.ConsultadorSQL.execute_sql] No hay conexión establecida.")
-
+        escritura = is_write(query)
+        # Un resultado leido con tope no debe servirse a la misma consulta sin tope
+        clave = query if max_rows is None else f"{query}\n-- max_rows={max_rows}"
+        if self.result_cache is not None and not escritura: 
+            cached = self.result_cache.get(clave)
+            if cached is not None: 
+                return cached
 
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(query)
-            columns = [column[0] for column in cursor.description]
-            rows = cursor.fetchall()
+            # Se lee por lotes y cada lote se convierte a listas al vuelo: solo existe 
+            # una copia completa de las filas (las Row de pyodbc se liberan por lote)
+            rows = []
+            for columns, batch in self.iter_batches(query, token=token, max_rows=max_rows): 
+                rows.extend(batch)
+
+            Logger.info("Consulta realizada de forma exitosa (%d filas): %s", len(rows), query, event="sql.ok")
+            result = {"columns": columns, "rows": rows}
+            if self.result_cache is not None and not escritura: 
+                self.result_cache.put(clave, result)
+            return result
 
+        except Exception as e:
+            Logger.error("[Error.ConsultadorSQL.execute_sql] Error al ejecutar la consulta: %s", e, event="sql.error")
+            return "Error"
 
-            # Validación: cada fila debe tener len() igual a columnas
-            for row in rows:
-                if len(row) != len(columns):
-                    msg= f"[Error] Fila con {len(row)} valores pero se esperaban {len(columns)} columnas"
-                    Logger.error(msg)
-                    raise ValueError(msg)
+    def iter_batches(
+        self, 
+        query: str, 
+        batch_size: Optional[int] = None, 
+        token: Optional[CancelToken] = None, 
+        max_rows: Optional[int] = None
+    ) -> Generator[Tuple[List[str], List[list]], None, None]:
+        """
+        Ejecuta una consulta y entrega las filas por lotes con `fetchmany`, sin materializar 
+        el resultado completo. La conexion queda prestada hasta agotar o cerrar el generador.
 
-            msg = f"Consulta realizada de forma exitosa: {query}"
-            Logger.info(msg)
-            # <-- AQUI el fix: asegúrate de convertir cada fila a lista
-            return {"columns": columns, "rows": [list(row) for row in rows]}
+        Args: 
+            query (str): sentencia SQL.
+            batch_size (int | None): filas por lote; por defecto SQL_FETCH_BATCH_SIZE.
+            token (CancelToken | None): permite cancelar la sentencia desde otro hilo.
+            max_rows (int | None): filas maximas a leer en total.
+        Yields: 
+            tuple: (columns, rows) donde rows es una lista de hasta `batch_size` filas (listas).
+                Siempre se entrega al menos un lote, aunque sea vacio, para conocer las columnas.
+        Raises: 
+            Exception: los errores del driver se propagan al consumidor.
+        """
+        for description, batch in self._iter_raw_batches(query, batch_size=batch_size, token=token, max_rows=max_rows): 
+            yield [column[0] for column in description], [list(row) for row in batch]
 
-        except Exception as e:
-            msg = f"Error al ejecutar la consulta: {e}"
-            Logger.info(msg)
-            return "Error"
+    def _iter_raw_batches(
+        self, 
+        query: str, 
+        batch_size: Optional[int] = None, 
+        token: Optional[CancelToken] = None, 
+        max_rows: Optional[int] = None
+    ) -> Generator[Tuple[tuple, list], None, None]:
+        """
+        Igual que `iter_batches` pero entrega `cursor.description` y las filas tal como 
+        las devuelve el driver (sin convertir a listas). Con espejo, las lecturas que se 
+        pueden traducir se ejecutan en el; si fallan ahi se reintentan en SQL Server.
+        """
+        batch_size = batch_size or SQL_FETCH_BATCH_SIZE
+        local = self.mirror.translate(query) if self.mirror is not None else None
+        if local is not None: 
+            with self.mirror.pool.connection() as connection:
+                cursor = connection.cursor()
+                try: 
+                    if token is not None:
+                        token.bind(cursor)
+                    try: 
+                        cursor.execute(local)
+                    except Exception as e: 
+                        if token is not None and token.cancelled: 
+                            raise
+                        self.mirror.fallback(query, e)
+                    else: 
+                        yield from self._fetch_batches(cursor, batch_size, max_rows)
+                        return
+                finally: 
+                    cursor.close()
+
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try: 
+                if token is not None:
+                    token.bind(cursor)
+                cursor.execute(query)
+                if is_write(query): 
+                    self._invalidate_tables(referenced_tables(query), ddl=is_ddl(query))
+                yield from self._fetch_batches(cursor, batch_size, max_rows)
+            finally: 
+                cursor.close()
+
+    @staticmethod
+    def _fetch_batches(cursor, batch_size: int, max_rows: Optional[int]) -> Generator[Tuple[tuple, list], None, None]: 
+        """
+        Lee con `fetchmany` las filas de una sentencia ya ejecutada, hasta `max_rows` si se indica.
+        Siempre entrega al menos un lote, aunque sea vacio, para conocer las columnas.
+        """
+        description = cursor.description
+        entregado = False
+        restantes = max_rows
+        while restantes is None or restantes > 0: 
+            batch = cursor.fetchmany(batch_size if restantes is None else min(batch_size, restantes))
+            if not batch: 
+                break
+            entregado = True
+            if restantes is not None: 
+                restantes -= len(batch)
+            yield description, batch
+        if restantes == 0 and hasattr(cursor, "cancel"): 
+            # Se alcanzo el tope: el servidor deja de producir las filas restantes
+            cursor.cancel()
+        if not entregado: 
+            yield description, []
+
+    def execute_columnar(
+        self, 
+        query: str, 
+        batch_size: Optional[int] = None, 
+        token: Optional[CancelToken] = None
+    ) -> ColumnarResult:
+        """
+        Ejecuta una consulta y construye un ColumnarResult en una sola pasada sobre los lotes 
+        de `fetchmany`: arreglos NumPy para numeros y fechas, texto codificado por diccionario. 
+        Util para reportes anchos/grandes que terminan en un DataFrame o un grafico.
+
+        Raises: 
+            Exception: los errores del driver se propagan.
+        """
+        description = None
+
+        def lotes(): 
+            nonlocal description
+            for description, batch in self._iter_raw_batches(query, batch_size=batch_size, token=token): 
+                yield batch
+
+        batches = lotes()
+        primero = next(batches)
+        result = ColumnarResult.from_batches(
+            [column[0] for column in description], 
+            itertools.chain([primero], batches), 
+            type_codes=[column[1] for column in description]
+        )
+        Logger.info("Consulta columnar realizada de forma exitosa: %s", query, event="sql.ok")
+        return result
 
     def insert_row_historial(self,  data: Dict[str, str]) -> bool:
         """
@@ -139,61 +312,252 @@ class ConsultadorSQL:
         Returns:
             bool: True si la inserción fue exitosa, False en caso contrario.
         """
-        if not self.connection:
-            raise ValueError("[Error.ConsultadorSQL.insert_row_historial] No hay conexión establecida.")
-
         try:
-            cursor = self.connection.cursor()
-            columns = ', '.join(data.keys())
-            placeholders = ', '.join(['?'] * len(data))
-            query = f"INSERT INTO {self.tabla_historial} ({columns}) VALUES ({placeholders})"
-            cursor.execute(query, tuple(data.values()))
-            self.connection.commit()
-            Logger.info(f"[SQL] Fila insertada en {self.tabla_historial}: {data}")
+            self._insert_rows(self.tabla_historial, [data])
+            Logger.info("[SQL] Fila insertada en %s", self.tabla_historial, event="history.insert")
             return True
         except Exception as e:
             Logger.error(f"[Error.ConsultadorSQL.insert_row_historial] {e}")
             return False
+
+    def insert_rows_historial(self, rows: List[Dict[str, str]]) -> bool:
+        """
+        Inserta un lote de filas en la tabla de historial con `executemany` y un solo commit. 
+        Es el `sink` del HistoryWriter: los errores se propagan para que el escritor reintente.
+
+        Args:
+            rows (List[Dict[str, str]]): filas a insertar.
+
+        Returns:
+            bool: True si el lote se inserto.
+        """
+        self._insert_rows(self.tabla_historial, rows)
+        Logger.info("[SQL] %d filas insertadas en %s", len(rows), self.tabla_historial, event="history.insert")
+        return True
+
+    def _insert_rows(self, tabla: str, rows: List[Dict[str, str]]) -> None: 
+        """
+        Agrupa las filas por columnas y las inserta con `executemany` (fast_executemany en pyodbc).
+        """
+        grupos: Dict[tuple, list] = {}
+        for row in rows: 
+            grupos.setdefault(tuple(row.keys()), []).append(tuple(row.values()))
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try: 
+                if hasattr(cursor, "fast_executemany"): 
+                    cursor.fast_executemany = True
+                for columns, valores in grupos.items(): 
+                    placeholders = ', '.join(['?'] * len(columns))
+                    query = f"INSERT INTO {tabla} ({', '.join(columns)}) VALUES ({placeholders})"
+                    cursor.executemany(query, valores)
+                connection.commit()
+            finally: 
+                cursor.close()
+        self._invalidate_tables([tabla])
         
-    def get_historial_by_session_id(self, id_session: str) -> List[Dict[str, str]]:
+    def get_historial_by_session_id(self, id_session: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
         """
         Obtiene el historial de chat por ID de sesión.
 
         Args:
             id_session (str): ID de la sesión.
+            limit (int | None): si se indica, solo los `limit` turnos mas recientes (por la columna [date]).
 
         Returns:
-            List[Dict[str, str]]: Lista de diccionarios con el historial.
+            List[Dict[str, str]]: Lista de diccionarios con el historial, del mas antiguo al mas reciente.
+        """
+        if limit is None: 
+            query, params = f"SELECT * FROM {self.tabla_historial} WHERE session_id = ?", (id_session,)
+        else: 
+            query = f"SELECT TOP (?) * FROM {self.tabla_historial} WHERE session_id = ? ORDER BY [date] DESC"
+            params = (int(limit), id_session)
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        if limit is not None: 
+            rows = rows[::-1]
+        historial = [dict(zip(columns, row)) for row in rows]
+        if self.history_writer is not None: 
+            # Filas aun en la cola write-behind: la sesion debe ver sus propias escrituras
+            historial.extend(self.history_writer.pending(id_session))
+        return historial
+
+    def fetch_all(self, query: str, params: tuple = ()) -> Tuple[List[str], List[tuple]]:
+        """
+        Ejecuta una consulta parametrizada de lectura sin pasar por el cache de resultados 
+        (p.ej. consultas de metadatos del catalogo de esquema).
+
+        Returns:
+            (columnas, filas)
+        """
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try: 
+                cursor.execute(query, params)
+                columns = [column[0] for column in cursor.description]
+                return columns, cursor.fetchall()
+            finally: 
+                cursor.close()
+
+    def add_table_listener(self, listener: Callable[[List[str], bool], None]) -> None: 
+        """
+        Registra una funcion que se llama con los nombres de tabla modificados por una escritura 
+        ejecutada a traves de este consultador y si la sentencia fue DDL.
+        """
+        self._table_listeners.append(listener)
+
+    def _invalidate_tables(self, tables, ddl: bool = False) -> None: 
+        """
+        Expulsa del cache de resultados las consultas que dependen de `tables` y avisa a los listeners.
+        """
+        tables = list(tables)
+        if self.result_cache is not None: 
+            for table in tables: 
+                self.result_cache.invalidate_table(table)
+        for listener in self._table_listeners: 
+            try: 
+                listener(tables, ddl)
+            except Exception as e: 
+                Logger.warning(f"[ConsultadorSQL] Fallo un listener de tablas: {e}")
+
+    # ------------------------------------------------------------------ #
+    # Fachada async: las llamadas bloqueantes corren en el ejecutor SQL
+    # ------------------------------------------------------------------ #
+    async def aexecute_sql(self, query: str, timeout: Optional[float] = None, max_rows: Optional[int] = None):
+        """
+        Version async de `execute_sql`. Si vence el timeout o se cancela la peticion,
+        se cancela tambien la sentencia en el servidor.
+
+        Raises:
+            TimeoutError: si la consulta excede el timeout.
         """
-        if not self.connection:
-            raise ValueError("[Error.ConsultadorSQL.get_historial_by_session_id] No hay conexión establecida.")
+        return await self.executor.run(self.execute_sql, query, timeout=timeout, token=CancelToken(), max_rows=max_rows)
 
-        query = f"SELECT * FROM {self.tabla_historial} WHERE session_id = ?"
-        cursor = self.connection.cursor()
-        cursor.execute(query, (id_session,))
-        columns = [column[0] for column in cursor.description]
-        rows = cursor.fetchall()
-        return [dict(zip(columns, row)) for row in rows]
+    async def aexecute_many(
+        self, 
+        consultas: List[Tuple[str, Optional[float], Optional[int]]], 
+        concurrency: int = 4
+    ) -> List[object]:
+        """
+        Ejecuta varias sentencias independientes en paralelo, cada una con su propia conexion 
+        del pool, con a lo mas `concurrency` en vuelo para esta peticion. El tiempo total es el 
+        de la mas lenta en lugar de la suma.
+
+        Args: 
+            consultas (list): tuplas (sql, timeout, max_rows), como en `aexecute_sql`.
+            concurrency (int): sentencias de esta llamada que se ejecutan a la vez.
+        Returns: 
+            list: un resultado por consulta, en el mismo orden. Si una falla (o vence su 
+                timeout) queda la excepcion en su lugar y las demas siguen.
+        """
+        limite = asyncio.Semaphore(max(1, concurrency))
+
+        async def una(query: str, timeout: Optional[float], max_rows: Optional[int]):
+            async with limite:
+                return await self.aexecute_sql(query, timeout=timeout, max_rows=max_rows)
+
+        return await asyncio.gather(*(una(*consulta) for consulta in consultas), return_exceptions=True)
+
+    async def aiter_batches(
+        self, 
+        query: str, 
+        batch_size: Optional[int] = None, 
+        max_rows: Optional[int] = None, 
+        timeout: Optional[float] = None
+    ) -> AsyncGenerator[Tuple[List[str], List[list]], None]:
+        """
+        Version async de `iter_batches`: cada `fetchmany` corre en el ejecutor SQL, 
+        por lo que el event loop queda libre mientras llegan los lotes.
+
+        Args: 
+            timeout (float | None): segundos maximos para toda la lectura (no por lote); 
+                al vencer se cancela la sentencia en el servidor. Sin el, cada lote usa 
+                el timeout por defecto del ejecutor.
+        Raises: 
+            TimeoutError: si la lectura excede el timeout.
+        """
+        token = CancelToken()
+        batches = self.iter_batches(query, batch_size=batch_size, token=token, max_rows=max_rows)
+        limite = time.monotonic() + timeout if timeout is not None else None
+        try: 
+            while True: 
+                restante = None if limite is None else limite - time.monotonic()
+                try: 
+                    if restante is not None and restante <= 0: 
+                        raise TimeoutError(f"[Error.ConsultadorSQL.aiter_batches] La consulta excedio el tiempo limite de {timeout}s")
+                    item = await self.executor.run(next, batches, None, timeout=restante)
+                except TimeoutError: 
+                    token.cancel()
+                    raise
+                if item is None: 
+                    break
+                yield item
+        finally: 
+            try: 
+                await self.executor.run(batches.close)
+            except ValueError: 
+                pass  # el lote en curso se cancelo; el generador libera la conexion al terminar
+
+    async def afetch_all(self, query: str, params: tuple = (), timeout: Optional[float] = None) -> Tuple[List[str], List[tuple]]:
+        """
+        Version async de `fetch_all`.
+        """
+        return await self.executor.run(self.fetch_all, query, params, timeout=timeout)
+
+    async def aexecute_columnar(self, query: str, timeout: Optional[float] = None) -> ColumnarResult:
+        """
+        Version async de `execute_columnar`.
+        """
+        return await self.executor.run(self.execute_columnar, query, timeout=timeout, token=CancelToken())
+
+    async def ainsert_row_historial(self, data: Dict[str, str], timeout: Optional[float] = None) -> bool:
+        """
+        Version async de `insert_row_historial`. Con HistoryWriter solo encola la fila 
+        (la escritura ocurre en segundo plano); con la politica "block" la espera por 
+        contrapresion corre en un hilo para no bloquear el event loop.
+        """
+        if self.history_writer is not None: 
+            if self.history_writer.policy == "block": 
+                return await asyncio.to_thread(self.history_writer.submit, data)
+            return self.history_writer.submit(data)
+        return await self.executor.run(self.insert_row_historial, data, timeout=timeout)
+
+    async def aget_historial_by_session_id(
+        self, 
+        id_session: str, 
+        limit: Optional[int] = None, 
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Version async de `get_historial_by_session_id`.
+        """
+        return await self.executor.run(self.get_historial_by_session_id, id_session, limit, timeout=timeout)
 
     def _get_chunks(
         self,
         query: str, 
+        connection, 
         chunk_size: int = 1000
-    ) -> pd.io.parsers.TextFileReader | None:
+    ) -> "pd.io.parsers.TextFileReader | None":
         """
         Devuelve los datos en chunks para evitar consumir demasiada memoria.
+        La conexion debe seguir prestada mientras se consumen los chunks.
         """
+        import pandas as pd
         try:
-            chunks = pd.read_sql(query, self.connection, chunksize=chunk_size)
+            chunks = pd.read_sql(query, connection, chunksize=chunk_size)
             return chunks  
-        except pyodbc.Error as e:
+        except Exception as e:
             print(f"Error al ejecutar el query: {e}")
             return None
     
     def create_df_from_table(
         self,
         query: str, 
-    ) -> pd.DataFrame: 
+    ) -> "pd.DataFrame": 
 
         """
         La funcion creara una tabla a partir de una consulta que se ejecute segun el metodo. 
@@ -211,26 +575,28 @@ class ConsultadorSQL:
                 msg = "No ha ejecutado la consulta de forma adecuada"
                 raise ValueError(msg)
                 
-        if self.connection: 
-            try: 
-                chunks = self._get_chunks(query=query, chunk_size=1000)
+        import pandas as pd
+        try: 
+            with self.pool.connection() as connection: 
+                chunks = self._get_chunks(query=query, connection=connection, chunk_size=1000)
                 if chunks: 
                     dframes = [chunk for chunk in chunks]
                     df_unido = pd.concat(dframes)
                     return df_unido
-                
-            except Exception as e: 
-                msg = f"[Error.ConsultadorSQL.create_df_from_table] Error al crear la tabla: {e}"
-                Ppp.p(msg, color="Red")
-                Logger.error(msg)
-        else: 
-            return None
+            
+        except Exception as e: 
+            msg = f"[Error.ConsultadorSQL.create_df_from_table] Error al crear la tabla: {e}"
+            Ppp.p(msg, color="Red")
+            Logger.error(msg)
+        return None
 
     # Obsoleta al menos localmente 
     def create_df_from_query(self, query: str):
         """
         Ejecuta una consulta SQL sobre la tabla DM_Produccion y muestra el resultado en un DataFrame.
         """
+        import pandas as pd
+        from sqlalchemy import create_engine
     
         try:
             params = urllib.parse.quote_plus(self._get_conn_str()).encode()
@@ -0,0 +1,147 @@
+"""
+El modulo denota un ejecutor acotado de hilos para correr las llamadas bloqueantes de
+pyodbc fuera del event loop de FastAPI, con timeout y cancelacion por consulta.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from core.config import SQL_EXECUTOR_MAX_WORKERS, SQL_QUERY_TIMEOUT
+from services.logger import Logger
+
+
+class CancelToken:
+    """
+    Permite cancelar desde otro hilo la sentencia que esta corriendo en un cursor.
+    La funcion bloqueante registra su cursor con `bind` y el ejecutor llama `cancel`
+    cuando vence el timeout o se cancela la peticion.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cursor = None
+        self.cancelled = False
+
+    def bind(self, cursor: Any) -> None:
+        """
+        Registra el cursor activo. Si ya se pidio la cancelacion, se cancela de inmediato.
+        """
+        with self._lock:
+            self._cursor = cursor
+            cancelled = self.cancelled
+        if cancelled:
+            self._cancel_cursor(cursor)
+
+    def cancel(self) -> None:
+        """
+        Marca el token como cancelado y cancela la sentencia en curso, si la hay.
+        """
+        with self._lock:
+            self.cancelled = True
+            cursor = self._cursor
+        if cursor is not None:
+            self._cancel_cursor(cursor)
+
+    @staticmethod
+    def _cancel_cursor(cursor: Any) -> None:
+        try:
+            # pyodbc expone Cursor.cancel() (SQLCancel); sqlite3 no, se usa interrupt()
+            if hasattr(cursor, "cancel"):
+                cursor.cancel()
+            elif hasattr(cursor, "connection"):
+                cursor.connection.interrupt()
+        except Exception as e:
+            Logger.warning(f"[CancelToken] No se pudo cancelar la sentencia: {e}")
+
+
+class SQLExecutor:
+    """
+    Ejecutor de hilos de tamaño limitado y dedicado a la base de datos.
+    Uso:
+        executor = SQLExecutor(max_workers=8)
+        result = await executor.run(consultador.execute_sql, query, timeout=30)
+    """
+
+    def __init__(self, max_workers: int = 8, default_timeout: Optional[float] = None):
+        """
+        Args:
+            max_workers (int): consultas simultaneas como maximo.
+            default_timeout (float | None): timeout en segundos por consulta cuando no se indica otro.
+        """
+        if max_workers < 1:
+            raise ValueError(f"[Error.SQLExecutor] max_workers debe ser >= 1, se recibio {max_workers}")
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sql")
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        token: Optional[CancelToken] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Ejecuta `fn(*args, **kwargs)` en el pool de hilos y espera el resultado.
+
+        Args:
+            fn (Callable): funcion bloqueante a ejecutar.
+            timeout (float | None): segundos maximos de espera; por defecto `default_timeout`.
+            token (CancelToken | None): si se indica, se pasa a `fn` como `token=` y se cancela
+                al vencer el timeout o al cancelarse la corrutina.
+        Raises:
+            TimeoutError: si la consulta excede el timeout.
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        if token is not None:
+            kwargs["token"] = token
+        loop = asyncio.get_running_loop()
+        # Igual que asyncio.to_thread: el hilo ve el contexto de la peticion (request_id, etapas)
+        contexto = contextvars.copy_context()
+        future = loop.run_in_executor(self._pool, functools.partial(contexto.run, fn, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            if token is not None:
+                token.cancel()
+            raise TimeoutError(f"[Error.SQLExecutor] La consulta excedio el tiempo limite de {timeout}s")
+        except asyncio.CancelledError:
+            if token is not None:
+                token.cancel()
+            raise
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Detiene el pool de hilos; con `wait=True` espera a que terminen las consultas en curso.
+        """
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+# Ejecutor compartido por todo el proceso
+_executor: Optional[SQLExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> SQLExecutor:
+    """
+    Devuelve el ejecutor SQL del proceso, creandolo la primera vez segun la configuracion.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = SQLExecutor(max_workers=SQL_EXECUTOR_MAX_WORKERS, default_timeout=SQL_QUERY_TIMEOUT)
+        return _executor
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """
+    Detiene el ejecutor SQL del proceso, si existe.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
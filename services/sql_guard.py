@@ -0,0 +1,225 @@
+"""
+El modulo implementa la guardia que revisa la sentencia generada por el LLM antes de
+ejecutarla: solo deja pasar un SELECT (sin escrituras ni llamadas a procedimientos),
+inyecta o reduce el TOP para acotar las filas y fija el timeout de la consulta.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from core.config import DASHBOARD_MAX_QUERIES, SQL_GUARD_ENABLED, SQL_GUARD_MAX_ROWS, SQL_GUARD_TIMEOUT
+from services.logger import Logger
+from services.metrics import REGISTRY
+from utils.sql_text import is_select, mask_literals, paren_depths, split_statements, strip_comments
+
+
+GUARD_DECISIONS = REGISTRY.counter("sql_guard_decisions_total", "Decisiones de la guardia SQL.", ["action"])
+GUARD_TRUNCATED = REGISTRY.counter("sql_guard_truncated_total", "Resultados recortados por el tope de filas.")
+
+# Primeras palabras de una sentencia T-SQL; si la respuesta empieza con otra cosa es texto
+_SQL_KEYWORDS = {
+    "SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "MERGE", "TRUNCATE", "DROP", "ALTER",
+    "CREATE", "EXEC", "EXECUTE", "DECLARE", "SET", "USE", "GRANT", "REVOKE", "DENY", "BACKUP",
+    "RESTORE", "SHUTDOWN", "DBCC", "BULK", "KILL", "BEGIN", "COMMIT", "ROLLBACK", "WAITFOR",
+}
+_PRIMERA_PALABRA = re.compile(r"^\s*\(?\s*([A-Za-z_]+)")
+_FENCE = re.compile(r"^\s*```[\w-]*\s*\n(.*?)\n?\s*```\s*$", re.DOTALL)
+# Prohibido en cualquier parte de la consulta (fuera de literales)
+_PROHIBIDO = re.compile(
+    r"\b(INTO|INSERT|UPDATE|DELETE|MERGE|TRUNCATE|DROP|ALTER|CREATE|GRANT|REVOKE|EXEC|EXECUTE|"
+    r"OPENROWSET|OPENDATASOURCE|OPENQUERY|OPENXML|WAITFOR|SHUTDOWN|DBCC|XP_\w+|SP_EXECUTESQL|SP_OA\w*)\b",
+    re.IGNORECASE,
+)
+_SELECT = re.compile(r"\bSELECT\b", re.IGNORECASE)
+_SET_OP = re.compile(r"\b(UNION|EXCEPT|INTERSECT)\b", re.IGNORECASE)
+# SQL Server no admite TOP junto con OFFSET ... FETCH (Msg 10741)
+_OFFSET = re.compile(r"\bOFFSET\b", re.IGNORECASE)
+_PARENTESIS = re.compile(r"^[\s(]+")
+_MODIFICADOR = re.compile(r"\s*(?:(?:ALL|DISTINCT)\b\s*)?", re.IGNORECASE)
+_TOP = re.compile(r"TOP\b\s*(?:\(\s*(\d+)\s*\)|(\d+))?", re.IGNORECASE)
+_PERCENT = re.compile(r"\s*PERCENT\b", re.IGNORECASE)
+# Titulo de una consulta del tablero: comentario `-- ...` al inicio de la sentencia
+_TITULO = re.compile(r"^\s*--\s*(.+?)\s*$", re.MULTILINE)
+
+
+class GuardDecision:
+    """
+    Resultado de revisar una respuesta del LLM.
+
+    action:
+        - "allow":    se ejecuta `sql` tal cual.
+        - "limited":  se ejecuta `sql` con el TOP inyectado/reducido; se leen a lo mas
+                      `fetch_rows` filas para saber si el resultado se recorto.
+        - "text":     la respuesta no es SQL; se muestra como texto sin ejecutarla.
+        - "rejected": la sentencia no esta permitida (`reason` explica por que).
+    """
+
+    __slots__ = ("action", "sql", "original", "reason", "max_rows", "timeout")
+
+    def __init__(self, action: str, sql: str, original: str, reason: Optional[str] = None, max_rows: Optional[int] = None, timeout: Optional[float] = None):
+        self.action = action
+        self.sql = sql
+        self.original = original
+        self.reason = reason
+        self.max_rows = max_rows
+        self.timeout = timeout
+
+    @property
+    def executable(self) -> bool:
+        return self.action in ("allow", "limited")
+
+    @property
+    def fetch_rows(self) -> Optional[int]:
+        """
+        Filas a leer como maximo: una mas que el tope para detectar el recorte.
+        """
+        return self.max_rows + 1 if self.action == "limited" else None
+
+    def notice(self, truncated: bool = False) -> Optional[str]:
+        """
+        Aviso para el usuario, o None si no hay nada que reportar.
+        """
+        if self.action == "rejected":
+            return f"Consulta bloqueada: {self.reason}."
+        if truncated:
+            return f"Se muestran las primeras {self.max_rows} filas: la consulta se limito automaticamente."
+        return None
+
+    def to_dict(self, truncated: bool = False) -> Dict[str, Any]:
+        return {
+            "action": self.action,
+            "reason": self.reason,
+            "sql": self.sql,
+            "max_rows": self.max_rows,
+            "truncated": truncated,
+            "notice": self.notice(truncated),
+        }
+
+
+class SQLGuard:
+    """
+    Revisa y acota las sentencias generadas por el LLM.
+
+    Uso:
+        decision = guard.check(respuesta_llm)
+        if decision.executable:
+            result = await consultador.aexecute_sql(decision.sql, timeout=decision.timeout, max_rows=decision.fetch_rows)
+            result, truncated = guard.truncate(result, decision)
+    """
+
+    def __init__(self, max_rows: int = SQL_GUARD_MAX_ROWS, timeout: Optional[float] = SQL_GUARD_TIMEOUT, enabled: bool = SQL_GUARD_ENABLED):
+        """
+        Args:
+            max_rows (int): filas maximas que se devuelven por consulta.
+            timeout (float | None): segundos maximos por consulta; al vencer se cancela en el servidor.
+            enabled (bool): con False todo se ejecuta tal cual (comportamiento anterior).
+        """
+        if max_rows < 1:
+            raise ValueError(f"[Error.SQLGuard] max_rows debe ser >= 1, se recibio {max_rows}")
+        self.max_rows = max_rows
+        self.timeout = timeout
+        self.enabled = enabled
+
+    def check(self, text: str) -> GuardDecision:
+        """
+        Clasifica la respuesta del LLM y, si es un SELECT, devuelve la sentencia acotada.
+        """
+        decision = self._check(text)
+        GUARD_DECISIONS.inc(action=decision.action)
+        if decision.action == "rejected":
+            Logger.warning("[SQLGuard] Sentencia bloqueada (%s): %s", decision.reason, text, event="sql.guard")
+        return decision
+
+    def check_many(self, text: str, max_queries: int = DASHBOARD_MAX_QUERIES) -> List[Tuple[Optional[str], GuardDecision]]:
+        """
+        Variante de `check` para el modo tablero: la respuesta puede traer varias consultas
+        independientes separadas por ';', cada una con un comentario `-- titulo` opcional.
+        Cada sentencia se revisa por separado (una bloqueada no impide ejecutar las demas).
+
+        Returns:
+            list: (titulo | None, decision) por sentencia. Con una sola sentencia, o si la
+            respuesta no es SQL, devuelve un solo elemento igual a `check(text)`.
+        """
+        fence = _FENCE.match(text or "")
+        cuerpo = fence.group(1) if fence else (text or "")
+        partes = [p for p in split_statements(cuerpo) if strip_comments(p).strip()]
+        palabra = _PRIMERA_PALABRA.match(strip_comments(cuerpo).strip())
+        if len(partes) <= 1 or not palabra or palabra.group(1).upper() not in _SQL_KEYWORDS:
+            # Una sola consulta, o texto que no es SQL aunque tenga ';'
+            return [(self._titulo(partes[0]) if partes else None, self.check(text))]
+        if len(partes) > max_queries:
+            decision = self._rechazo(text, f"el tablero admite a lo mas {max_queries} consultas, se recibieron {len(partes)}")
+            GUARD_DECISIONS.inc(action=decision.action)
+            return [(None, decision)]
+        return [(self._titulo(parte), self.check(parte)) for parte in partes]
+
+    def truncate(self, result: Any, decision: GuardDecision) -> Tuple[Any, bool]:
+        """
+        Recorta `result` ({"columns", "rows"}) al tope de filas. Devuelve (resultado, recortado);
+        el resultado recortado lleva "truncated": True.
+        """
+        if decision.action != "limited" or not isinstance(result, dict):
+            return result, False
+        rows = result.get("rows") or []
+        if len(rows) <= decision.max_rows:
+            return result, False
+        GUARD_TRUNCATED.inc()
+        return {**result, "rows": rows[:decision.max_rows], "truncated": True}, True
+
+    # ------------------------------------------------------------------ #
+    # Auxiliares
+    # ------------------------------------------------------------------ #
+    def _check(self, text: str) -> GuardDecision:
+        if not self.enabled:
+            return GuardDecision("allow", text, text)
+        fence = _FENCE.match(text or "")
+        limpio = strip_comments(fence.group(1) if fence else (text or "")).strip()
+        palabra = _PRIMERA_PALABRA.match(limpio)
+        if not palabra or palabra.group(1).upper() not in _SQL_KEYWORDS:
+            return GuardDecision("text", text, text)
+
+        sentencias = split_statements(limpio)
+        if len(sentencias) != 1:
+            return self._rechazo(text, "solo se permite una sentencia por consulta")
+        sentencia = sentencias[0]
+        # `(SELECT ...) UNION (SELECT ...)` empieza con parentesis
+        if not is_select(_PARENTESIS.sub("", sentencia)):
+            return self._rechazo(text, "solo se permiten consultas SELECT")
+        prohibido = _PROHIBIDO.search(mask_literals(sentencia))
+        if prohibido:
+            return self._rechazo(text, f"la consulta usa {prohibido.group(1).upper()}, que no esta permitido")
+
+        sql, limitada = self._limit(sentencia)
+        return GuardDecision("limited" if limitada else "allow", sql, text, max_rows=self.max_rows, timeout=self.timeout)
+
+    @staticmethod
+    def _titulo(sentencia: str) -> Optional[str]:
+        titulo = _TITULO.match(sentencia)
+        return titulo.group(1) if titulo else None
+
+    def _rechazo(self, text: str, motivo: str) -> GuardDecision:
+        return GuardDecision("rejected", text, text, reason=motivo, max_rows=self.max_rows, timeout=self.timeout)
+
+    def _limit(self, sentencia: str) -> Tuple[str, bool]:
+        """
+        Inyecta `TOP (max_rows + 1)` en el SELECT principal o reduce el TOP existente.
+        Devuelve (sql, limitada); limitada=False si el TOP original ya esta dentro del tope.
+        Cuando no se puede reescribir (UNION, OFFSET ... FETCH, TOP ... PERCENT o TOP con expresion)
+        la sentencia no cambia y el tope se aplica al leer las filas.
+        """
+        masked = mask_literals(sentencia)
+        niveles = paren_depths(masked)
+
+        principal = next((m for m in _SELECT.finditer(masked) if niveles[m.start()] == 0), None)
+        if principal is None or any(niveles[m.start()] == 0 for m in (*_SET_OP.finditer(masked), *_OFFSET.finditer(masked))):
+            return sentencia, True
+
+        inicio = _MODIFICADOR.match(masked, principal.end()).end()
+        top = _TOP.match(masked, inicio)
+        tope = f"TOP ({self.max_rows + 1})"
+        if top is None:
+            return f"{sentencia[:inicio]}{tope} {sentencia[inicio:]}", True
+        literal = top.group(1) or top.group(2)
+        if literal is None or _PERCENT.match(masked, top.end()):
+            return sentencia, True
+        if int(literal) <= self.max_rows:
+            return sentencia, False
+        return f"{sentencia[:top.start()]}{tope}{sentencia[top.end():]}", True
@@ -0,0 +1,218 @@
+"""
+Renderizador de tablas HTML y texto plano directamente desde columnas/filas, sin construir
+un DataFrame. Produce la misma salida que `pd.DataFrame(rows, columns=cols).to_html(index=False, border=0)`
+(incluido el formato de flotantes y fechas de pandas), pero en una sola pasada por columna.
+"""
+import datetime as dt
+import numbers
+import re
+from decimal import Decimal
+from typing import Any, Iterator, List, Optional, Sequence
+
+
+_PRECISION = 6  # equivalente a pandas display.precision
+_NUMBER_WITH_DECIMAL = re.compile(r"^\s*[\+-]?[0-9]+\.[0-9]*$")
+# Rango representable por datetime64[ns]; fuera de el pandas deja la columna como object
+_TS_MIN = dt.datetime(1677, 9, 22)
+_TS_MAX = dt.datetime(2262, 4, 11)
+
+
+# ---------------------------------------------------------------------- #
+# Formato por columna (replica las reglas de pandas.io.formats.format)
+# ---------------------------------------------------------------------- #
+def _escape(texto: str) -> str:
+    return texto.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _escape_object(texto: str) -> str:
+    texto = texto.replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return _escape(texto).strip()
+
+
+def _is_nan(v: Any) -> bool:
+    return v != v
+
+
+def _kind(values: Sequence[Any]) -> str:
+    """
+    Infiere el tipo de columna que pandas asignaria: int, float, bool, datetime u object.
+    """
+    hay_none = False
+    kinds = set()
+    for v in values:
+        t = type(v)
+        if v is None:
+            hay_none = True
+        elif t is bool:
+            kinds.add("bool")
+        elif t is int:
+            kinds.add("int")
+        elif t is float:
+            kinds.add("float")
+        elif t is dt.datetime:
+            kinds.add("datetime" if v.tzinfo is None and _TS_MIN <= v <= _TS_MAX else "object")
+        elif isinstance(v, bool):
+            kinds.add("bool")
+        elif isinstance(v, numbers.Integral):
+            kinds.add("int")
+        elif isinstance(v, numbers.Real) and not isinstance(v, Decimal):
+            kinds.add("float")
+        else:
+            kinds.add("object")
+        if "object" in kinds:
+            return "object"
+
+    if not kinds:
+        return "object"  # columna vacia o solo None
+    if kinds == {"bool"}:
+        return "object" if hay_none else "bool"
+    if kinds == {"int"}:
+        return "float" if hay_none else "int"
+    if kinds <= {"int", "float"}:
+        return "float"
+    if kinds == {"datetime"}:
+        return "datetime"
+    return "object"
+
+
+def _trim_zeros(valores: List[str]) -> List[str]:
+    """
+    Quita los ceros finales comunes a todos los numeros con punto decimal (deja al menos uno).
+    """
+    idx = [i for i, x in enumerate(valores) if _NUMBER_WITH_DECIMAL.match(x)]
+    if not idx:
+        return valores
+    quitar = min(len(valores[i]) - len(valores[i].rstrip("0")) for i in idx)
+    if quitar:
+        for i in idx:
+            valores[i] = valores[i][:-quitar]
+    for i in idx:
+        if valores[i].endswith("."):
+            valores[i] += "0"
+    return valores
+
+
+def _format_float_column(values: Sequence[Any]) -> List[str]:
+    floats = [None if v is None else float(v) for v in values]
+
+    def con_formato(spec: str) -> List[str]:
+        return _trim_zeros(["NaN" if v is None or _is_nan(v) else format(v, spec) for v in floats])
+
+    salida = con_formato(f".{_PRECISION}f")
+    absolutos = [abs(v) for v in floats if v is not None and not _is_nan(v)]
+    muy_largo = bool(salida) and max(len(x) for x in salida) > _PRECISION + 6
+    hay_grandes = any(a > 1e6 for a in absolutos)
+    hay_pequenos = any(0 < a < 10 ** (-_PRECISION) for a in absolutos)
+    if hay_pequenos or (muy_largo and hay_grandes):
+        salida = con_formato(f".{_PRECISION}e")
+    return salida
+
+
+def _format_datetime_column(values: Sequence[Any]) -> List[str]:
+    presentes = [v for v in values if v is not None]
+    if any(v.microsecond % 1000 for v in presentes):
+        fmt = "%Y-%m-%d %H:%M:%S.%f"
+    elif any(v.microsecond for v in presentes):
+        # Como pandas: si todo cae en milisegundos (p.ej. DATETIME de SQL Server) se muestran 3 digitos
+        return ["NaT" if v is None else v.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3] for v in values]
+    elif all(v.hour == v.minute == v.second == 0 for v in presentes):
+        fmt = "%Y-%m-%d"
+    else:
+        fmt = "%Y-%m-%d %H:%M:%S"
+    return ["NaT" if v is None else v.strftime(fmt) for v in values]
+
+
+def _format_object_value(v: Any) -> str:
+    if v is None:
+        return "None"
+    if isinstance(v, float) or (isinstance(v, numbers.Real) and not isinstance(v, (numbers.Integral, Decimal))):
+        if _is_nan(v):
+            return "NaN"
+        texto = f"{v: .{_PRECISION}f}".rstrip("0")
+        return (texto + "0" if texto.endswith(".") else texto).strip()
+    if isinstance(v, Decimal) and v.is_nan():
+        return "NaN"
+    return _escape_object(str(v))
+
+
+def format_column(values: Sequence[Any]) -> List[str]:
+    """
+    Devuelve los textos (ya escapados para HTML) de una columna, con el formato de pandas.
+    """
+    kind = _kind(values)
+    if kind in ("int", "bool"):
+        return [str(v) for v in values]
+    if kind == "float":
+        return _format_float_column(values)
+    if kind == "datetime":
+        return _format_datetime_column(values)
+    return [_format_object_value(v) for v in values]
+
+
+# ---------------------------------------------------------------------- #
+# Renderizado
+# ---------------------------------------------------------------------- #
+def iter_html_table(
+    columns: Sequence[Any],
+    rows: Sequence[Sequence[Any]],
+    classes: str = "dataframe",
+    max_rows: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Genera la tabla HTML por fragmentos (util para respuestas en streaming).
+
+    Args:
+        columns (list): nombres de columnas.
+        rows (list): filas (listas o tuplas) en el orden de `columns`.
+        classes (str): clases CSS extra; como en pandas, siempre se antepone "dataframe".
+        max_rows (int | None): si se indica, solo se renderizan las primeras `max_rows` filas.
+    """
+    if max_rows is not None:
+        rows = rows[:max_rows]
+    clases = "dataframe" if classes is None else f"dataframe {classes}".strip()
+
+    yield f'<table class="{clases}">\n  <thead>\n    <tr style="text-align: right;">\n'
+    yield "".join(f"      <th>{_escape_object(str(c))}</th>\n" for c in columns)
+    yield "    </tr>\n  </thead>\n  <tbody>\n"
+
+    if rows:
+        por_columna = [format_column(col) for col in zip(*rows)]
+        separador = "</td>\n      <td>"
+        bloque = []
+        for celdas in zip(*por_columna):
+            bloque.append("    <tr>\n      <td>" + separador.join(celdas) + "</td>\n    </tr>\n")
+            if len(bloque) >= 1000:
+                yield "".join(bloque)
+                bloque = []
+        if bloque:
+            yield "".join(bloque)
+
+    yield "  </tbody>\n</table>"
+
+
+def render_html_table(
+    columns: Sequence[Any],
+    rows: Sequence[Sequence[Any]],
+    classes: str = "dataframe",
+    max_rows: Optional[int] = None,
+) -> str:
+    """
+    Renderiza la tabla HTML completa. Sin truncar, la salida es identica a
+    `pd.DataFrame(rows, columns=columns).to_html(index=False, classes=classes, border=0)`.
+    """
+    return "".join(iter_html_table(columns, rows, classes=classes, max_rows=max_rows))
+
+
+def render_text_table(
+    columns: Sequence[Any],
+    rows: Sequence[Sequence[Any]],
+    max_rows: Optional[int] = None,
+) -> str:
+    """
+    Renderiza la tabla como texto plano separado por tabuladores dentro de un bloque ```.
+    """
+    if max_rows is not None:
+        rows = rows[:max_rows]
+    lines = ["\t".join(columns)]
+    lines.extend("\t".join(str(cell) for cell in row) for row in rows)
+    return "```\n" + "\n".join(lines) + "\n```"
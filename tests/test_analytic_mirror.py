@@ -0,0 +1,228 @@
+"""
+Pruebas diferenciales del espejo analitico: cada consulta se ejecuta en una base de referencia
+con la semantica de SQL Server (colacion CI_AS, LIKE, UPPER/LOWER, LEN y AVG de enteros) y,
+si `translate` la acepta, tambien en el espejo; los resultados deben ser iguales.
+"""
+import re
+import sqlite3
+
+import pytest
+
+from benchmarks.standins import tsql_a_sqlite
+from services.analytic_mirror import AnalyticMirror
+
+
+VENTAS = "[RPA].[dbo].[Ventas]"
+REGIONES = "[RPA].[dbo].[Regiones]"
+
+FILAS_VENTAS = [
+    (1, "Norte", "activo", 10.5, 3),
+    (2, "Área", "activo", 20.0, 4),
+    (3, "área", "Inactivo", 7.25, 5),
+    (4, "ÁREA", "ACTIVO", 1.0, 2),
+    (5, "area", "activo", 3.5, 7),
+    (6, "ñandú", "pendiente", 8.0, 1),
+    (7, "Ñandú", "Pendiente", 2.0, 6),
+    (8, None, "activo", 4.0, 2),
+    (9, "Sur", "inactivo", 9.75, 3),
+    (10, "Straße", "activo", 5.0, 8),
+]
+FILAS_REGIONES = [("AREA", "Centro"), ("Área", "Centro"), ("norte", "Norte"), ("ÑANDÚ", "Sur")]
+
+
+class _Avg:
+    """
+    AVG de SQL Server: el promedio de enteros es entero (truncado hacia cero).
+    """
+
+    def __init__(self):
+        self.valores = []
+
+    def step(self, valor):
+        if valor is not None:
+            self.valores.append(valor)
+
+    def finalize(self):
+        if not self.valores:
+            return None
+        promedio = sum(self.valores) / len(self.valores)
+        return int(promedio) if all(isinstance(v, int) for v in self.valores) else promedio
+
+
+def _like_sqlserver(patron, valor, escape=None):
+    if patron is None or valor is None:
+        return None
+    regex = "".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in patron)
+    return re.fullmatch(regex, valor, re.IGNORECASE | re.DOTALL) is not None
+
+
+def _ci_as(a, b):
+    # Sin distinguir mayusculas, si acentos, e ignorando los espacios finales
+    a, b = a.rstrip(" ").upper(), b.rstrip(" ").upper()
+    return (a > b) - (a < b)
+
+
+def _referencia() -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.create_collation("CI_AS", _ci_as)
+    conn.create_function("like", 2, _like_sqlserver)
+    conn.create_function("like", 3, _like_sqlserver)
+    conn.create_function("upper", 1, lambda v: None if v is None else str(v).upper())
+    conn.create_function("lower", 1, lambda v: None if v is None else str(v).lower())
+    conn.create_function("len", 1, lambda v: None if v is None else len(str(v).rstrip(" ")))
+    conn.create_aggregate("avg", 1, _Avg)
+    conn.executescript("""
+        CREATE TABLE Ventas (Id INTEGER, Region TEXT COLLATE CI_AS, Estatus TEXT COLLATE CI_AS, Monto REAL, Unidades INTEGER);
+        CREATE TABLE Regiones (Nombre TEXT COLLATE CI_AS, Zona TEXT COLLATE CI_AS);
+    """)
+    conn.executemany("INSERT INTO Ventas VALUES (?, ?, ?, ?, ?)", FILAS_VENTAS)
+    conn.executemany("INSERT INTO Regiones VALUES (?, ?)", FILAS_REGIONES)
+    return conn
+
+
+def _ejecutar(conn, sql: str) -> list:
+    cursor = conn.execute(sql)
+    try:
+        return [tuple(fila) for fila in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+class _Consultador:
+    """
+    Lo minimo de ConsultadorSQL que usa el espejo, sobre la base de referencia.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def add_table_listener(self, listener):
+        pass
+
+    def fetch_all(self, query: str, params: tuple = ()):
+        query, params = tsql_a_sqlite(query, tuple(params))
+        cursor = self.conn.execute(query, params)
+        try:
+            return [c[0] for c in cursor.description], cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+@pytest.fixture(scope="module")
+def motores(tmp_path_factory):
+    referencia = _referencia()
+    mirror = AnalyticMirror(
+        _Consultador(referencia),
+        {VENTAS: "Id:Id", REGIONES: "Nombre"},
+        path=str(tmp_path_factory.mktemp("mirror") / "mirror.db"),
+        max_lag=3600,
+    )
+    assert mirror.refresh() == 2
+    yield referencia, mirror
+    mirror.close()
+    referencia.close()
+
+
+def _en_referencia(referencia, sql: str) -> list:
+    # N'...' e ISNULL(...) no existen en SQLite; IFNULL tiene la misma semantica
+    sql = re.sub(r"\bISNULL\(", "IFNULL(", re.sub(r"\bN'", "'", sql))
+    sql, _ = tsql_a_sqlite(sql)
+    return _ejecutar(referencia, sql)
+
+
+def _en_espejo(mirror, traducida: str) -> list:
+    with mirror.pool.connection() as conn:
+        return _ejecutar(conn, traducida)
+
+
+def _normalizar(filas: list, ordenado: bool) -> list:
+    # Con GROUP BY o DISTINCT SQL Server devuelve cualquiera de las variantes de mayusculas del grupo
+    filas = [tuple(v.casefold() if isinstance(v, str) else v for v in fila) for fila in filas]
+    return filas if ordenado else sorted(filas, key=repr)
+
+
+# Consultas que el espejo debe resolver (si dejan de rutearse, la prueba lo detecta)
+EN_ESPEJO = [
+    f"SELECT COUNT(*) FROM {VENTAS} WHERE Region = 'ÁREA'",
+    f"SELECT COUNT(*) FROM {VENTAS} WHERE Region = N'ñandú'",
+    f"SELECT COUNT(*) FROM {VENTAS} WHERE Region = 'area'",
+    f"SELECT COUNT(*) FROM {VENTAS} WHERE Region <> 'área'",
+    f"SELECT COUNT(DISTINCT Region) FROM {VENTAS}",
+    f"SELECT Region, COUNT(*) AS n FROM {VENTAS} GROUP BY Region",
+    f"SELECT DISTINCT Estatus FROM {VENTAS}",
+    f"SELECT Estatus, SUM(Monto) AS total FROM {VENTAS} GROUP BY Estatus HAVING COUNT(*) > 1",
+    f"SELECT Id FROM {VENTAS} WHERE Region IN ('norte', 'ÁREA')",
+    f"SELECT Id FROM {VENTAS} WHERE Region LIKE '%RE%'",
+    f"SELECT Id FROM {VENTAS} WHERE Region LIKE 'Ñ%'",
+    f"SELECT Id FROM {VENTAS} WHERE Region LIKE '_rea'",
+    f"SELECT Id FROM {VENTAS} WHERE Region NOT LIKE '%Á%'",
+    f"SELECT TOP 3 Id, Monto FROM {VENTAS} WHERE Estatus = 'ACTIVO' ORDER BY Id",
+    f"SELECT AVG(Unidades) AS promedio FROM {VENTAS}",
+    f"SELECT SUM(CASE WHEN Region = 'ÁREA' THEN 1 ELSE 0 END) AS n FROM {VENTAS}",
+    f"SELECT v.Id, r.Zona FROM {VENTAS} v JOIN {REGIONES} r ON v.Region = r.Nombre",
+    f"SELECT r.Zona, COUNT(*) AS n FROM {VENTAS} v JOIN {REGIONES} r ON r.Nombre = v.Region GROUP BY r.Zona",
+    f"SELECT COUNT(*) FROM {VENTAS} WHERE Region = 'Straße'",
+    f"SELECT LEN(Region) AS largo FROM {VENTAS} WHERE Id = 2",
+    f"SELECT SUM(COALESCE(Monto, 0)) AS total FROM {VENTAS}",
+    # En SQL Server el resultado de una funcion de texto conserva la colacion de la columna;
+    # en la base de referencia (SQLite) hay que indicarla
+    (f"SELECT COUNT(*) FROM {VENTAS} WHERE LTRIM(Region) = 'ÁREA'",
+     "SELECT COUNT(*) FROM Ventas WHERE LTRIM(Region) COLLATE CI_AS = 'ÁREA'"),
+    (f"SELECT COUNT(*) FROM {VENTAS} WHERE COALESCE(Region, '') = 'ÁREA'",
+     "SELECT COUNT(*) FROM Ventas WHERE COALESCE(Region, '') COLLATE CI_AS = 'ÁREA'"),
+    (f"SELECT COUNT(*) FROM {VENTAS} WHERE ISNULL(Region, 'x') = 'X'",
+     "SELECT COUNT(*) FROM Ventas WHERE IFNULL(Region, 'x') COLLATE CI_AS = 'X'"),
+    (f"SELECT COUNT(*) FROM {VENTAS} WHERE NULLIF(Region, '') = 'norte'",
+     "SELECT COUNT(*) FROM Ventas WHERE NULLIF(Region, '') COLLATE CI_AS = 'norte'"),
+    (f"SELECT COUNT(*) FROM {VENTAS} WHERE REPLACE(Region, 'a', 'e') = 'ÁREE'",
+     "SELECT COUNT(*) FROM Ventas WHERE REPLACE(Region, 'a', 'e') COLLATE CI_AS = 'ÁREE'"),
+    (f"SELECT COUNT(*) FROM {VENTAS} WHERE SUBSTRING(Region, 1, 2) = 'ÁR'",
+     "SELECT COUNT(*) FROM Ventas WHERE SUBSTR(Region, 1, 2) COLLATE CI_AS = 'ÁR'"),
+    (f"SELECT LTRIM(RTRIM(Region)) AS r, COUNT(*) AS n FROM {VENTAS} GROUP BY LTRIM(RTRIM(Region))",
+     "SELECT LTRIM(RTRIM(Region)) AS r, COUNT(*) AS n FROM Ventas GROUP BY LTRIM(RTRIM(Region)) COLLATE CI_AS"),
+    (f"SELECT COUNT(DISTINCT LTRIM(Region)) FROM {VENTAS}",
+     "SELECT COUNT(DISTINCT LTRIM(Region) COLLATE CI_AS) FROM Ventas"),
+]
+
+# Consultas que pueden ir al espejo o a SQL Server, pero si van al espejo deben coincidir
+CUALQUIERA = [
+    f"SELECT UPPER(Region) AS r FROM {VENTAS} WHERE Id = 6",
+    f"SELECT LOWER(Region) AS r FROM {VENTAS} WHERE Id = 4",
+    f"SELECT COUNT(*) FROM {VENTAS} WHERE UPPER(Region) = 'ÑANDÚ'",
+    f"SELECT MIN(Region) FROM {VENTAS}",
+    f"SELECT Region FROM {VENTAS} ORDER BY Region",
+    f"SELECT Id FROM {VENTAS} WHERE Region LIKE '[ÁA]rea'",
+]
+
+
+def _comparar(motores, caso):
+    referencia, mirror = motores
+    sql, sql_referencia = caso if isinstance(caso, tuple) else (caso, caso)
+    traducida = mirror.translate(sql)
+    if traducida is None:
+        return None
+    ordenado = "ORDER BY" in sql.upper()
+    if "GROUP BY" in sql.upper() or "DISTINCT" in sql.upper():
+        esperado, obtenido = _normalizar(_en_referencia(referencia, sql_referencia), ordenado), _normalizar(_en_espejo(mirror, traducida), ordenado)
+    else:
+        esperado, obtenido = _en_referencia(referencia, sql_referencia), _en_espejo(mirror, traducida)
+        if not ordenado:
+            esperado, obtenido = sorted(esperado, key=repr), sorted(obtenido, key=repr)
+    assert obtenido == esperado, f"{sql}\n  espejo: {traducida}"
+    return traducida
+
+
+@pytest.mark.parametrize("caso", EN_ESPEJO)
+def test_mismo_resultado_en_el_espejo(motores, caso):
+    assert _comparar(motores, caso) is not None, f"no se ruteo al espejo: {caso}"
+
+
+@pytest.mark.parametrize("caso", CUALQUIERA)
+def test_mismo_resultado_o_sql_server(motores, caso):
+    _comparar(motores, caso)
+
+
+def test_upper_y_lower_van_a_sql_server(motores):
+    _, mirror = motores
+    assert mirror.translate(f"SELECT UPPER(Region) FROM {VENTAS}") is None
+    assert mirror.translate(f"SELECT COUNT(*) FROM {VENTAS} WHERE LOWER(Estatus) = 'activo'") is None
@@ -0,0 +1,42 @@
+import datetime as dt
+from decimal import Decimal
+
+import numpy as np
+
+from services.columnar import ColumnarResult
+
+
+def _columna(valores, type_code=None, lotes=1):
+    filas = [(v,) for v in valores]
+    paso = max(1, len(filas) // lotes)
+    batches = [filas[i:i + paso] for i in range(0, len(filas), paso)]
+    return ColumnarResult.from_batches(["x"], batches, [type_code])
+
+
+def test_decimal_exacto_como_float64():
+    res = _columna([Decimal("10.50"), None, Decimal("123456789012.345")], Decimal)
+    assert res.data[0].dtype == np.float64
+    assert res.column_values(0) == [10.5, None, 123456789012.345]
+
+
+def test_decimal_con_mas_de_15_digitos_conserva_el_valor():
+    monto = Decimal("12345678901234567.89")
+    res = _columna([Decimal("1.00"), None, monto], Decimal, lotes=3)
+    assert res.column_values(0) == [Decimal("1.00"), None, monto]
+    assert res.to_dataframe()["x"].tolist()[2] == monto
+
+
+def test_decimal_inferido_sin_type_codes():
+    monto = Decimal("98765432109876543.21")
+    res = _columna([None, monto])
+    assert res.column_values(0) == [None, monto]
+
+
+def test_tipos_basicos():
+    fecha = dt.datetime(2026, 1, 2, 3, 4, 5)
+    res = ColumnarResult.from_batches(
+        ["n", "t", "f"],
+        [[(1, "a", fecha), (None, "b", None)], [(3, "a", fecha)]],
+        [int, str, dt.datetime],
+    )
+    assert res.to_dict()["rows"] == [[1.0, "a", fecha], [None, "b", None], [3.0, "a", fecha]]
@@ -0,0 +1,85 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from services.connection_pool import ConnectionPool, PoolTimeoutError
+
+
+def _sqlite():
+    return sqlite3.connect(":memory:", check_same_thread=False)
+
+
+def test_reutiliza_la_conexion_devuelta():
+    pool = ConnectionPool(_sqlite, min_size=0, max_size=2, nombre="test-reuso")
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x)")
+    with pool.connection() as otra:
+        assert otra is conn
+        otra.execute("SELECT * FROM t")
+    m = pool.metrics()
+    assert (m["created"], m["checkouts"], m["in_use"], m["idle"]) == (1, 2, 0, 1)
+    pool.close()
+
+
+def test_fill_abre_el_minimo():
+    pool = ConnectionPool(_sqlite, min_size=3, max_size=5, nombre="test-fill")
+    assert pool.fill() == 3
+    assert pool.fill() == 0
+    assert pool.metrics()["idle"] == 3
+    pool.close()
+    assert pool.metrics()["total"] == 0
+
+
+def test_timeout_con_el_pool_lleno():
+    pool = ConnectionPool(_sqlite, min_size=0, max_size=1, timeout=0.05, nombre="test-timeout")
+    conn = pool.acquire()
+    inicio = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert time.monotonic() - inicio >= 0.05
+    assert pool.metrics()["timeouts"] == 1
+    pool.release(conn)
+    pool.close()
+
+
+def test_espera_hasta_que_se_libera_una_conexion():
+    pool = ConnectionPool(_sqlite, min_size=0, max_size=1, timeout=2, nombre="test-espera")
+    conn = pool.acquire()
+    threading.Timer(0.05, pool.release, args=(conn,)).start()
+    assert pool.acquire() is conn
+    assert pool.metrics()["waits"] == 1
+    pool.release(conn)
+    pool.close()
+
+
+def test_reconecta_si_la_conexion_ociosa_no_responde():
+    pool = ConnectionPool(_sqlite, min_size=0, max_size=1, ping_after=0, nombre="test-vida")
+    muerta = pool.acquire()
+    pool.release(muerta)
+    muerta.close()  # p.ej. el servidor corto la conexion mientras estaba ociosa
+    with pool.connection() as conn:
+        assert conn is not muerta
+        assert conn.execute("SELECT 1").fetchone() == (1,)
+    m = pool.metrics()
+    assert (m["ping_failures"], m["created"], m["total"]) == (1, 2, 1)
+    pool.close()
+
+
+def test_descarta_la_conexion_si_falla_el_rollback():
+    pool = ConnectionPool(_sqlite, min_size=0, max_size=1, nombre="test-rollback")
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.close()  # el rollback del context manager tambien falla
+            raise RuntimeError("fallo la consulta")
+    m = pool.metrics()
+    assert (m["discarded"], m["total"], m["idle"]) == (1, 0, 0)
+    pool.close()
+
+
+def test_pool_cerrado():
+    pool = ConnectionPool(_sqlite, min_size=0, max_size=1, nombre="test-cerrado")
+    pool.close()
+    with pytest.raises(ConnectionError):
+        pool.acquire()
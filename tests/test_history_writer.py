@@ -0,0 +1,64 @@
+import sqlite3
+
+from services.history_writer import HistoryWriter
+
+
+class DataError(Exception):
+    pass
+
+
+class SinkLargo:
+    """
+    Sink que, como SQL Server con varchar(255), rechaza el lote completo si una fila es muy larga.
+    """
+
+    def __init__(self, limite: int = 255, fallos_conexion: int = 0):
+        self.limite = limite
+        self.fallos_conexion = fallos_conexion
+        self.llamadas = []
+        self.filas = []
+
+    def __call__(self, lote):
+        self.llamadas.append(len(lote))
+        if self.fallos_conexion:
+            self.fallos_conexion -= 1
+            raise sqlite3.OperationalError("database is locked")
+        if any(len(row["sql_query"]) > self.limite for row in lote):
+            raise DataError("String or binary data would be truncated")
+        self.filas.extend(lote)
+        return True
+
+
+def _filas(n, larga=None):
+    return [
+        {"session_id": "s", "user_message": f"p{i}", "sql_query": "x" * 300 if i == larga else "SELECT 1", "result": ""}
+        for i in range(n)
+    ]
+
+
+def _escribir(writer, filas):
+    writer.start()
+    for row in filas:
+        writer.submit(row)
+    assert writer.flush(timeout=5)
+    writer.close()
+    return writer.stats()
+
+
+def test_fila_invalida_solo_se_pierde_ella():
+    sink = SinkLargo()
+    stats = _escribir(HistoryWriter(sink, batch_size=10, flush_interval=5), _filas(10, larga=3))
+    assert [row["user_message"] for row in sink.filas] == [f"p{i}" for i in range(10) if i != 3]
+    assert stats["failed"] == 1
+    assert stats["retries"] == 0
+    # un intento del lote y luego una llamada por fila, sin reintentos
+    assert sink.llamadas == [10] + [1] * 10
+
+
+def test_error_transitorio_se_reintenta_el_lote():
+    sink = SinkLargo(fallos_conexion=1)
+    stats = _escribir(HistoryWriter(sink, batch_size=5, flush_interval=5), _filas(5))
+    assert len(sink.filas) == 5
+    assert stats["retries"] == 1
+    assert stats["failed"] == 0
+    assert sink.llamadas == [5, 5]
@@ -0,0 +1,163 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from services.llm_scheduler import CircuitBreaker, CircuitOpenError, LLMScheduler
+
+
+class ErrorHTTP(Exception):
+    """
+    Error con la forma de los de openai: `status_code` y `response.headers`.
+    """
+
+    def __init__(self, status_code: int, headers: dict = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+def _scheduler(**kwargs) -> LLMScheduler:
+    kwargs.setdefault("backoff_base", 0.001)
+    return LLMScheduler(**kwargs)
+
+
+def test_single_flight_comparte_una_llamada():
+    async def main():
+        scheduler = _scheduler()
+        llamadas = 0
+
+        async def fn():
+            nonlocal llamadas
+            llamadas += 1
+            await asyncio.sleep(0.05)
+            return "SELECT 1"
+
+        resultados = await asyncio.gather(*(scheduler.run(fn, key="misma") for _ in range(5)))
+        assert resultados == ["SELECT 1"] * 5
+        assert llamadas == 1
+        assert scheduler.stats()["coalesced"] == 4
+        assert scheduler.stats()["inflight"] == 0
+
+        await asyncio.gather(scheduler.run(fn, key="a"), scheduler.run(fn, key="b"), scheduler.run(fn))
+        assert llamadas == 4
+
+    asyncio.run(main())
+
+
+def test_cancelar_a_quien_inicio_no_cancela_a_los_demas():
+    async def main():
+        scheduler = _scheduler()
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        primera = asyncio.ensure_future(scheduler.run(fn, key="k"))
+        await asyncio.sleep(0)
+        segunda = asyncio.ensure_future(scheduler.run(fn, key="k"))
+        await asyncio.sleep(0)
+        primera.cancel()
+        assert await segunda == "ok"
+
+    asyncio.run(main())
+
+
+def test_respeta_retry_after():
+    async def main():
+        scheduler = _scheduler()
+        errores = [ErrorHTTP(429, {"retry-after-ms": "80"})]
+
+        async def fn():
+            if errores:
+                raise errores.pop()
+            return "ok"
+
+        inicio = time.monotonic()
+        assert await scheduler.run(fn) == "ok"
+        assert time.monotonic() - inicio >= 0.08
+        assert scheduler.stats()["retries"] == 1
+
+    asyncio.run(main())
+
+
+def test_backoff_nunca_menor_que_retry_after():
+    scheduler = _scheduler(backoff_base=0.5, backoff_max=1)
+    assert all(scheduler._backoff(i, 3.0) >= 3.0 for i in range(5))
+    assert all(scheduler._backoff(i, None) <= 1 for i in range(10))
+
+
+def test_error_del_cliente_no_se_reintenta():
+    async def main():
+        scheduler = _scheduler()
+        llamadas = 0
+
+        async def fn():
+            nonlocal llamadas
+            llamadas += 1
+            raise ErrorHTTP(400)
+
+        with pytest.raises(ErrorHTTP):
+            await scheduler.run(fn)
+        assert llamadas == 1
+        assert scheduler.breaker.state == "closed"
+
+    asyncio.run(main())
+
+
+def test_breaker_se_abre_y_se_cierra_con_la_prueba():
+    async def main():
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        scheduler = _scheduler(max_retries=5, breaker=breaker)
+
+        async def falla():
+            raise ErrorHTTP(503)
+
+        async def ok():
+            return "ok"
+
+        with pytest.raises(ErrorHTTP):
+            await scheduler.run(falla)
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await scheduler.run(ok)
+
+        await asyncio.sleep(0.06)
+        assert await scheduler.run(ok) == "ok"
+        assert breaker.state == "closed"
+
+    asyncio.run(main())
+
+
+def test_prueba_cancelada_libera_el_half_open():
+    async def main():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        scheduler = _scheduler(max_retries=0, breaker=breaker)
+
+        async def falla():
+            raise ErrorHTTP(503)
+
+        async def lenta():
+            await asyncio.sleep(10)
+
+        async def ok():
+            return "ok"
+
+        with pytest.raises(ErrorHTTP):
+            await scheduler.run(falla)
+        await asyncio.sleep(0.02)
+
+        prueba = asyncio.ensure_future(scheduler.run(lenta))
+        await asyncio.sleep(0.01)
+        assert breaker.state == "half_open"
+        with pytest.raises(CircuitOpenError):
+            await scheduler.run(ok)  # solo pasa una llamada de prueba a la vez
+
+        prueba.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await prueba
+        assert await scheduler.run(ok) == "ok"
+        assert breaker.state == "closed"
+
+    asyncio.run(main())
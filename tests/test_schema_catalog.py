@@ -0,0 +1,64 @@
+from services.schema_catalog import SchemaCatalog
+
+
+TABLA = "[RPA].[dbo].[Ventas]"
+
+
+class ConsultadorFalso:
+    """
+    Responde las consultas de metadatos del catalogo con columnas y valores configurables.
+    """
+
+    def __init__(self):
+        self.columnas = [("Id", "int", "NO", None), ("Region", "varchar", "YES", 50)]
+        self.valores = ["Norte", "Sur"]
+        self.consultas = []
+
+    def add_table_listener(self, listener):
+        pass
+
+    def fetch_all(self, sql, params=()):
+        self.consultas.append(sql)
+        if "sys.objects" in sql:
+            return ["modify_date"], [("2026-01-01",)]
+        if "INFORMATION_SCHEMA.COLUMNS" in sql:
+            return ["c"], list(self.columnas)
+        if "sys.partitions" in sql:
+            return ["n"], [(100,)]
+        return ["v"], [(v,) for v in self.valores]
+
+
+def test_valores_de_ejemplo_no_cambian_la_version():
+    consultador = ConsultadorFalso()
+    catalog = SchemaCatalog(consultador, [TABLA])
+    cambios = []
+    catalog.on_change(cambios.append)
+    catalog.refresh()
+    version = catalog.version
+
+    consultador.valores = ["Sur", "Centro"]
+    assert catalog.refresh(force=True) is False
+    assert catalog.version == version
+    assert cambios == []
+    assert "'Centro'" in catalog.context_for("ventas por region")
+
+
+def test_cambio_de_estructura_cambia_la_version():
+    consultador = ConsultadorFalso()
+    catalog = SchemaCatalog(consultador, [TABLA])
+    cambios = []
+    catalog.on_change(cambios.append)
+    catalog.refresh()
+    version = catalog.version
+
+    consultador.columnas = consultador.columnas + [("Monto", "decimal", "YES", None)]
+    assert catalog.refresh(force=True) is True
+    assert catalog.version != version
+    assert cambios == [catalog.version]
+
+
+def test_muestreo_determinista():
+    consultador = ConsultadorFalso()
+    SchemaCatalog(consultador, [TABLA]).refresh()
+    muestreo = [sql for sql in consultador.consultas if "GROUP BY v" in sql]
+    assert muestreo and all(sql.endswith("ORDER BY COUNT(*) DESC, v") for sql in muestreo)
@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+
+from services.semantic_cache import SemanticCache, normalize_question
+
+
+# Embedder falso determinista: cada palabra conocida activa una dimension
+_VOCABULARIO = ["registros", "activos", "inactivos", "monto", "region", "cuantos", "total"]
+
+
+class EmbedderFalso:
+    def __init__(self):
+        self.llamadas = 0
+
+    async def __call__(self, text: str):
+        self.llamadas += 1
+        palabras = normalize_question(text).split()
+        return [float(sum(p.startswith(v[:5]) for p in palabras)) for v in _VOCABULARIO] + [0.01]
+
+
+def _consultar(cache, pregunta, fingerprint=None):
+    return asyncio.run(cache.lookup(pregunta, fingerprint))
+
+
+def test_acierto_exacto_sin_embedding():
+    embedder = EmbedderFalso()
+    cache = SemanticCache(embedder)
+    _, vector = _consultar(cache, "¿Cuántos registros activos hay?")
+    cache.store("¿Cuántos registros activos hay?", "SELECT 1", vector)
+
+    respuesta, _ = _consultar(cache, "cuantos  REGISTROS activos hay")
+    assert respuesta == "SELECT 1"
+    assert embedder.llamadas == 1
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_acierto_semantico_y_umbral():
+    cache = SemanticCache(EmbedderFalso(), threshold=0.95)
+    _, vector = _consultar(cache, "cuantos registros activos")
+    cache.store("cuantos registros activos", "SELECT activos", vector)
+
+    assert _consultar(cache, "total de registros activos por favor")[0] is None
+    assert _consultar(cache, "registros activos cuantos son")[0] == "SELECT activos"
+    assert _consultar(cache, "monto por region")[0] is None
+    s = cache.stats()
+    assert (s["hits"], s["misses"]) == (1, 3)
+
+
+def test_umbral_invalido():
+    with pytest.raises(ValueError):
+        SemanticCache(EmbedderFalso(), threshold=0)
+
+
+def test_ttl(monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: ahora[0])
+    cache = SemanticCache(EmbedderFalso(), ttl=60)
+    _, vector = _consultar(cache, "monto por region")
+    cache.store("monto por region", "SELECT monto", vector)
+
+    ahora[0] += 59
+    assert _consultar(cache, "monto por region")[0] == "SELECT monto"
+    ahora[0] += 2
+    assert _consultar(cache, "monto por region")[0] is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_cambio_de_fingerprint_invalida():
+    cache = SemanticCache(EmbedderFalso())
+    _, vector = _consultar(cache, "monto por region", "prompt-v1")
+    cache.store("monto por region", "SELECT monto", vector, "prompt-v1")
+    assert _consultar(cache, "monto por region", "prompt-v1")[0] == "SELECT monto"
+
+    assert _consultar(cache, "monto por region", "prompt-v2")[0] is None
+    assert len(cache) == 0
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_lru_y_discard():
+    cache = SemanticCache(EmbedderFalso(), max_entries=2)
+    for pregunta, sql in [("registros activos", "A"), ("registros inactivos", "B"), ("monto por region", "C")]:
+        _, vector = _consultar(cache, pregunta)
+        cache.store(pregunta, sql, vector)
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+    assert _consultar(cache, "registros activos")[0] is None
+
+    assert cache.discard("C") == 1
+    assert _consultar(cache, "monto por region")[0] is None
+    assert cache.stats()["discards"] == 1
+
+
+def test_fallo_del_embedder_no_rompe():
+    async def falla(text):
+        raise RuntimeError("sin servicio")
+
+    cache = SemanticCache(falla)
+    assert _consultar(cache, "monto") == (None, None)
+    cache.store("monto", "SELECT 1", None)
+    assert len(cache) == 0
+    assert cache.stats()["errors"] == 1
@@ -0,0 +1,48 @@
+from services.sql_guard import SQLGuard
+from utils.sql_text import split_statements
+
+
+def test_split_statements_ignora_comentarios():
+    sql = "-- Ventas; mensuales\nSELECT a FROM t;\n/* b; 'c */ SELECT b FROM u"
+    assert len(split_statements(sql)) == 2
+
+
+def test_check_many_titulos_con_punto_y_coma_y_comilla():
+    partes = SQLGuard().check_many(
+        "-- Ventas; mensuales\nSELECT a FROM t;\n-- Ventas del cliente's\nSELECT b FROM u"
+    )
+    assert [titulo for titulo, _ in partes] == ["Ventas; mensuales", "Ventas del cliente's"]
+    assert all(decision.executable for _, decision in partes)
+
+
+def test_check_many_una_sola_consulta_con_titulo():
+    partes = SQLGuard().check_many("-- Total; activos\nSELECT COUNT(*) FROM t")
+    assert len(partes) == 1
+    assert partes[0][0] == "Total; activos"
+    assert partes[0][1].executable
+
+
+def test_offset_fetch_no_recibe_top():
+    sql = "SELECT a FROM t ORDER BY a OFFSET 10 ROWS FETCH NEXT 5 ROWS ONLY"
+    decision = SQLGuard(max_rows=100).check(sql)
+    assert decision.action == "limited"
+    assert decision.sql == sql
+    assert decision.fetch_rows == 101
+
+
+def test_offset_en_subconsulta_no_impide_el_top():
+    decision = SQLGuard(max_rows=100).check(
+        "SELECT x.a FROM (SELECT a FROM t ORDER BY a OFFSET 0 ROWS FETCH NEXT 5 ROWS ONLY) x"
+    )
+    assert decision.sql.startswith("SELECT TOP (101) x.a")
+
+
+def test_union_entre_parentesis():
+    sql = "(SELECT a FROM t) UNION (SELECT b FROM u)"
+    decision = SQLGuard(max_rows=100).check(sql)
+    assert decision.action == "limited"
+    assert decision.sql == sql
+
+
+def test_parentesis_no_dejan_pasar_escrituras():
+    assert SQLGuard().check("(DELETE FROM t)").action == "rejected"
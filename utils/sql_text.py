@@ -0,0 +1,221 @@
+"""
+Utilidades de texto para sentencias SQL (T-SQL): normalizacion y deteccion de tablas,
+respetando cadenas '...' e identificadores [...] / "...".
+"""
+import re
+from typing import List, Optional, Set
+
+
+_TABLE_RE = re.compile(
+    r"\b(?:FROM|JOIN|INTO|UPDATE|TABLE)\s+"
+    r"((?:\[[^\]]+\]|\"[^\"]+\"|[\w#@$]+)(?:\s*\.\s*(?:\[[^\]]+\]|\"[^\"]+\"|[\w#@$]*))*)",
+    re.IGNORECASE,
+)
+_SELECT_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_DDL_RE = re.compile(r"^\s*(CREATE|ALTER|DROP)\b", re.IGNORECASE)
+_WRITE_RE = re.compile(r"^\s*(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|DROP|ALTER|CREATE|EXEC|EXECUTE)\b", re.IGNORECASE)
+
+
+def _segments(sql: str):
+    """
+    Recorre `sql` y devuelve tuplas (texto, es_literal) separando cadenas, identificadores
+    delimitados y comentarios `-- ...` / `/* ... */` del resto del texto. Los comentarios
+    cuentan como literales: un ';' o una comilla dentro de ellos no corta ni abre nada.
+    """
+    i, n, inicio = 0, len(sql), 0
+    while i < n:
+        c = sql[i]
+        if sql.startswith("--", i) or sql.startswith("/*", i):
+            if i > inicio:
+                yield sql[inicio:i], False
+            if c == "-":
+                fin = sql.find("\n", i)
+                j = n if fin == -1 else fin
+            else:
+                fin = sql.find("*/", i + 2)
+                j = n if fin == -1 else fin + 2
+            yield sql[i:j], True
+            i = inicio = j
+            continue
+        cierre = {"'": "'", "[": "]", '"': '"'}.get(c)
+        if cierre is None:
+            i += 1
+            continue
+        if i > inicio:
+            yield sql[inicio:i], False
+        j = i + 1
+        while j < n:
+            if sql[j] == cierre:
+                # '' y ]] son escapes dentro del literal
+                if j + 1 < n and sql[j + 1] == cierre and cierre in ("'", "]"):
+                    j += 2
+                    continue
+                break
+            j += 1
+        yield sql[i:j + 1], True
+        i = inicio = j + 1
+    if inicio < n:
+        yield sql[inicio:], False
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Normaliza una sentencia para usarla como llave de cache: colapsa espacios fuera de
+    literales y quita el ';' final. No cambia mayusculas para no alterar los valores.
+    """
+    partes = []
+    for texto, literal in _segments(sql.strip()):
+        partes.append(texto if literal else re.sub(r"\s+", " ", texto))
+    normal = "".join(partes).strip()
+    while normal.endswith(";"):
+        normal = normal[:-1].rstrip()
+    return normal
+
+
+def split_identifier(identifier: str) -> List[str]:
+    """
+    Separa un identificador de 1 a 3 partes (`[RPA].[dbo].[Efectividad_Andromeda]`) en sus
+    partes sin corchetes ni comillas.
+    """
+    partes = [p.strip().strip('[]"') for p in re.split(r"\.(?![^\[]*\])", identifier)]
+    return [p for p in partes if p]
+
+
+def table_name(identifier: str) -> str:
+    """
+    Devuelve el nombre simple (sin base ni esquema, sin corchetes, en minusculas) de un
+    identificador como `[RPA].[dbo].[Efectividad_Andromeda]`.
+    """
+    partes = split_identifier(identifier)
+    return partes[-1].lower() if partes else ""
+
+
+def referenced_tables(sql: str) -> Set[str]:
+    """
+    Devuelve los nombres simples de las tablas referenciadas despues de FROM/JOIN/INTO/UPDATE.
+    """
+    return {table_name(m.group(1)) for m in _TABLE_RE.finditer(strip_string_literals(sql))} - {""}
+
+
+def strip_string_literals(sql: str) -> str:
+    """
+    Reemplaza el contenido de las cadenas '...' por '' para poder buscar palabras clave.
+    """
+    return "".join("''" if literal and texto.startswith("'") else texto for texto, literal in _segments(sql))
+
+
+def first_statement(sql: str) -> Optional[str]:
+    """
+    Devuelve la primera sentencia completa de `sql` (hasta el primer ';' fuera de literales),
+    o None si todavia no termina. Sirve para detectar una sentencia completa en texto que
+    llega por fragmentos.
+    """
+    largo = 0
+    for texto, literal in _segments(sql):
+        if not literal and ";" in texto:
+            return sql[: largo + texto.index(";")].strip()
+        largo += len(texto)
+    return None
+
+
+def is_select(sql: str) -> bool:
+    """
+    Indica si la sentencia es de solo lectura (SELECT o WITH ... SELECT).
+    """
+    return bool(_SELECT_RE.match(sql)) and not is_write(sql)
+
+
+def is_ddl(sql: str) -> bool:
+    """
+    Indica si la sentencia modifica el esquema (CREATE/ALTER/DROP).
+    """
+    return bool(_DDL_RE.match(sql))
+
+
+def is_write(sql: str) -> bool:
+    """
+    Indica si la sentencia empieza con una instruccion que modifica datos o esquema.
+    """
+    return bool(_WRITE_RE.match(sql))
+
+
+
+def strip_comments(sql: str) -> str:
+    """
+    Quita los comentarios `-- ...` y `/* ... */` que estan fuera de literales (cada uno se
+    reemplaza por un espacio). Un comentario de bloque sin cerrar llega hasta el final.
+    """
+    # Los comentarios pueden contener comillas, por lo que se recorre caracter a caracter
+    salida, i, n = [], 0, len(sql)
+    cierre = None
+    while i < n:
+        c = sql[i]
+        if cierre is not None:
+            salida.append(c)
+            if c == cierre:
+                if i + 1 < n and sql[i + 1] == cierre and cierre in ("'", "]"):
+                    salida.append(sql[i + 1])
+                    i += 2
+                    continue
+                cierre = None
+            i += 1
+        elif sql.startswith("--", i):
+            fin = sql.find("\n", i)
+            i = n if fin == -1 else fin
+            salida.append(" ")
+        elif sql.startswith("/*", i):
+            fin = sql.find("*/", i + 2)
+            i = n if fin == -1 else fin + 2
+            salida.append(" ")
+        else:
+            cierre = {"'": "'", "[": "]", '"': '"'}.get(c)
+            salida.append(c)
+            i += 1
+    return "".join(salida)
+
+
+def mask_literals(sql: str) -> str:
+    """
+    Devuelve `sql` con el contenido de cadenas e identificadores delimitados (y los comentarios
+    completos) reemplazado por espacios, conservando las posiciones: sirve para buscar palabras clave y parentesis con
+    expresiones regulares y aplicar los cambios sobre el texto original.
+    """
+    return "".join(
+        (" " * len(texto) if texto.startswith(("--", "/*")) else texto[0] + " " * (len(texto) - 2) + texto[-1])
+        if literal and len(texto) >= 2 else texto
+        for texto, literal in _segments(sql)
+    )
+
+
+def split_statements(sql: str) -> List[str]:
+    """
+    Separa `sql` en sentencias por los ';' fuera de literales, sin las vacias.
+    """
+    sentencias, actual = [], []
+    for texto, literal in _segments(sql):
+        if literal:
+            actual.append(texto)
+            continue
+        trozos = texto.split(";")
+        for trozo in trozos[:-1]:
+            actual.append(trozo)
+            sentencias.append("".join(actual))
+            actual = []
+        actual.append(trozos[-1])
+    sentencias.append("".join(actual))
+    return [s.strip() for s in sentencias if s.strip()]
+
+
+def paren_depths(masked: str) -> List[int]:
+    """
+    Profundidad de parentesis de cada caracter de `masked` (salida de `mask_literals`);
+    los propios parentesis cuentan dentro del nivel que abren.
+    """
+    profundidad, niveles = 0, []
+    for c in masked:
+        if c == "(":
+            profundidad += 1
+        niveles.append(profundidad)
+        if c == ")":
+            profundidad -= 1
+    return niveles
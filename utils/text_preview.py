@@ -0,0 +1,63 @@
+"""
+Vistas previas acotadas de objetos grandes (resultados SQL, filas, payloads): producen los
+primeros caracteres de su repr sin serializar el objeto completo.
+"""
+from typing import Any, Iterator
+
+
+def _repr_pieces(obj: Any) -> Iterator[str]:
+    """
+    Genera `repr(obj)` por fragmentos, recorriendo dicts/listas/tuplas sin serializarlos completos.
+    """
+    if isinstance(obj, dict) and type(obj).__repr__ is dict.__repr__:
+        yield "{"
+        for i, (k, v) in enumerate(obj.items()):
+            if i:
+                yield ", "
+            yield from _repr_pieces(k)
+            yield ": "
+            yield from _repr_pieces(v)
+        yield "}"
+    elif isinstance(obj, list) and type(obj).__repr__ is list.__repr__:
+        yield "["
+        for i, v in enumerate(obj):
+            if i:
+                yield ", "
+            yield from _repr_pieces(v)
+        yield "]"
+    elif isinstance(obj, tuple) and type(obj).__repr__ is tuple.__repr__:
+        yield "("
+        for i, v in enumerate(obj):
+            if i:
+                yield ", "
+            yield from _repr_pieces(v)
+        yield ",)" if len(obj) == 1 else ")"
+    else:
+        yield repr(obj)
+
+
+def repr_prefix(obj: Any, limit: int) -> str:
+    """
+    Devuelve `repr(obj)[:limit]` deteniendose en cuanto se alcanza el limite.
+    """
+    partes, largo = [], 0
+    for pieza in _repr_pieces(obj):
+        partes.append(pieza)
+        largo += len(pieza)
+        if largo >= limit:
+            break
+    return "".join(partes)[:limit]
+
+
+def preview(obj: Any, limit: int) -> str:
+    """
+    Texto de `obj` (str() para cadenas y escalares, repr por fragmentos para contenedores)
+    recortado a `limit` caracteres, indicando cuantos se omitieron cuando se conoce.
+    """
+    if isinstance(obj, (dict, list, tuple)):
+        texto = repr_prefix(obj, limit + 1)
+        return texto if len(texto) <= limit else texto[:limit] + "…"
+    texto = obj if isinstance(obj, str) else str(obj)
+    if len(texto) <= limit:
+        return texto
+    return f"{texto[:limit]}…(+{len(texto) - limit})"